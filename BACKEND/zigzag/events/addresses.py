@@ -0,0 +1,38 @@
+"""
+Canonical keys of addresses.
+
+Two addresses are the same place when their coordinates agree once rounded to
+COORDINATE_DECIMALS (about a meter) and their address lines, cities and postal
+codes agree once normalised (case, accents, punctuation and spacing ignored).
+City and postal code are part of the key so that rows differing in them are
+never merged into one. Address rows store the key, unique, so creating an
+address reuses an existing row instead of inserting a duplicate.
+"""
+import hashlib
+import re
+import unicodedata
+
+COORDINATE_DECIMALS = 5
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_line(line):
+    """'12, Rue de l'Église ' -> '12 rue de l eglise'."""
+    decomposed = unicodedata.normalize('NFKD', line or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+
+def _coordinate(value):
+    # + 0.0 turns -0.0 into 0.0 so both format the same
+    return f'{round(float(value), COORDINATE_DECIMALS) + 0.0:.{COORDINATE_DECIMALS}f}'
+
+
+def canonical_key(address_line, latitude, longitude, city=None, postal_code=None):
+    """sha1 of the rounded coordinates and the normalised address line, city and postal code."""
+    raw = '|'.join([
+        _coordinate(latitude), _coordinate(longitude),
+        normalize_line(address_line), normalize_line(city), normalize_line(postal_code),
+    ])
+    return hashlib.sha1(raw.encode()).hexdigest()
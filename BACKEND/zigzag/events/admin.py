@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Count
 from .models import User, UserAddress, Address, Tag, Circle, Event
 
 # Unregister default Group to avoid confusion since you don’t use it directly
@@ -32,24 +33,22 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('date_joined', 'is_active', 'is_staff', 'is_superuser')
     date_hierarchy = 'date_joined'
 
+    def get_queryset(self, request):
+        # friends_count from the Friendship table, in the changelist query itself
+        return super().get_queryset(request).annotate(_friends_count=Count('friendships'))
+
     def friends_count(self, obj):
         """Count all unique users sharing any circle with this user."""
-        return (
-            User.objects
-            .filter(circles__in=obj.circles.all())
-            .exclude(id=obj.id)
-            .distinct()
-            .count()
-        )
+        return obj._friends_count
     friends_count.short_description = 'Number of Friends'
+    friends_count.admin_order_field = '_friends_count'
 
     def friends_section(self, obj):
         """Comma-separated usernames of friends."""
         friends = (
             User.objects
-            .filter(circles__in=obj.circles.all())
-            .exclude(id=obj.id)
-            .distinct()
+            .filter(id__in=obj.friendships.values('friend_id'))
+            .order_by('username')
         )
         return ", ".join(f.username for f in friends) if friends else "No friends"
     friends_section.short_description = 'Friends'
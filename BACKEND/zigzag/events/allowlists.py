@@ -0,0 +1,97 @@
+"""
+IP and domain allowlists of events.middleware.SecurityMiddleware.
+
+IP entries are addresses or CIDR ranges, IPv4 or IPv6 ("10.0.0.0/8",
+"2001:db8::/32"). They are compiled into one binary prefix trie per IP
+version, so a lookup walks at most 32 or 128 bits whatever the number of
+entries. Entries that are not IPs are kept and matched as exact strings.
+
+Domain entries are exact hosts ("app.zigzag.fr", "localhost:3000",
+"capacitor://localhost") or wildcards ("*.zigzag.fr") matching any subdomain
+but not the domain itself. Wildcards are stored by suffix, so a lookup checks
+one set per label of the domain.
+"""
+import ipaddress
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IPAllowlist:
+    """``ip in allowlist`` for addresses and CIDR ranges."""
+
+    def __init__(self, entries):
+        self.entries = frozenset(entries)
+        self.exact = set()
+        # node = [child for bit 0, child for bit 1, True once a whole prefix matched]
+        self.tries = {4: [None, None, False], 6: [None, None, False]}
+        for entry in self.entries:
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                logger.warning(f"Allowlist entry is not an IP address or range, matched as is: {entry}")
+                self.exact.add(entry)
+                continue
+            self._insert(network)
+
+    def _insert(self, network):
+        node = self.tries[network.version]
+        value, bits = int(network.network_address), network.max_prefixlen
+        for shift in range(bits - 1, bits - 1 - network.prefixlen, -1):
+            bit = (value >> shift) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[2] = True
+
+    def __contains__(self, ip):
+        if ip in self.exact:
+            return True
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        node = self.tries[address.version]
+        value = int(address)
+        for shift in range(address.max_prefixlen - 1, -1, -1):
+            if node[2]:
+                return True
+            node = node[(value >> shift) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DomainAllowlist:
+    """``domain in allowlist`` for exact domains and ``*.`` wildcards."""
+
+    def __init__(self, entries):
+        self.entries = frozenset(entry.lower() for entry in entries)
+        self.exact = {entry for entry in self.entries if not entry.startswith('*.')}
+        self.suffixes = {entry[2:] for entry in self.entries if entry.startswith('*.')}
+
+    def __contains__(self, domain):
+        if domain in self.exact:
+            return True
+        if not self.suffixes:
+            return False
+        dot = domain.find('.')
+        while dot != -1:
+            if domain[dot + 1:] in self.suffixes:
+                return True
+            dot = domain.find('.', dot + 1)
+        return False
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,221 @@
+"""
+Group availability: when are the members of some circles free at the same time?
+
+The requested period is cut into fixed slots (AVAILABILITY_SLOT_MINUTES) and
+every member becomes a bitset over those slots, stored in a Python int (bit i
+set = free during slot i):
+
+- the weekly timetable ("Libre sous réserve") gives the free windows of each
+  weekday, in the member's own time zone; a member who filled in no window is
+  not constrained by the timetable;
+- vacation days are free all day;
+- events the member created, and events whose invitation they accepted, are busy.
+
+Common free slots are the AND of all bitsets. For "at least k members free",
+the bitsets are added into a bit-sliced counter (one int per bit of the
+count), so both cost a few big-int operations per member rather than one
+operation per member and slot. Members sharing a timetable, time zone and
+vacation share the computation of their free bitset.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Circle, Event, Profile
+from .schedule import DAY_FIELDS
+
+# Events without end_time block this long
+OPEN_EVENT_DURATION = timedelta(hours=2)
+
+
+class SlotGrid:
+    """
+    Fixed-size slots from ``start`` (aware datetime) over ``days`` calendar days
+    of start's time zone. Bounds are kept in UTC so slot arithmetic is not
+    fooled by DST changes.
+    """
+
+    def __init__(self, start, days, slot_minutes=None):
+        self.slot = timedelta(minutes=slot_minutes or getattr(settings, 'AVAILABILITY_SLOT_MINUTES', 30))
+        # Wall-clock addition: the end is local midnight even across a DST change
+        self.end = (start + timedelta(days=days)).astimezone(dt_timezone.utc)
+        self.start = start.astimezone(dt_timezone.utc)
+        self.size = int((self.end - self.start) / self.slot)
+        self.full = (1 << self.size) - 1
+
+    def _position(self, moment):
+        return (moment - self.start) / self.slot
+
+    def span(self, start, end, inner):
+        """
+        Bits of the slots inside [start, end) when ``inner``, or of the slots
+        overlapping it otherwise.
+        """
+        lo, hi = self._position(start), self._position(end)
+        if inner:
+            first, last = -int(-lo // 1), int(hi // 1)
+        else:
+            first, last = int(lo // 1), -int(-hi // 1)
+        first, last = max(first, 0), min(last, self.size)
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def slot_start(self, index):
+        return self.start + index * self.slot
+
+
+def free_mask(grid, windows, tz, vacation=None):
+    """Slots during which a member is free according to timetable and vacation."""
+    if not windows:
+        mask = grid.full
+    else:
+        mask = 0
+        by_weekday = {}
+        for weekday, start, end in windows:
+            by_weekday.setdefault(weekday, []).append((start, end))
+        # One extra day before the grid for windows running past midnight
+        day = grid.start.astimezone(tz).date() - timedelta(days=1)
+        last_day = grid.end.astimezone(tz).date()
+        while day <= last_day:
+            midnight = datetime.combine(day, time.min, tzinfo=tz)
+            for start, end in by_weekday.get(day.weekday(), ()):
+                mask |= grid.span(midnight + timedelta(minutes=start), midnight + timedelta(minutes=end), inner=True)
+            day += timedelta(days=1)
+
+    if vacation and vacation[0] and vacation[1]:
+        first, last = vacation
+        mask |= grid.span(
+            datetime.combine(first, time.min, tzinfo=tz),
+            datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz),
+            inner=True,
+        )
+    return mask
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def _overlapping(grid, prefix=''):
+    """Q for events (under the ``prefix`` relation) overlapping the grid."""
+    return Q(**{f'{prefix}start_time__lt': grid.end}) & (
+        Q(**{f'{prefix}end_time__gt': grid.start}) |
+        Q(**{f'{prefix}end_time__isnull': True, f'{prefix}start_time__gt': grid.start - OPEN_EVENT_DURATION})
+    )
+
+
+def member_masks(grid, user_ids):
+    """
+    Return {user_id: bitset of free slots} for the given users, read from their
+    profiles and events in three queries.
+    """
+    user_ids = list(user_ids)
+    # Timetables are read from the integer columns mirroring Profile.timetable
+    window_fields = [f'{day}_free_{bound}' for day in DAY_FIELDS for bound in ('start', 'end')]
+    profiles = {
+        row[0]: row[1:] for row in Profile.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'timezone', 'vacation_start', 'vacation_end', *window_fields,
+        )
+    }
+
+    shared = {}
+    masks = {}
+    for user_id in user_ids:
+        tz_name, vacation_start, vacation_end, *bounds = profiles.get(user_id, ('UTC', None, None))
+        windows = tuple(
+            (weekday, bounds[2 * weekday], bounds[2 * weekday + 1])
+            for weekday in range(len(DAY_FIELDS)) if bounds and bounds[2 * weekday] is not None
+        )
+        key = (windows, tz_name or 'UTC', vacation_start, vacation_end)
+        if key not in shared:
+            shared[key] = free_mask(grid, windows, _zone(key[1]), (vacation_start, vacation_end))
+        masks[user_id] = shared[key]
+
+    busy = list(
+        Event.objects.filter(_overlapping(grid), creator_id__in=user_ids)
+        .values_list('creator_id', 'start_time', 'end_time')
+    )
+    busy += Circle.members.through.objects.filter(
+        _overlapping(grid, 'circle__linked_event__'), user_id__in=user_ids, circle__is_invitation_circle=True,
+    ).values_list('user_id', 'circle__linked_event__start_time', 'circle__linked_event__end_time')
+
+    for user_id, start, end in busy:
+        if end is None or end <= start:
+            end = start + OPEN_EVENT_DURATION
+        masks[user_id] &= ~grid.span(start, end, inner=False)
+    return masks
+
+
+def all_free(masks, grid):
+    """Slots free for every member."""
+    result = grid.full
+    for mask in masks:
+        result &= mask
+    return result
+
+
+def count_planes(masks):
+    """
+    Add bitsets into a bit-sliced counter: plane j holds bit j of the number of
+    members free in each slot.
+    """
+    planes = []
+    for mask in masks:
+        carry = mask
+        for j, plane in enumerate(planes):
+            planes[j] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def at_least(planes, k, grid):
+    """Slots where the counter in ``planes`` is >= k."""
+    if k <= 0:
+        return grid.full
+    greater, equal = 0, grid.full
+    for j in range(max(len(planes), k.bit_length()) - 1, -1, -1):
+        plane = planes[j] if j < len(planes) else 0
+        if (k >> j) & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane
+    return greater | equal
+
+
+def intervals(grid, mask, min_slots=1):
+    """Runs of set bits as [(start, end)] datetimes, keeping runs of at least ``min_slots``."""
+    result = []
+    index = 0
+    while mask:
+        # skip the zeros, then measure the run of ones
+        skip = (mask & -mask).bit_length() - 1
+        mask >>= skip
+        index += skip
+        run = (~mask & (mask + 1)).bit_length() - 1
+        if run >= min_slots:
+            result.append((grid.slot_start(index), grid.slot_start(index + run)))
+        mask >>= run
+        index += run
+    return result
+
+
+def group_availability(grid, user_ids, min_free=None):
+    """
+    Free slots of a group over the grid: slots free for everybody, or for at
+    least ``min_free`` members when given. Returns a bitset.
+    """
+    masks = member_masks(grid, user_ids).values()
+    if min_free is None or min_free >= len(masks):
+        return all_free(masks, grid)
+    return at_least(count_planes(masks), min_free, grid)
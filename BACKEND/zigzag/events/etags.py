@@ -0,0 +1,74 @@
+"""
+Conditional GET (ETag / If-None-Match) for read endpoints.
+
+Each endpoint describes the state its response is built from with a cheap
+"state" function: aggregates over the underlying rows (count, max updated_at,
+the latest entry of the user's EventChange log for membership changes). The
+ETag is a hash of that state, read from the database only, so it holds with
+any cache backend and a matching If-None-Match is answered with 304 before any
+row is loaded or serialized.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+
+from .models import EventChange
+
+
+def make_etag(*parts):
+    """Strong ETag (quoted hex digest) of JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return '"%s"' % hashlib.sha1(payload.encode()).hexdigest()
+
+
+def event_state(events):
+    """Count and latest modification of a queryset of events and their addresses."""
+    state = events.aggregate(
+        count=Count('id', distinct=True),
+        updated=Max('updated_at'),
+        address_updated=Max('address__updated_at'),
+    )
+    return [state['count'], state['updated'], state['address_updated']]
+
+
+def visible_state(user, events):
+    """
+    event_state of ``events`` (visible to ``user``) and the latest entry of the
+    user's change log, which records memberships and circle renames. Linking
+    circles or tagging them touches the events' updated_at (see events.signals).
+    """
+    last_change = EventChange.objects.filter(user_id=user.id).aggregate(last=Max('id'))['last']
+    return event_state(events) + [last_change]
+
+
+def conditional(state_func):
+    """
+    Add an ETag to GET/HEAD responses of a view method and answer 304 when the
+    client already holds it. ``state_func(view, request)`` returns the parts the
+    response depends on besides the path, query string and user.
+
+        @conditional(_events_state)
+        def list(self, request, *args, **kwargs): ...
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+
+            etag = make_etag(
+                request.path, sorted(request.query_params.lists()), request.user.id, state_func(self, request),
+            )
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                # the client may keep the body but must revalidate it before use
+                response['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Maintenance of the Friendship table, the friend graph.
+
+Two users are friends when they share at least one circle; each ordered pair
+stores the number of circles they share. Membership changes adjust the counts
+of the affected pairs in place (``adjust_pairs``) instead of recomputing the
+graph, so adding someone to a circle costs a few queries whatever the number
+of circles the members belong to.
+"""
+from django.db.models import Count, F, Q, Sum
+
+from .models import Circle, Friendship
+
+BATCH_SIZE = 500
+
+
+def adjust_pairs(changed, others, delta):
+    """
+    Add ``delta`` to the shared circle count of every pair made of one user of
+    ``changed`` and another user of ``changed`` or ``others``, in both
+    directions: the pairs gained (delta=1) or lost (delta=-1) when ``changed``
+    join or leave a circle whose other members are ``others``.
+    """
+    changed, others = set(changed), set(others) - set(changed)
+    if not changed or (len(changed) == 1 and not others):
+        return
+    everyone = changed | others
+    pairs = Q(user_id__in=changed, friend_id__in=everyone) | Q(user_id__in=others, friend_id__in=changed)
+
+    if delta > 0:
+        # Missing rows first, at 0, so the increment below is a single atomic UPDATE
+        Friendship.objects.bulk_create(
+            [
+                Friendship(user_id=user_id, friend_id=friend_id, shared_circle_count=0)
+                for user_id in changed for friend_id in everyone if user_id != friend_id
+            ] + [
+                Friendship(user_id=user_id, friend_id=friend_id, shared_circle_count=0)
+                for user_id in others for friend_id in changed
+            ],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+    Friendship.objects.filter(pairs).update(shared_circle_count=F('shared_circle_count') + delta)
+    if delta < 0:
+        Friendship.objects.filter(pairs, shared_circle_count__lte=0).delete()
+
+
+def shared_circle_counts(membership_model):
+    """
+    Return {(user_id, friend_id): shared circle count} computed from the
+    circle membership table ``membership_model`` (also used by the migration).
+    """
+    counts = {}
+    rows = (
+        membership_model.objects.values_list('user_id', 'circle__members')
+        .annotate(shared=Count('circle_id')).order_by()
+    )
+    for user_id, friend_id, shared in rows.iterator():
+        if user_id != friend_id:
+            counts[(user_id, friend_id)] = shared
+    return counts
+
+
+def rebuild_all():
+    """Recompute the whole table from circle memberships. Returns (added, updated, removed) counts."""
+    desired = shared_circle_counts(Circle.members.through)
+    existing = {
+        (row.user_id, row.friend_id): row
+        for row in Friendship.objects.only('id', 'user_id', 'friend_id', 'shared_circle_count').iterator()
+    }
+
+    to_create, to_update = [], []
+    for (user_id, friend_id), shared in desired.items():
+        row = existing.get((user_id, friend_id))
+        if row is None:
+            to_create.append(Friendship(user_id=user_id, friend_id=friend_id, shared_circle_count=shared))
+        elif row.shared_circle_count != shared:
+            row.shared_circle_count = shared
+            to_update.append(row)
+    removed = [row.id for key, row in existing.items() if key not in desired]
+
+    Friendship.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    Friendship.objects.bulk_update(to_update, ['shared_circle_count'], batch_size=BATCH_SIZE)
+    for start in range(0, len(removed), BATCH_SIZE):
+        Friendship.objects.filter(id__in=removed[start:start + BATCH_SIZE]).delete()
+    return len(to_create), len(to_update), len(removed)
+
+
+def friends_of_friends(user, limit):
+    """
+    Users two hops away from ``user`` who are not already friends, ranked by
+    number of mutual friends, then by the circles those mutual friends share
+    with them. One query over the (user, friend) index.
+    """
+    friend_ids = Friendship.objects.filter(user=user).values('friend_id')
+    rows = (
+        Friendship.objects.filter(user_id__in=friend_ids)
+        .exclude(friend_id=user.id)
+        .exclude(friend_id__in=friend_ids)
+        .values('friend_id', 'friend__username', 'friend__first_name', 'friend__last_name')
+        .annotate(mutual_friends=Count('user_id'), shared_circles=Sum('shared_circle_count'))
+        .order_by('-mutual_friends', '-shared_circles', 'friend_id')[:limit]
+    )
+    return [
+        {
+            "id": row['friend_id'],
+            "username": row['friend__username'],
+            "first_name": row['friend__first_name'] or '',
+            "last_name": row['friend__last_name'] or '',
+            "mutual_friends": row['mutual_friends'],
+            "shared_circles": row['shared_circles'],
+        }
+        for row in rows
+    ]
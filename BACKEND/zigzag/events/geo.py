@@ -0,0 +1,213 @@
+"""
+Geohash helpers used to index Address coordinates.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+points that are close on the map share a prefix. A viewport can then be
+expressed as a handful of string ranges that an ordinary B-tree index can
+answer on both SQLite and PostgreSQL.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+
+# Upper bound on the number of cells used to cover a viewport. More cells means
+# a tighter fit around the bbox but a longer OR clause in the SQL.
+MAX_COVERING_CELLS = 32
+
+# Geohash precision whose cells roughly match a map tile at a given zoom level.
+ZOOM_PRECISION = [1, 1, 1, 2, 2, 3, 3, 3, 4, 4, 5, 5, 5, 6, 6, 7, 7, 7, 8, 8, 8]
+
+# Deepest zoom level of common tile providers; levels past the table use its last precision.
+MAX_ZOOM = 22
+
+# Mean Earth radius, used by the haversine distance
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point, ``precision`` characters long."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    value, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value = value * 2 + 1
+                lng_lo = mid
+            else:
+                value = value * 2
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value = value * 2
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[value])
+            value, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (height, width) in degrees of a geohash cell."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def precision_for_zoom(zoom):
+    """
+    Map a Leaflet zoom level to the geohash precision of a tile.
+    Raises ValueError unless zoom is an integer in [0, MAX_ZOOM].
+    """
+    zoom = int(zoom)
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom must be within [0, {MAX_ZOOM}].")
+    return ZOOM_PRECISION[min(zoom, len(ZOOM_PRECISION) - 1)]
+
+
+def _grid_span(lo, hi, origin, step, cells):
+    first = min(int(math.floor((lo - origin) / step)), cells - 1)
+    last = min(int(math.floor((hi - origin) / step)), cells - 1)
+    return first, last
+
+
+def _cells_for(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    lat_cells = int(round(180.0 / height))
+    lng_cells = int(round(360.0 / width))
+    lat_first, lat_last = _grid_span(south, north, -90.0, height, lat_cells)
+    lng_first, lng_last = _grid_span(west, east, -180.0, width, lng_cells)
+    return (lat_first, lat_last, height), (lng_first, lng_last, width)
+
+
+def _cell_count(south, west, north, east, precision):
+    (lat_first, lat_last, _), (lng_first, lng_last, _) = _cells_for(south, west, north, east, precision)
+    return (lat_last - lat_first + 1) * (lng_last - lng_first + 1)
+
+
+def _split_antimeridian(south, west, north, east):
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+
+def covering_cells(south, west, north, east, precision=None, max_cells=MAX_COVERING_CELLS):
+    """
+    Return the geohash prefixes of the cells overlapping a bounding box.
+
+    When ``precision`` is omitted the finest precision that keeps the cover
+    under ``max_cells`` is used; an explicit precision is lowered as needed to
+    respect the same limit. A bbox with ``west > east`` crosses the antimeridian.
+    """
+    boxes = _split_antimeridian(south, west, north, east)
+    precision = min(precision or GEOHASH_PRECISION, GEOHASH_PRECISION)
+    while precision > 1 and sum(_cell_count(*box, precision) for box in boxes) > max_cells:
+        precision -= 1
+
+    cells = set()
+    for box in boxes:
+        (lat_first, lat_last, height), (lng_first, lng_last, width) = _cells_for(*box, precision)
+        for i in range(lat_first, lat_last + 1):
+            lat = -90.0 + (i + 0.5) * height
+            for j in range(lng_first, lng_last + 1):
+                cells.add(encode(lat, -180.0 + (j + 0.5) * width, precision))
+    return sorted(cells)
+
+
+def next_prefix(prefix):
+    """
+    Return the smallest geohash greater than every hash starting with ``prefix``,
+    or None when there is no such hash (prefix made only of 'z').
+    """
+    chars = list(prefix)
+    while chars:
+        index = BASE32.index(chars[-1])
+        if index + 1 < len(BASE32):
+            chars[-1] = BASE32[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def covering_ranges(south, west, north, east, precision=None, max_cells=MAX_COVERING_CELLS):
+    """
+    Return ``[(lo, hi), ...]`` geohash ranges (``lo <= hash < hi``) covering the bbox.
+
+    Adjacent cells are merged so the SQL stays short; ``hi`` is None when the
+    range runs to the end of the keyspace.
+    """
+    ranges = []
+    for cell in covering_cells(south, west, north, east, precision, max_cells):
+        hi = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], hi)
+        else:
+            ranges.append((cell, hi))
+    return ranges
+
+
+def parse_bbox(value):
+    """
+    Parse a bounding box into ``(south, west, north, east)``.
+
+    Accepts a dict with south/west/north/east keys (Leaflet ``getBounds()``) or a
+    ``"west,south,east,north"`` string / 4-item list (Leaflet ``toBBoxString()``).
+    Raises ValueError on malformed input.
+    """
+    if isinstance(value, dict):
+        try:
+            south, west, north, east = (float(value[key]) for key in ('south', 'west', 'north', 'east'))
+        except KeyError as exc:
+            raise ValueError(f"bbox is missing '{exc.args[0]}'.") from None
+    else:
+        if isinstance(value, str):
+            value = value.split(',')
+        if not isinstance(value, (list, tuple)) or len(value) != 4:
+            raise ValueError("bbox must be 'west,south,east,north'.")
+        west, south, east, north = (float(v) for v in value)
+
+    if not (-90.0 <= south <= north <= 90.0):
+        raise ValueError("bbox latitudes must satisfy -90 <= south <= north <= 90.")
+    if not (-180.0 <= west <= 180.0 and -180.0 <= east <= 180.0):
+        raise ValueError("bbox longitudes must be within [-180, 180].")
+    return south, west, north, east
+
+
+def bbox_around(lat, lng, radius_km):
+    """
+    Return the ``(south, west, north, east)`` box containing every point within
+    ``radius_km`` of (lat, lng). ``west > east`` when it crosses the antimeridian;
+    near the poles the box spans every longitude.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - delta_lat, -90.0), min(lat + delta_lat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0
+    delta_lng = delta_lat / math.cos(math.radians(lat))
+    if delta_lng >= 180.0:
+        return south, -180.0, north, 180.0
+    west, east = lng - delta_lng, lng + delta_lng
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, west, north, east
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
@@ -0,0 +1,85 @@
+"""
+Busy-time histograms: how many events overlap each hour or day of a window.
+
+The database groups event starts and ends by bucket (Trunc), so the query
+result and the response grow with the number of buckets, never with the
+number of events. A prefix sum over those deltas gives the overlap counts.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F
+from django.db.models.functions import Trunc
+
+UNITS = ('hour', 'day')
+
+# Events ending exactly on a bucket boundary must not count in the next bucket
+_EPSILON = timedelta(microseconds=1)
+
+
+def bucket_starts(start, end, unit, tz):
+    """
+    Start instants of the buckets covering [start, end).
+    Days follow the calendar of ``tz``, so DST days last 23 or 25 hours.
+    """
+    local_start = start.astimezone(tz)
+    if unit == 'hour':
+        first = local_start.replace(minute=0, second=0, microsecond=0)
+        step = timedelta(hours=1)
+        starts, current = [], first
+        while current < end:
+            starts.append(current)
+            current = (current + step).astimezone(tz)
+        return starts
+
+    day = local_start.date()
+    starts = []
+    while True:
+        current = datetime.combine(day, time.min, tzinfo=tz)
+        if current >= end:
+            return starts
+        starts.append(current)
+        day += timedelta(days=1)
+
+
+def bucket_count(start, end, unit):
+    """Upper bound of the number of buckets, computed without building them."""
+    seconds = (end - start).total_seconds()
+    return int(seconds // (3600 if unit == 'hour' else 86400)) + 2
+
+
+def busy_histogram(events, start, end, unit, tz):
+    """
+    Return (bucket_starts, counts): counts[i] is the number of ``events``
+    overlapping bucket i of [start, end). Events without end_time are ignored.
+    """
+    starts = bucket_starts(start, end, unit, tz)
+    if not starts:
+        return [], []
+    index = {moment: i for i, moment in enumerate(starts)}
+    overlapping = events.filter(start_time__lt=end, end_time__gt=start)
+
+    deltas = [0] * (len(starts) + 1)
+    # Events that started before the window are busy from its first bucket
+    deltas[0] += overlapping.filter(start_time__lt=starts[0]).count()
+
+    opened = (
+        overlapping.filter(start_time__gte=starts[0])
+        .annotate(bucket=Trunc('start_time', unit, tzinfo=tz))
+        .values('bucket').annotate(n=Count('id')).order_by()
+    )
+    for row in opened:
+        deltas[index[row['bucket']]] += row['n']
+
+    closed = (
+        overlapping.filter(end_time__lte=end)
+        .annotate(bucket=Trunc(F('end_time') - _EPSILON, unit, tzinfo=tz))
+        .values('bucket').annotate(n=Count('id')).order_by()
+    )
+    for row in closed:
+        deltas[index[row['bucket']] + 1] -= row['n']
+
+    counts, running = [], 0
+    for delta in deltas[:-1]:
+        running += delta
+        counts.append(running)
+    return starts, counts
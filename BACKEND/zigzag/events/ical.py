@@ -0,0 +1,143 @@
+"""
+iCalendar export written incrementally.
+
+The calendar is emitted as a header, one block per VEVENT and a footer, so a
+response can stream any number of events without building the whole calendar
+in memory. Each VEVENT is still rendered by icalendar, which takes care of
+escaping and line folding.
+
+Subscription feeds reuse the rendered blocks of unchanged events from the
+cache, so a rebuild only renders events modified since the previous one.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from icalendar import Calendar, Event as ICalEvent
+
+from .models import Circle
+
+CALENDAR_FOOTER = b'END:VCALENDAR\r\n'
+
+# Events lasting a day or more are exported as two entries (start and end) of this length
+MARKER_DURATION = timedelta(hours=2)
+
+ITERATOR_CHUNK_SIZE = 500
+
+
+def calendar_header(name):
+    """BEGIN:VCALENDAR and the calendar properties, without any component."""
+    cal = Calendar()
+    cal.add('prodid', '-//ZIGZAG//Events//EN')
+    cal.add('version', '2.0')
+    cal.add('calscale', 'GREGORIAN')
+    cal.add('method', 'PUBLISH')
+    cal.add('x-wr-calname', name)
+    cal.add('x-wr-timezone', 'Europe/Paris')
+    return cal.to_ical()[:-len(CALENDAR_FOOTER)]
+
+
+def _vevent(event, start_time, end_time, uid, summary):
+    vevent = ICalEvent()
+    vevent.add('summary', summary)
+    vevent.add('dtstart', start_time)
+    vevent.add('dtend', end_time)
+
+    if event.description:
+        vevent.add('description', event.description)
+
+    if event.address:
+        location_parts = [part for part in (event.address.address_line, event.address.city) if part]
+        if location_parts:
+            vevent.add('location', ', '.join(location_parts))
+
+    # Circles as categories; event.circles is prefetched by stream_calendar
+    categories = [circle.name for circle in event.circles.all()]
+    if categories:
+        vevent.add('categories', categories)
+
+    vevent.add('uid', uid)
+    vevent.add('created', event.created_at)
+    vevent.add('last-modified', event.updated_at)
+    return vevent
+
+
+def event_components(event):
+    """
+    VEVENTs exported for one event: a single entry for events shorter than 24h,
+    otherwise a "(Début)" entry and, when the event has an end, a "(Fin)" entry.
+    """
+    if event.end_time and (event.end_time - event.start_time).total_seconds() < 86400:
+        return [_vevent(event, event.start_time, event.end_time, f'zigzag-{event.id}@zigzag.com', event.title)]
+
+    components = [_vevent(
+        event, event.start_time, event.start_time + MARKER_DURATION,
+        f'zigzag-{event.id}-start@zigzag.com', f'{event.title} (Début)',
+    )]
+    if event.end_time:
+        components.append(_vevent(
+            event, event.end_time, event.end_time + MARKER_DURATION,
+            f'zigzag-{event.id}-end@zigzag.com', f'{event.title} (Fin)',
+        ))
+    return components
+
+
+def event_block(event):
+    """Rendered VEVENT(s) of one event."""
+    return b''.join(component.to_ical() for component in event_components(event))
+
+
+def _with_relations(events):
+    return events.select_related('address').prefetch_related(
+        Prefetch('circles', queryset=Circle.objects.only('id', 'name'))
+    )
+
+
+def stream_calendar(events, name, chunk_size=ITERATOR_CHUNK_SIZE):
+    """
+    Yield the calendar for a queryset of events as bytes chunks.
+    Events are read ``chunk_size`` at a time with their address and circles, so
+    memory stays flat however many events there are.
+    """
+    yield calendar_header(name)
+    for event in _with_relations(events).iterator(chunk_size=chunk_size):
+        yield event_block(event)
+    yield CALENDAR_FOOTER
+
+
+def _block_key(event):
+    # Everything a block is rendered from besides the event row itself
+    address_updated = event.address.updated_at.isoformat() if event.address else ''
+    circles = ','.join(sorted(circle.name for circle in event.circles.all()))
+    version = hashlib.sha1(f'{event.updated_at.isoformat()}|{address_updated}|{circles}'.encode()).hexdigest()
+    return f'ical:vevent:{event.id}:{version}'
+
+
+def _cached_blocks(events):
+    keys = [_block_key(event) for event in events]
+    blocks = cache.get_many(keys)
+    missing = {key: event_block(event) for key, event in zip(keys, events) if key not in blocks}
+    if missing:
+        cache.set_many(missing, getattr(settings, 'ICAL_FEED_CACHE_TIMEOUT', 86400))
+        blocks.update(missing)
+    return [blocks[key] for key in keys]
+
+
+def render_calendar(events, name, chunk_size=ITERATOR_CHUNK_SIZE):
+    """
+    Return the whole calendar as bytes, rendering only the events whose block
+    is not cached yet (new events, or events whose updated_at, address or
+    circle names changed).
+    """
+    parts = [calendar_header(name)]
+    batch = []
+    for event in _with_relations(events).iterator(chunk_size=chunk_size):
+        batch.append(event)
+        if len(batch) == chunk_size:
+            parts.extend(_cached_blocks(batch))
+            batch = []
+    parts.extend(_cached_blocks(batch))
+    parts.append(CALENDAR_FOOTER)
+    return b''.join(parts)
@@ -0,0 +1,106 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand
+
+from events import availability, schedule
+
+TIMEZONES = ['Europe/Paris', 'Europe/London', 'America/New_York', 'UTC']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the group availability engine on synthetic members "
+        "(no database access) against a naive per-slot computation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=500)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--events', type=int, default=20, help="Busy events per member.")
+        parser.add_argument('--min-free', type=int, help="Quorum for the at-least query (default: a tenth of the members).")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _members(self, options, grid):
+        rng = random.Random(options['seed'])
+        members = []
+        for _ in range(options['members']):
+            timetable = {}
+            for name in schedule.WEEKDAYS:
+                if rng.random() < 0.7:
+                    start = rng.randrange(8, 21)
+                    timetable[name] = {"start": f"{start:02d}:{rng.choice(['00', '30'])}", "end": f"{min(start + rng.randrange(2, 6), 23):02d}:00"}
+            vacation = None
+            if rng.random() < 0.2:
+                first = grid.start.date() + timedelta(days=rng.randrange(options['days']))
+                vacation = (first, first + timedelta(days=rng.randrange(1, 8)))
+            busy = []
+            for _ in range(options['events']):
+                start = grid.start + timedelta(minutes=rng.randrange(options['days'] * 24 * 60))
+                busy.append((start, start + timedelta(minutes=rng.choice([30, 60, 90, 180]))))
+            members.append((schedule.timetable_windows(timetable), ZoneInfo(rng.choice(TIMEZONES)), vacation, busy))
+        return members
+
+    def _engine(self, grid, members, min_free):
+        masks = []
+        for windows, tz, vacation, busy in members:
+            mask = availability.free_mask(grid, windows, tz, vacation)
+            for start, end in busy:
+                mask &= ~grid.span(start, end, inner=False)
+            masks.append(mask)
+        common = availability.all_free(masks, grid)
+        quorum = availability.at_least(availability.count_planes(masks), min_free, grid)
+        return common, quorum
+
+    def _naive(self, grid, members, min_free):
+        counts = [0] * grid.size
+        for windows, tz, vacation, busy in members:
+            mask = availability.free_mask(grid, windows, tz, vacation)
+            free = [(mask >> i) & 1 for i in range(grid.size)]
+            for start, end in busy:
+                first = max(int((start - grid.start) // grid.slot), 0)
+                for i in range(first, grid.size):
+                    if grid.slot_start(i) >= end:
+                        break
+                    free[i] = 0
+            for i in range(grid.size):
+                counts[i] += free[i]
+        common = sum(1 << i for i, count in enumerate(counts) if count == len(members))
+        quorum = sum(1 << i for i, count in enumerate(counts) if count >= min_free)
+        return common, quorum
+
+    def _time(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def handle(self, *args, **options):
+        start = datetime.combine(date.today(), datetime.min.time(), tzinfo=ZoneInfo('Europe/Paris'))
+        grid = availability.SlotGrid(start, options['days'])
+        members = self._members(options, grid)
+        min_free = options['min_free'] or max(1, len(members) // 10)
+
+        engine_time, engine_result = self._time(lambda: self._engine(grid, members, min_free), options['repeat'])
+        naive_time, naive_result = self._time(lambda: self._naive(grid, members, min_free), 1)
+
+        self.stdout.write(
+            f"{options['members']} members x {options['days']} days "
+            f"({grid.size} slots of {int(grid.slot.total_seconds() // 60)} min)"
+        )
+        self.stdout.write(f"bitset engine: {engine_time * 1000:.1f} ms (best of {options['repeat']})")
+        self.stdout.write(f"naive per-slot: {naive_time * 1000:.1f} ms")
+        common, quorum = engine_result
+        self.stdout.write(
+            f"slots free for all: {bin(common).count('1')}, for at least {min_free}: {bin(quorum).count('1')}"
+        )
+        if engine_result != naive_result:
+            self.stderr.write(self.style.ERROR("Engine and naive results differ."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Results match, {naive_time / engine_time:.0f}x faster."))
@@ -0,0 +1,95 @@
+import logging
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from ipware import get_client_ip
+
+from events.middleware import SecurityMiddleware, classify_request
+
+# (origin, referer, user agent) of the clients seen in production
+PROFILES = [
+    ('https://app.zigzag.fr', 'https://app.zigzag.fr/map', 'Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0'),
+    ('capacitor://localhost', '', 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) ZIGZAG-WebView'),
+    ('http://localhost', 'http://localhost/', 'Mozilla/5.0 (Linux; Android 14) Chrome/126.0'),
+    ('', '', 'python-requests/2.32.3'),
+    ('https://evil.example', '', 'Mozilla/5.0 (Windows NT 10.0) Chrome/126.0'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time SecurityMiddleware adds to an API request, with repeated "
+        "client headers (classifier cache hits) and with all-distinct headers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50000)
+        parser.add_argument('--allowed-ips', type=int, default=50, help="Entries of API_ALLOWED_IPS.")
+        parser.add_argument('--allowed-domains', type=int, default=50, help="Entries of API_ALLOWED_DOMAINS.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _middleware(self, options):
+        environ = {
+            'SECURITY_ENABLED': 'True',
+            # half addresses, half CIDR ranges; half exact domains, half wildcards
+            'API_ALLOWED_IPS': ','.join(
+                f'10.0.{i // 256}.{i % 256}' if i % 2 else f'172.{16 + i % 16}.{i // 16 % 256}.0/24'
+                for i in range(options['allowed_ips'])
+            ),
+            'API_ALLOWED_DOMAINS': ','.join(
+                ['app.zigzag.fr'] + [
+                    f'site{i}.example' if i % 2 else f'*.site{i}.example' for i in range(options['allowed_domains'] - 1)
+                ]
+            ),
+        }
+        saved = {name: os.environ.get(name) for name in environ}
+        os.environ.update(environ)
+        try:
+            return SecurityMiddleware(lambda request: HttpResponse())
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name)
+                else:
+                    os.environ[name] = value
+
+    def _requests(self, options, rng, distinct):
+        factory = RequestFactory()
+        requests = []
+        for index in range(options['requests']):
+            origin, referer, user_agent = rng.choice(PROFILES)
+            if distinct:
+                user_agent = f'{user_agent} build/{index}'
+            requests.append(factory.get(
+                '/api/events/tags/', HTTP_ORIGIN=origin, HTTP_REFERER=referer, HTTP_USER_AGENT=user_agent,
+                REMOTE_ADDR=f'10.0.0.{rng.randrange(256)}',
+            ))
+        return requests
+
+    def _time(self, handler, requests):
+        started = time.perf_counter()
+        for request in requests:
+            handler(request)
+        return (time.perf_counter() - started) / len(requests)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        middleware = self._middleware(options)
+        # denials log a warning each; their I/O is not what is measured
+        logging.disable(logging.WARNING)
+        for label, distinct in (("repeated headers", False), ("distinct headers", True)):
+            requests = self._requests(options, rng, distinct)
+            classify_request.cache_clear()
+            bare = self._time(middleware.get_response, requests)
+            total = self._time(middleware, requests)
+            client_ip = self._time(get_client_ip, requests)
+            info = classify_request.cache_info()
+            self.stdout.write(
+                f"{label}: {(total - bare) * 1e6:.2f} us per request added by the middleware, "
+                f"{client_ip * 1e6:.2f} us of which in the client IP lookup "
+                f"({options['requests']} requests, classifier cache {info.hits} hits / {info.misses} misses)"
+            )
@@ -0,0 +1,131 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from events import geo
+from events.models import Address, Event
+
+# Synthetic events are spread over metropolitan France
+SOUTH, WEST, NORTH, EAST = 42.5, -4.5, 51.0, 8.0
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark public event discovery (bbox + time window, keyset pages) on "
+        "synthetic events. Everything is created in a transaction rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=200000, help="Public events to create.")
+        parser.add_argument('--private', type=int, default=50000, help="Private events to create alongside.")
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--pages', type=int, default=10, help="Keyset pages followed per query.")
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--bbox-size', type=float, default=0.5, help="Viewport side in degrees.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _populate(self, options, rng, now):
+        user = get_user_model().objects.create(username=f'bench-discovery-{rng.randrange(10 ** 9)}')
+        total = options['events'] + options['private']
+        batch = 5000
+        for offset in range(0, total, batch):
+            size = min(batch, total - offset)
+            addresses = []
+            for _ in range(size):
+                lat, lng = rng.uniform(SOUTH, NORTH), rng.uniform(WEST, EAST)
+                addresses.append(Address(
+                    address_line='bench', city='bench', latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+                ))
+            addresses = Address.objects.bulk_create(addresses)
+            Event.objects.bulk_create([
+                Event(
+                    title='bench', creator=user, address=address, geohash=address.geohash,
+                    start_time=now + timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                    is_public=offset + index < options['events'],
+                )
+                for index, address in enumerate(addresses)
+            ])
+
+    def _query(self, options, rng, now):
+        size = options['bbox_size']
+        south, west = rng.uniform(SOUTH, NORTH - size), rng.uniform(WEST, EAST - size)
+        start = now + timedelta(days=rng.randrange(300))
+        return (south, west, south + size, west + size), start, start + timedelta(days=30)
+
+    def _run(self, options, bbox, start, end):
+        """Follow ``pages`` keyset pages; returns the number of rows read."""
+        events = Event.objects.discoverable(start, end, bbox)
+        rows, last = 0, None
+        for _ in range(options['pages']):
+            page = events
+            if last is not None:
+                page = page.filter(Q(start_time__gt=last[0]) | Q(start_time=last[0], id__gt=last[1]))
+            page = list(page.values_list('start_time', 'id')[:options['page_size']])
+            rows += len(page)
+            if len(page) < options['page_size']:
+                break
+            last = page[-1]
+        return rows
+
+    def _plan(self, bbox, start, end):
+        sql, params = Event.objects.discoverable(start, end, bbox).values('id')[:50].query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self._populate(options, rng, now)
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                self.stdout.write(
+                    f"{options['events']} public + {options['private']} private events created "
+                    f"in {time.perf_counter() - started:.1f} s"
+                )
+
+                queries = [self._query(options, rng, now) for _ in range(options['queries'])]
+                plan = self._plan(*queries[0])
+                self.stdout.write("Query plan:")
+                for line in plan:
+                    self.stdout.write(f"  {line}")
+
+                timings, rows = [], 0
+                for bbox, start, end in queries:
+                    started = time.perf_counter()
+                    rows += self._run(options, bbox, start, end)
+                    timings.append(time.perf_counter() - started)
+                timings.sort()
+                self.stdout.write(
+                    f"{len(queries)} viewports x up to {options['pages']} pages of {options['page_size']}: "
+                    f"{rows} rows, median {timings[len(timings) // 2] * 1000:.1f} ms, "
+                    f"max {timings[-1] * 1000:.1f} ms per viewport"
+                )
+
+                text = ' '.join(plan)
+                if 'event_public_start_geo_idx' not in text:
+                    self.stderr.write(self.style.ERROR("The partial discovery index is not used."))
+                elif 'TEMP B-TREE' in text.upper():
+                    self.stderr.write(self.style.ERROR("The plan sorts rows instead of walking the index."))
+                else:
+                    self.stdout.write(self.style.SUCCESS("Plan walks event_public_start_geo_idx in order."))
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,101 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from events.addresses import canonical_key
+from events.models import Address, Event, UserAddress
+from events.response_cache import bump_users
+from events.visibility import event_viewer_ids
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge addresses sharing a canonical key into their oldest row, repointing "
+        "events and saved locations, and report how many rows were collapsed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report the duplicates without merging them.")
+
+    def _places(self):
+        """
+        Group the addresses by the key computed from their fields, oldest row first.
+        The stored key is not trusted: rows written outside Address.save()
+        (bulk_create, raw SQL) may lack it or carry an outdated one.
+        """
+        places = defaultdict(list)
+        fields = ('id', 'address_line', 'city', 'postal_code', 'latitude', 'longitude', 'canonical_key')
+        for address in Address.objects.only(*fields).order_by('id').iterator():
+            key = canonical_key(
+                address.address_line, address.latitude, address.longitude, address.city, address.postal_code,
+            )
+            places[key].append(address)
+        return places
+
+    def _refresh_keys(self, places):
+        stale = []
+        for key, rows in places.items():
+            if rows[0].canonical_key != key:
+                rows[0].canonical_key = key
+                stale.append(rows[0])
+        # canonical_key is unique: clear the stale keys first so that no row
+        # transiently takes a key another row still holds
+        Address.objects.filter(id__in=[address.id for address in stale]).update(canonical_key='')
+        Address.objects.bulk_update(stale, ['canonical_key'], batch_size=BATCH_SIZE)
+        return len(stale)
+
+    def _merge(self, keep, duplicates, stats):
+        events = Event.objects.filter(address_id__in=duplicates)
+        event_ids = list(events.values_list('id', flat=True))
+        # bulk update: Event.save() would set the geohash, so copy it here
+        stats['events'] += events.update(address_id=keep.id, geohash=keep.geohash)
+        bump_users(event_viewer_ids(event_ids))
+
+        # (user, address) is unique: a user keeps one saved location per place
+        by_user = defaultdict(list)
+        for row in UserAddress.objects.filter(address_id__in=[keep.id] + duplicates).order_by('id'):
+            by_user[row.user_id].append(row)
+        repoint, drop = [], []
+        for rows in by_user.values():
+            kept = next((row for row in rows if row.address_id == keep.id), rows[0])
+            drop += [row.id for row in rows if row is not kept]
+            if kept.address_id != keep.id:
+                kept.address_id = keep.id
+                repoint.append(kept)
+        UserAddress.objects.filter(id__in=drop).delete()
+        UserAddress.objects.bulk_update(repoint, ['address'], batch_size=BATCH_SIZE)
+        stats['user_addresses'] += len(repoint)
+        stats['user_addresses_dropped'] += len(drop)
+
+        stats['addresses'] += Address.objects.filter(id__in=duplicates).delete()[1].get(Address._meta.label, 0)
+
+    def handle(self, *args, **options):
+        stats = defaultdict(int)
+        places = self._places()
+        total = sum(len(rows) for rows in places.values())
+        groups = [rows for rows in places.values() if len(rows) > 1]
+        stats['duplicates'] = sum(len(rows) - 1 for rows in groups)
+        if not options['dry_run']:
+            with transaction.atomic():
+                # duplicates go first, so each key is held by a single row when it is written
+                for rows in groups:
+                    self._merge(rows[0], [address.id for address in rows[1:]], stats)
+                stats['keys'] = self._refresh_keys(places)
+
+        self.stdout.write(
+            f"{total} addresses, {len(groups)} places with duplicates, {stats['duplicates']} duplicate rows. "
+            "Places match on rounded coordinates and normalised address line, city and postal code: "
+            "rows differing in city or postal code are kept apart."
+        )
+        if options['dry_run']:
+            self.stdout.write("Dry run: nothing merged.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Collapsed {stats['addresses']} addresses into {len(groups)}: "
+            f"{stats['events']} events and {stats['user_addresses']} saved locations repointed, "
+            f"{stats['user_addresses_dropped']} duplicate saved locations removed, "
+            f"{stats['keys']} keys refreshed."
+        ))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events.models import EventChange
+
+
+class Command(BaseCommand):
+    help = "Delete EventChange rows older than the sync retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'EVENT_CHANGE_RETENTION_DAYS', 30),
+            help="Keep changes from the last N days (default: EVENT_CHANGE_RETENTION_DAYS).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = EventChange.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} event changes older than {options['days']} days."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from events.visibility import BATCH_SIZE, rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the EventVisibility table from events, circles and memberships."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Events processed per batch.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            added, updated, removed = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Event visibility rebuilt: {added} added, {updated} updated, {removed} removed."
+        ))
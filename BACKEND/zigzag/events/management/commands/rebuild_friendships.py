@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from events.friendships import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the Friendship table (friend graph) from circle memberships."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            added, updated, removed = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"Friendships rebuilt: {added} added, {updated} updated, {removed} removed."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from events.response_cache import cache_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the per-user response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them.")
+
+    def handle(self, *args, **options):
+        for endpoint, counts in cache_stats().items():
+            total = counts['hits'] + counts['misses']
+            ratio = f"{counts['hits'] / total:.1%}" if total else "n/a"
+            self.stdout.write(f"{endpoint:<10} hits={counts['hits']:<8} misses={counts['misses']:<8} hit rate={ratio}")
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from events.outbox import send_queued
+
+
+class Command(BaseCommand):
+    help = "Send the emails queued in the outbox, in batches, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100),
+            help="Emails sent per batch over one connection.",
+        )
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            stats = send_queued(options['batch_size'], options['max_batches'])
+            if stats['batches'] or not options['loop']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{stats['sent']} sent, {stats['retried']} to retry, {stats['failed']} failed "
+                    f"in {stats['batches']} batches ({elapsed:.1f} s)"
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
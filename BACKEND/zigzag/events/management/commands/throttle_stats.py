@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from events.throttle_store import denied_counts
+
+
+class Command(BaseCommand):
+    help = "Show how many requests each throttle scope has rejected."
+
+    def handle(self, *args, **options):
+        counts = denied_counts()
+        self.stdout.write(
+            f"Throttle stores: {getattr(settings, 'THROTTLE_STORE', 'database')} "
+            f"(cost throttle: {getattr(settings, 'THROTTLE_COST_STORE', 'cache')})"
+        )
+        if not counts:
+            self.stdout.write("No request throttled.")
+            return
+        for scope, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            self.stdout.write(f"  {scope}: {count}")
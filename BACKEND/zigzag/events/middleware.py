@@ -1,18 +1,96 @@
 import os
 import logging
+import re
+from functools import lru_cache
+from urllib.parse import urlparse
 from ipware import get_client_ip
 from django.http import HttpResponseForbidden, JsonResponse
 
+from .allowlists import DomainAllowlist, IPAllowlist
+
 logger = logging.getLogger(__name__)
 
+# API paths authenticated by a secret in the URL and polled by third-party servers
+# (calendar apps), which cannot match the IP/domain allow-lists.
+PUBLIC_API_PREFIXES = ('/api/events/ical/feed/',)
+
+# Kinds of API clients, see classify_request
+CAPACITOR, BROWSER, SERVER = 'capacitor', 'browser', 'server'
+
+# Distinct (origin, referer origin, user agent) tuples whose classification is kept;
+# a client sends the same headers on every call, so a small cache covers them
+CLASSIFIER_CACHE_SIZE = 4096
+
+# Scheme and authority of a URL (RFC 3986 appendix B), all the classifier looks at
+_URL_ORIGIN = re.compile(r'([^:/?#]+:)?(//[^/?#]*)?')
+
+
+def url_origin(url):
+    """'https://app.zigzag.fr/invite/abc?x=1' -> 'https://app.zigzag.fr'."""
+    return _URL_ORIGIN.match(url).group(0) if url else ''
+
+
+def _parse_url(url):
+    if not url:
+        return None
+    try:
+        return urlparse(url)
+    except ValueError:
+        return None
+
+
+def _domain(parsed):
+    """Domain of a parsed Origin/Referer; capacitor:// keeps its scheme."""
+    if parsed is None:
+        return None
+    if parsed.scheme == 'capacitor':
+        return f"{parsed.scheme}://{parsed.netloc}".lower()
+    return parsed.netloc.lower()
+
+
+def _is_localhost_http(parsed):
+    return parsed is not None and parsed.scheme in {'http', 'https'} and parsed.netloc == 'localhost'
+
+
+@lru_cache(maxsize=CLASSIFIER_CACHE_SIZE)
+def classify_request(origin, referer, user_agent):
+    """
+    Classify an API request from its Origin, Referer and User-Agent headers,
+    each URL being parsed once. Pass the origins (see url_origin) rather than
+    the raw headers so paths and query strings, which may carry invite tokens,
+    are neither cached nor splitting the cache. Returns (kind, domain): kind is CAPACITOR
+    (native app), BROWSER or SERVER, domain the one of the Origin, else of
+    the Referer, or None.
+    """
+    po, pr = _parse_url(origin), _parse_url(referer)
+    domain = _domain(po) or _domain(pr) or None
+    schemes = {po.scheme if po else '', pr.scheme if pr else ''}
+
+    # TODO : adjust this condition when we have a stable user-agent for zigzag iOS app
+    if (
+        'capacitor' in schemes or
+        _is_localhost_http(po) or _is_localhost_http(pr) or
+        'capacitor' in user_agent or
+        ('cfnetwork' in user_agent and 'darwin' in user_agent) or
+        'zigzag' in user_agent or
+        'ZIGZAG-WebView' in user_agent
+    ):
+        return CAPACITOR, domain
+    if schemes & {'http', 'https'}:
+        return BROWSER, domain
+    return SERVER, domain
+
+
 class SecurityMiddleware:
     """
     Security middleware that provides IP and domain filtering for different parts of the application.
     
     Environment variables:
-    - ADMIN_ALLOWED_IPS: Comma-separated list of IPs allowed to access admin panel
-    - API_ALLOWED_IPS: Comma-separated list of IPs allowed to access API endpoints
-    - API_ALLOWED_DOMAINS: Comma-separated list of domains allowed to make API calls
+    - ADMIN_ALLOWED_IPS: Comma-separated list of IPs or CIDR ranges allowed to access admin panel
+    - API_ALLOWED_IPS: Comma-separated list of IPs or CIDR ranges allowed to access API endpoints
+    - API_ALLOWED_DOMAINS: Comma-separated list of domains allowed to make API calls,
+      '*.example.com' allowing every subdomain of example.com
+    (see events.allowlists)
     - SECURITY_ENABLED: Set to 'True' to enable security filtering (default: True)
     """
     
@@ -21,15 +99,15 @@ class SecurityMiddleware:
         self.security_enabled = os.getenv('SECURITY_ENABLED', 'True').lower() == 'true'
         
         # Load allowed IPs and domains
-        self.admin_allowed_ips = self._parse_list(os.getenv('ADMIN_ALLOWED_IPS', ''))
-        self.api_allowed_ips = self._parse_list(os.getenv('API_ALLOWED_IPS', ''))
-        self.api_allowed_domains = self._parse_list(os.getenv('API_ALLOWED_DOMAINS', ''))
+        self.admin_allowed_ips = IPAllowlist(self._parse_list(os.getenv('ADMIN_ALLOWED_IPS', '')))
+        self.api_allowed_ips = IPAllowlist(self._parse_list(os.getenv('API_ALLOWED_IPS', '')))
+        self.api_allowed_domains = DomainAllowlist(self._parse_list(os.getenv('API_ALLOWED_DOMAINS', '')))
 
     def _parse_list(self, env_var):
-        """Parse comma-separated environment variable into a list."""
+        """Parse comma-separated environment variable into a set."""
         if not env_var:
-            return []
-        return [item.strip() for item in env_var.split(',') if item.strip()]
+            return frozenset()
+        return frozenset(item.strip() for item in env_var.split(',') if item.strip())
 
     def __call__(self, request):
         if not self.security_enabled:
@@ -47,6 +125,8 @@ class SecurityMiddleware:
             return self._check_admin_access(request, client_ip)
         
         # API protection
+        if request.path.startswith(PUBLIC_API_PREFIXES):
+            return self.get_response(request)
         if request.path.startswith('/api/'):
             return self._check_api_access(request, client_ip)
 
@@ -75,19 +155,20 @@ class SecurityMiddleware:
         # user_agent = request.META.get('HTTP_USER_AGENT', '')
         # logger.info(f"API access - UA: {user_agent}, Origin: {origin}, Referer: {referer}")
         
-        # Still need origin/referer for domain extraction, but only when needed
-        origin = request.META.get('HTTP_ORIGIN', '')
-        referer = request.META.get('HTTP_REFERER', '')
+        meta = request.META
+        kind, domain = classify_request(
+            url_origin(meta.get('HTTP_ORIGIN', '')), url_origin(meta.get('HTTP_REFERER', '')),
+            meta.get('HTTP_USER_AGENT', ''),
+        )
 
-        # Capacitor/iOS native app detection
-        if self._is_capacitor_request(request):
+        # Capacitor/iOS native app
+        if kind == CAPACITOR:
             # logger.info(f"API access granted for Capacitor/iOS app (IP: {client_ip})")
             return self.get_response(request)
 
         # Real browser requests (http/https origins)
-        if self._is_browser_request(request):
+        if kind == BROWSER:
             if self.api_allowed_domains:
-                domain = self._extract_domain(origin) or self._extract_domain(referer)
                 # Enforce whitelist strictly: deny if domain is missing or not allowed
                 if not domain:
                     logger.warning("API access denied due to missing or malformed Origin/Referer")
@@ -101,68 +182,12 @@ class SecurityMiddleware:
             return self.get_response(request)
 
         # Explicit server-to-server requests (fallback)
-        if self._is_server_to_server(request):
-            # logger.info(f"API access server_to_server try for server IP: {client_ip}")  # Commented out to reduce RAM usage
-            if self.api_allowed_ips and client_ip not in self.api_allowed_ips:
-                logger.warning(f"API access denied for server IP: {client_ip}")
-                return self._deny_access(request, "API access denied")
-            return self.get_response(request)
-
+        # logger.info(f"API access server_to_server try for server IP: {client_ip}")  # Commented out to reduce RAM usage
+        if self.api_allowed_ips and client_ip not in self.api_allowed_ips:
+            logger.warning(f"API access denied for server IP: {client_ip}")
+            return self._deny_access(request, "API access denied")
         return self.get_response(request)
 
-    def _extract_domain(self, url):
-        """Extract domain from URL."""
-        if not url:
-            return None
-        
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(url)
-            # Preserve scheme for Capacitor so we can recognize it if needed
-            if parsed.scheme == 'capacitor':
-                return f"{parsed.scheme}://{parsed.netloc}".lower()
-            return parsed.netloc.lower()
-        except Exception:
-            return None
-
-    def _is_capacitor_request(self, request):
-        origin = request.META.get('HTTP_ORIGIN', '')
-        referer = request.META.get('HTTP_REFERER', '')
-        from urllib.parse import urlparse
-        po = urlparse(origin) if origin else None
-        pr = urlparse(referer) if referer else None
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-
-        def is_localhost_http(p): 
-            return getattr(p, 'scheme', '') in {'http','https'} and getattr(p, 'netloc', '') == 'localhost'
-
-        has_cap_origin = (getattr(po, 'scheme', '') == 'capacitor') or (getattr(pr, 'scheme', '') == 'capacitor')
-        has_android_like_origin = is_localhost_http(po) or is_localhost_http(pr)
-
-        # TODO : adjust this condition when we have a stable user-agent for zigzag iOS app
-        return (
-            has_cap_origin or
-            has_android_like_origin or
-            'capacitor' in user_agent or
-            ('cfnetwork' in user_agent and 'darwin' in user_agent) or
-            'zigzag' in user_agent or 
-            'ZIGZAG-WebView' in user_agent
-        )
-
-    def _is_browser_request(self, request):
-        origin = request.META.get('HTTP_ORIGIN', '')
-        referer = request.META.get('HTTP_REFERER', '')
-        if not (origin or referer):
-            return False
-        from urllib.parse import urlparse
-        po = urlparse(origin) if origin else None
-        pr = urlparse(referer) if referer else None
-        schemes = {getattr(po, 'scheme', ''), getattr(pr, 'scheme', '')}
-        return bool(schemes & {'http', 'https'})
-
-    def _is_server_to_server(self, request):
-        return not self._is_browser_request(request) and not self._is_capacitor_request(request)
-
     def _deny_access(self, request, message):
         """Return appropriate denial response."""
         if request.path.startswith('/api/'):
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+from events import geo
+
+
+def populate_geohash(apps, schema_editor):
+    Address = apps.get_model('events', 'Address')
+    addresses = list(Address.objects.only('id', 'latitude', 'longitude'))
+    for address in addresses:
+        address.geohash = geo.encode(address.latitude, address.longitude)
+    Address.objects.bulk_update(addresses, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_circle_is_invitation_circle_circle_linked_event_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
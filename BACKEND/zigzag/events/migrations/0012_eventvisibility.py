@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_visibility(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Circle = apps.get_model('events', 'Circle')
+    EventVisibility = apps.get_model('events', 'EventVisibility')
+
+    rows = {}
+    for event_id, creator_id in Event.objects.values_list('id', 'creator_id'):
+        rows[(creator_id, event_id)] = (None, set())
+
+    circle_tags = {}
+    for circle_id, name in Circle.categories.through.objects.values_list('circle_id', 'tag__name'):
+        circle_tags.setdefault(circle_id, set()).add(name)
+    circle_members = {}
+    for circle_id, user_id in Circle.members.through.objects.values_list('circle_id', 'user_id'):
+        circle_members.setdefault(circle_id, []).append(user_id)
+
+    event_circles = Event.circles.through.objects.order_by('circle_id').values_list('event_id', 'circle_id')
+    for event_id, circle_id in event_circles:
+        for user_id in circle_members.get(circle_id, []):
+            via, tags = rows.get((user_id, event_id), (None, set()))
+            rows[(user_id, event_id)] = (via or circle_id, tags | circle_tags.get(circle_id, set()))
+
+    EventVisibility.objects.bulk_create(
+        [
+            EventVisibility(user_id=user_id, event_id=event_id, via_circle_id=via, tags=sorted(tags))
+            for (user_id, event_id), (via, tags) in rows.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_address_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tags', models.JSONField(blank=True, default=list)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibilities', to='events.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_visibilities', to=settings.AUTH_USER_MODEL)),
+                ('via_circle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.circle')),
+            ],
+            options={
+                'unique_together': {('user', 'event')},
+            },
+        ),
+        migrations.RunPython(populate_visibility, migrations.RunPython.noop),
+    ]
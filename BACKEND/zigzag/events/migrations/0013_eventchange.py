@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_eventvisibility'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.UUIDField()),
+                ('action', models.CharField(choices=[('upsert', 'Upsert'), ('remove', 'Remove')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='events_even_user_id_abdfba_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_eventchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_time', 'id'], name='event_start_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['creator', 'start_time', 'id'], name='event_creator_start_id_idx'),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+from events import schedule
+
+
+def populate_schedule(apps, schema_editor):
+    # Historical models have no sync_schedule(): mirror the logic of Profile.sync_schedule
+    Profile = apps.get_model('events', 'Profile')
+    fields = ['remote_days_mask', 'free_days_mask'] + [
+        f'{day}_free_{bound}' for day in schedule.DAY_FIELDS for bound in ('start', 'end')
+    ]
+    profiles = list(Profile.objects.only('id', 'timetable', 'remote_days'))
+    for profile in profiles:
+        profile.remote_days_mask = schedule.weekday_mask(profile.remote_days)
+        windows = {weekday: (start, end) for weekday, start, end in schedule.timetable_windows(profile.timetable)}
+        profile.free_days_mask = sum(1 << weekday for weekday in windows)
+        for weekday, day in enumerate(schedule.DAY_FIELDS):
+            start, end = windows.get(weekday, (None, None))
+            setattr(profile, f'{day}_free_start', start)
+            setattr(profile, f'{day}_free_end', end)
+    Profile.objects.bulk_update(profiles, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_calendarfeed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='free_days_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='friday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='friday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='monday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='monday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='remote_days_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='saturday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='saturday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='sunday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='sunday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='thursday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='thursday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='tuesday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='tuesday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='wednesday_free_end',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='wednesday_free_start',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:31
+
+from django.db import migrations
+
+SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+def _index_name(column, suffix):
+    return f'events_user_{column}_{suffix}'
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    Indexes for events.search: trigram GIN on PostgreSQL (icontains), NOCASE
+    B-tree on SQLite (istartswith). Other backends get no extra index.
+    """
+    table = schema_editor.quote_name(apps.get_model('events', 'User')._meta.db_table)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in SEARCH_COLUMNS:
+            # Django's icontains/istartswith compare UPPER("column"::text)
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {_index_name(column, "trgm")} ON {table} '
+                f'USING gin ((UPPER({schema_editor.quote_name(column)}::text)) gin_trgm_ops)'
+            )
+    elif vendor == 'sqlite':
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {_index_name(column, "nocase")} ON {table} '
+                f'({schema_editor.quote_name(column)} COLLATE NOCASE)'
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    for column in SEARCH_COLUMNS:
+        for suffix in ('trgm', 'nocase'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS {_index_name(column, suffix)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0016_profile_schedule_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
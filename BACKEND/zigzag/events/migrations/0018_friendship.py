@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from events.friendships import shared_circle_counts
+
+
+def populate_friendships(apps, schema_editor):
+    Circle = apps.get_model('events', 'Circle')
+    Friendship = apps.get_model('events', 'Friendship')
+    Friendship.objects.bulk_create(
+        [
+            Friendship(user_id=user_id, friend_id=friend_id, shared_circle_count=shared)
+            for (user_id, friend_id), shared in shared_circle_counts(Circle.members.through).items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0017_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_circle_count', models.PositiveIntegerField(default=0)),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friendships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(populate_friendships, migrations.RunPython.noop),
+    ]
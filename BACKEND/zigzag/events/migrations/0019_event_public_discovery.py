@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+def populate_event_geohash(apps, schema_editor):
+    Address = apps.get_model('events', 'Address')
+    Event = apps.get_model('events', 'Event')
+    Event.objects.filter(address__isnull=False).update(
+        geohash=models.Subquery(Address.objects.filter(pk=models.OuterRef('address_id')).values('geohash')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0018_friendship'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='is_public',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['start_time', 'id', 'geohash'], name='event_public_start_geo_idx'),
+        ),
+        migrations.RunPython(populate_event_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+from events import addresses
+
+
+def populate_canonical_key(apps, schema_editor):
+    Address = apps.get_model('events', 'Address')
+    rows = list(Address.objects.only('id', 'address_line', 'latitude', 'longitude'))
+    for address in rows:
+        address.canonical_key = addresses.canonical_key(address.address_line, address.latitude, address.longitude)
+    Address.objects.bulk_update(rows, ['canonical_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0019_event_public_discovery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='canonical_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(populate_canonical_key, migrations.RunPython.noop),
+    ]
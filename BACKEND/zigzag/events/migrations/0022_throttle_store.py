@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0021_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.FloatField()),
+                ('expires_at', models.FloatField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ThrottleDenial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=100, unique=True)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('last_denied_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:12
+
+from collections import Counter
+
+from django.db import migrations, models
+
+from events import addresses
+
+
+def refresh_canonical_key(apps, schema_editor):
+    """The key now covers city and postal code; duplicates must be merged before the key can be unique."""
+    Address = apps.get_model('events', 'Address')
+    rows = list(Address.objects.only('id', 'address_line', 'city', 'postal_code', 'latitude', 'longitude'))
+    for address in rows:
+        address.canonical_key = addresses.canonical_key(
+            address.address_line, address.latitude, address.longitude, address.city, address.postal_code,
+        )
+    Address.objects.bulk_update(rows, ['canonical_key'], batch_size=500)
+    duplicates = sum(n - 1 for n in Counter(address.canonical_key for address in rows).values())
+    if duplicates:
+        raise RuntimeError(
+            f"{duplicates} duplicate addresses: run `manage.py merge_duplicate_addresses` before this migration."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0022_throttle_store'),
+    ]
+
+    operations = [
+        migrations.RunPython(refresh_canonical_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='address',
+            name='canonical_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddConstraint(
+            model_name='address',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('canonical_key', ''), _negated=True), fields=('canonical_key',),
+                name='address_canonical_key_unique',
+            ),
+        ),
+    ]
@@ -1,6 +1,12 @@
+import math
 import uuid
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+
+from . import addresses, geo, schedule
 
 
 class User(AbstractUser):
@@ -10,6 +16,33 @@ class User(AbstractUser):
         return self.username
 
 
+class ProfileQuerySet(models.QuerySet):
+    """
+    Schedule filters on the integer mirror of timetable / remote_days.
+    Weekdays are 0-6 (Monday = 0) or names, as accepted by schedule.weekday_index.
+    """
+
+    def remote_on(self, *weekdays):
+        """Profiles working remotely on all the given weekdays."""
+        return self.filter(remote_days_mask__in=schedule.masks_with(*map(schedule.weekday_index, weekdays)))
+
+    def free_on(self, *weekdays):
+        """Profiles with a timetable window on all the given weekdays."""
+        return self.filter(free_days_mask__in=schedule.masks_with(*map(schedule.weekday_index, weekdays)))
+
+    def free_during(self, weekday, start_minute, end_minute):
+        """
+        Profiles whose window of ``weekday`` covers [start_minute, end_minute)
+        (minutes since midnight; windows of the previous day running past
+        midnight are not considered).
+        """
+        day = schedule.DAY_FIELDS[schedule.weekday_index(weekday)]
+        return self.free_on(weekday).filter(**{
+            f'{day}_free_start__lte': start_minute,
+            f'{day}_free_end__gte': end_minute,
+        })
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     timetable = models.JSONField(default=dict, blank=True, null=True)
@@ -24,9 +57,48 @@ class Profile(models.Model):
     timezone = models.CharField(max_length=64, default='UTC')
     utc_offset_minutes = models.IntegerField(default=0)
 
+    # Integer mirror of remote_days and timetable, kept in sync by save():
+    # bit i of a mask is weekday i (Monday = 0), windows are minutes since midnight
+    remote_days_mask = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    free_days_mask = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False)
+    monday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    monday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    tuesday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    tuesday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    wednesday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    wednesday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    thursday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    thursday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    friday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    friday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    saturday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    saturday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+    sunday_free_start = models.SmallIntegerField(null=True, blank=True, editable=False)
+    sunday_free_end = models.SmallIntegerField(null=True, blank=True, editable=False)
+
+    objects = ProfileQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    def sync_schedule(self):
+        """Recompute the integer schedule columns from timetable and remote_days."""
+        self.remote_days_mask = schedule.weekday_mask(self.remote_days)
+        windows = {weekday: (start, end) for weekday, start, end in schedule.timetable_windows(self.timetable)}
+        self.free_days_mask = sum(1 << weekday for weekday in windows)
+        for weekday, day in enumerate(schedule.DAY_FIELDS):
+            start, end = windows.get(weekday, (None, None))
+            setattr(self, f'{day}_free_start', start)
+            setattr(self, f'{day}_free_end', end)
+
+    def free_windows(self):
+        """(weekday, start_minute, end_minute) tuples read from the integer columns."""
+        return tuple(
+            (weekday, getattr(self, f'{day}_free_start'), getattr(self, f'{day}_free_end'))
+            for weekday, day in enumerate(schedule.DAY_FIELDS)
+            if getattr(self, f'{day}_free_start') is not None
+        )
+
     def save(self, *args, **kwargs):
         if not self.timetable:
             self.timetable = {
@@ -48,9 +120,35 @@ class Profile(models.Model):
                 "Saturday": False,
                 "Sunday": False,
             }
+        self.sync_schedule()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'timetable', 'remote_days'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(SCHEDULE_FIELDS)
         super().save(*args, **kwargs)
 
 
+SCHEDULE_FIELDS = ['remote_days_mask', 'free_days_mask'] + [
+    f'{day}_free_{bound}' for day in schedule.DAY_FIELDS for bound in ('start', 'end')
+]
+
+
+class AddressQuerySet(models.QuerySet):
+
+    def canonical(self, **fields):
+        """
+        Return (address, created): the existing address with the same canonical key
+        as ``fields``, or a new one. Existing rows are never modified, since
+        several events and users may share them. The key is unique, so when two
+        requests insert the same place at once the loser reads the winner's row
+        (get_or_create retries the lookup on IntegrityError).
+        """
+        key = addresses.canonical_key(
+            fields.get('address_line'), fields['latitude'], fields['longitude'],
+            fields.get('city'), fields.get('postal_code'),
+        )
+        return self.get_or_create(canonical_key=key, defaults=fields)
+
+
 class Address(models.Model):
     address_line = models.CharField(max_length=500)
     city = models.CharField(max_length=100, blank=True, null=True)
@@ -59,15 +157,51 @@ class Address(models.Model):
     postal_code = models.CharField(max_length=30, blank=True, null=True)
     latitude = models.FloatField()
     longitude = models.FloatField()
+    # Spatial index key derived from latitude/longitude (see events.geo)
+    geohash = models.CharField(max_length=geo.GEOHASH_PRECISION, blank=True, default='', db_index=True, editable=False)
+    # Deduplication key: rounded coordinates + normalised address line, city and postal code (see events.addresses)
+    canonical_key = models.CharField(max_length=40, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     # Optional: owners relation via UserAddress
     owners = models.ManyToManyField(User, through='UserAddress', related_name='addresses', blank=True)
 
+    objects = AddressQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # rows written by bulk_create or raw SQL have no key until merge_duplicate_addresses refreshes it
+            models.UniqueConstraint(
+                fields=['canonical_key'], condition=~models.Q(canonical_key=''), name='address_canonical_key_unique',
+            ),
+        ]
+
     def __str__(self):
         return self.address_line
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+            self.canonical_key = addresses.canonical_key(
+                self.address_line, self.latitude, self.longitude, self.city, self.postal_code,
+            )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if {'latitude', 'longitude'} & set(update_fields):
+                update_fields = set(update_fields) | {'geohash'}
+            if {'address_line', 'latitude', 'longitude', 'city', 'postal_code'} & set(update_fields):
+                update_fields = set(update_fields) | {'canonical_key'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    def delete_if_unused(self):
+        """Delete the address unless an event or a saved location still points to it."""
+        if self.events.exists() or UserAddress.objects.filter(address=self).exists():
+            return False
+        self.delete()
+        return True
+
 
 class UserAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -104,6 +238,87 @@ class Circle(models.Model):
         return self.name
 
 
+class EventQuerySet(models.QuerySet):
+
+    def visible_to(self, user):
+        """Events created by the user or linked to one of their circles (read from EventVisibility)."""
+        return self.filter(visibilities__user=user)
+
+    def tagged_for(self, user, tag_ids):
+        """
+        Events linked to one of the user's circles carrying any of the given tags,
+        plus the user's own events that have no circle at all.
+        """
+        tagged = Event.circles.through.objects.filter(
+            circle__members=user, circle__categories__id__in=tag_ids
+        ).values('event_id')
+        has_circle = Event.circles.through.objects.filter(event_id=models.OuterRef('pk'))
+        return self.filter(Q(id__in=tagged) | (Q(creator=user) & ~models.Exists(has_circle)))
+
+    def public(self):
+        """Public events, read through the partial event_public_start_geo_idx index."""
+        return self.filter(is_public=True)
+
+    def near(self, lat, lng, radius_km):
+        """
+        Events whose address is within ``radius_km`` of (lat, lng), annotated with
+        ``distance_km``. The bounding box of the circle goes through the geohash
+        index first; the exact haversine distance is computed by the database on
+        the remaining rows only.
+        """
+        phi = math.radians(lat)
+        event_phi = Radians(F('address__latitude'))
+        half_dlat = (event_phi - Value(phi)) / Value(2.0)
+        half_dlng = (Radians(F('address__longitude')) - Value(math.radians(lng))) / Value(2.0)
+        a = Power(Sin(half_dlat), 2) + Value(math.cos(phi)) * Cos(event_phi) * Power(Sin(half_dlng), 2)
+        distance = Value(2 * geo.EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+        return self.in_bbox(*geo.bbox_around(lat, lng, radius_km)).annotate(
+            distance_km=ExpressionWrapper(distance, output_field=models.FloatField())
+        ).filter(distance_km__lte=radius_km)
+
+    def discoverable(self, start, end=None, bbox=None, tag_ids=None, precision=None):
+        """
+        Public events starting in [start, end), optionally inside ``bbox``
+        (south, west, north, east) and linked to a circle carrying one of
+        ``tag_ids``, in keyset order (start_time, id).
+        """
+        events = self.public().filter(start_time__gte=start)
+        if end is not None:
+            events = events.filter(start_time__lt=end)
+        if bbox is not None:
+            events = events.in_bbox(*bbox, precision=precision, field='geohash')
+        if tag_ids:
+            tagged = Event.circles.through.objects.filter(circle__categories__id__in=tag_ids).values('event_id')
+            events = events.filter(id__in=tagged)
+        return events.order_by('start_time', 'id')
+
+    def in_cells(self, ranges, field='address__geohash'):
+        """Events whose geohash (``field``) falls in one of the ``(lo, hi)`` ranges."""
+        cells = Q()
+        for lo, hi in ranges:
+            cell = Q(**{f'{field}__gte': lo})
+            if hi is not None:
+                cell &= Q(**{f'{field}__lt': hi})
+            cells |= cell
+        return self.filter(cells)
+
+    def in_bbox(self, south, west, north, east, precision=None, field='address__geohash'):
+        """
+        Events whose address lies inside the bounding box.
+        The geohash ranges hit the Address.geohash index (or Event.geohash with
+        field='geohash'), the lat/lng bounds trim the cell edges.
+        """
+        if west <= east:
+            longitude = Q(address__longitude__gte=west, address__longitude__lte=east)
+        else:
+            # bbox crosses the antimeridian
+            longitude = Q(address__longitude__gte=west) | Q(address__longitude__lte=east)
+
+        return self.in_cells(geo.covering_ranges(south, west, north, east, precision), field).filter(
+            longitude, address__latitude__gte=south, address__latitude__lte=north
+        )
+
+
 class Event(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=200)
@@ -124,5 +339,162 @@ class Event(models.Model):
     # Invitation token for generating invitation links
     invitation_token = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="Token for invitation links")
 
+    # Public events are listed by the discovery endpoint to every user
+    is_public = models.BooleanField(default=False)
+    # Copy of address.geohash, so public discovery filters on a single index
+    geohash = models.CharField(max_length=geo.GEOHASH_PRECISION, blank=True, default='', editable=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the event list, see EventViewSet.list
+            models.Index(fields=['start_time', 'id'], name='event_start_id_idx'),
+            models.Index(fields=['creator', 'start_time', 'id'], name='event_creator_start_id_idx'),
+            # public discovery: time-ordered keyset scan, bbox filtered on the geohash in the index
+            models.Index(
+                fields=['start_time', 'id', 'geohash'], name='event_public_start_geo_idx',
+                condition=Q(is_public=True),
+            ),
+        ]
+
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        self.geohash = self.address.geohash if self.address_id else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'address', 'address_id'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
+class EventVisibility(models.Model):
+    """
+    Denormalized "who can see which event": one row per (user, event) for the event
+    creator and every member of a circle linked to the event.
+    Kept in sync by events.signals; rebuild with `manage.py rebuild_event_visibility`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_visibilities')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='visibilities')
+    # one of the user's circles linked to the event, null when visible only as creator
+    via_circle = models.ForeignKey(Circle, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # sorted tag names of the user's circles linked to the event
+    tags = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'event')
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.event_id}"
+
+
+class Friendship(models.Model):
+    """
+    Denormalized friend graph: one row per ordered pair of users sharing at least
+    one circle, in both directions, with the number of circles they share.
+    Kept in sync by events.signals; rebuild with `manage.py rebuild_friendships`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friendships')
+    friend = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    shared_circle_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'friend')
+
+    def __str__(self):
+        return f"{self.user_id} <-> {self.friend_id} ({self.shared_circle_count})"
+
+
+class EventChange(models.Model):
+    """
+    Per-user change log read by the sync endpoint: an event entered or changed in
+    (upsert) or left (remove) the user's visible set. event_id is not a foreign
+    key so tombstones outlive deleted events.
+    """
+    UPSERT = 'upsert'
+    REMOVE = 'remove'
+    ACTION_CHOICES = [(UPSERT, 'Upsert'), (REMOVE, 'Remove')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='event_changes')
+    event_id = models.UUIDField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.action} {self.event_id} for {self.user_id}"
+
+
+class CalendarFeed(models.Model):
+    """
+    Secret webcal subscription of a user: anyone holding the token can read the
+    user's calendar feed, so rotating the token revokes previously shared URLs.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Calendar feed of {self.user_id}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox of transactional emails: views queue messages here and
+    `manage.py send_queued_mail` delivers them in batches (see events.outbox).
+    """
+    QUEUED = 'queued'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # queued rows are picked once this is reached; also pushed forward while a worker holds the row
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class ThrottleBucket(models.Model):
+    """
+    Token bucket of one throttle key (scope + client), shared by every worker
+    when THROTTLE_STORE is 'database' (see events.throttle_store).
+    """
+    key = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField()
+    # time.time() of the last write; tokens refill from there
+    refilled_at = models.FloatField()
+    # time.time() at which the bucket is full again and the row can be purged
+    expires_at = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} tokens"
+
+
+class ThrottleDenial(models.Model):
+    """Number of requests a throttle scope has rejected (database store)."""
+    scope = models.CharField(max_length=100, unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+    last_denied_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope}: {self.count} denied"
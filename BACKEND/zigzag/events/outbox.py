@@ -0,0 +1,132 @@
+"""
+Email outbox.
+
+Views call ``enqueue`` which only inserts an OutboundEmail row, so a slow email
+provider never holds a request. ``send_queued`` (run by `manage.py
+send_queued_mail`) claims due rows in batches, sends each batch over one
+backend connection and reschedules failures with exponential backoff until
+EMAIL_OUTBOX_MAX_ATTEMPTS is reached.
+
+Claiming pushes next_attempt_at past a lease, so several workers can run side
+by side; on PostgreSQL rows locked by another worker are skipped.
+"""
+from datetime import timedelta
+
+from anymail.message import AnymailMessage
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def enqueue(subject, body, to, html_body='', from_email=None, reply_to=None, headers=None):
+    """Queue an email; returns the OutboundEmail row."""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        reply_to=list(reply_to or []),
+        headers=headers or {},
+    )
+
+
+def retry_delay(attempts):
+    """Backoff after the ``attempts``-th failure: base, 2 x base, 4 x base... capped."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE_SECONDS', 60)
+    ceiling = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+def _message(email, connection):
+    message = AnymailMessage(
+        subject=email.subject,
+        body=email.body,
+        to=email.to,
+        from_email=email.from_email,
+        reply_to=email.reply_to or None,
+        headers=email.headers or None,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def claim_batch(batch_size):
+    """Take up to ``batch_size`` due queued emails and lease them to this worker."""
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE_SECONDS', 300))
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.QUEUED, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_at=now + lease)
+    return emails
+
+
+def _record_failure(email, exc, max_attempts):
+    """Reschedule ``email`` with backoff, or give up after max_attempts. Returns True if it gave up."""
+    email.attempts += 1
+    email.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return email.status == OutboundEmail.FAILED
+
+
+def send_batch(emails):
+    """Send claimed emails over one connection. Returns (sent, retried, failed) counts."""
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+    sent_ids, given_up = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # provider unreachable: the whole batch counts as one failed attempt
+        given_up = [email for email in emails if _record_failure(email, exc, max_attempts)]
+        return 0, len(emails) - len(given_up), len(given_up)
+    try:
+        for email in emails:
+            try:
+                _message(email, connection).send()
+            except Exception as exc:
+                if _record_failure(email, exc, max_attempts):
+                    given_up.append(email)
+            else:
+                sent_ids.append(email.id)
+    finally:
+        connection.close()
+
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+    return len(sent_ids), len(emails) - len(sent_ids) - len(given_up), len(given_up)
+
+
+def send_queued(batch_size=None, max_batches=None):
+    """
+    Send due emails batch after batch until none is left (or ``max_batches``).
+    Returns {"sent", "retried", "failed", "batches"}.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+    stats = {"sent": 0, "retried": 0, "failed": 0, "batches": 0}
+    while max_batches is None or stats["batches"] < max_batches:
+        emails = claim_batch(batch_size)
+        if not emails:
+            break
+        sent, retried, failed = send_batch(emails)
+        stats["sent"] += sent
+        stats["retried"] += retried
+        stats["failed"] += failed
+        stats["batches"] += 1
+    return stats
@@ -0,0 +1,152 @@
+"""
+Per-user response cache for read endpoints (event list, markers, circles, tags).
+
+Every user has a "visibility version" stored in Django's cache. Cached responses
+are keyed by endpoint, user, that version and the request parameters, so bumping
+the version (see events.signals) makes all the user's cached responses
+unreachable at once; they then simply expire. A global version covers data
+shared by everybody, such as tag names.
+
+The versions are only trustworthy in a cache shared by every worker process
+(file, database, memcached, redis): with the per-process locmem default a
+version bump in one worker is not seen by the others. ``enabled()`` is
+therefore false on process-local backends unless RESPONSE_CACHE_ENABLED says
+otherwise, and everything keyed by the versions (cached responses, marker
+clusters) then falls back to computing the response every time. ETags
+(events.etags) are built from database state and do not depend on it.
+"""
+import hashlib
+import json
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+GLOBAL_VERSION_KEY = 'events:version:global'
+ENDPOINTS = ('events', 'markers', 'circles', 'tags')
+# Backends whose content is private to the process (or not kept at all)
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def enabled():
+    """RESPONSE_CACHE_ENABLED if set, else whether the default cache is shared between processes."""
+    setting = getattr(settings, 'RESPONSE_CACHE_ENABLED', None)
+    if setting is not None:
+        return setting
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_BACKENDS
+
+
+def _version_key(user_id):
+    return f'events:version:user:{user_id}'
+
+
+def _stats_key(endpoint, outcome):
+    return f'events:response_cache:{endpoint}:{outcome}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def current_versions(user_id):
+    """Return (user_version, global_version), creating missing versions."""
+    keys = [_version_key(user_id), GLOBAL_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            # add() so concurrent requests agree on a single version
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return versions[keys[0]], versions[keys[1]]
+
+
+def bump_users(user_ids):
+    """
+    Invalidate every cached response of the given users once the current
+    transaction commits, so concurrent requests cannot cache the old data
+    under the new version.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(
+            lambda: cache.set_many({_version_key(user_id): _new_version() for user_id in user_ids}, None)
+        )
+
+
+def bump_global():
+    """Invalidate every cached response of every user (after commit, as bump_users)."""
+    transaction.on_commit(lambda: cache.set(GLOBAL_VERSION_KEY, _new_version(), None))
+
+
+def response_key(endpoint, request):
+    """Cache key of a response for the requesting user and parameters."""
+    user_version, global_version = current_versions(request.user.id)
+    params = json.dumps(
+        {'query': sorted(request.query_params.lists()), 'data': request.data},
+        sort_keys=True, default=str,
+    )
+    digest = hashlib.sha1(params.encode()).hexdigest()
+    return f'events:response:{endpoint}:{request.user.id}:{user_version}:{global_version}:{digest}'
+
+
+def _count(endpoint, outcome):
+    key = _stats_key(endpoint, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def cached_response(endpoint):
+    """
+    Cache the data of successful responses of a view method per user.
+
+        @cached_response('circles')
+        def list(self, request, *args, **kwargs): ...
+    """
+    if endpoint not in ENDPOINTS:
+        raise ValueError(f"Unknown cached endpoint '{endpoint}'.")
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not request.user.is_authenticated or not enabled():
+                return view_method(self, request, *args, **kwargs)
+
+            key = response_key(endpoint, request)
+            data = cache.get(key)
+            if data is not None:
+                _count(endpoint, 'hits')
+                return Response(data)
+
+            _count(endpoint, 'misses')
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Return {endpoint: {"hits": n, "misses": n}} for every cached endpoint."""
+    keys = [_stats_key(endpoint, outcome) for endpoint in ENDPOINTS for outcome in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {
+        endpoint: {outcome: values.get(_stats_key(endpoint, outcome), 0) for outcome in ('hits', 'misses')}
+        for endpoint in ENDPOINTS
+    }
+
+
+def reset_stats():
+    cache.delete_many([_stats_key(endpoint, outcome) for endpoint in ENDPOINTS for outcome in ('hits', 'misses')])
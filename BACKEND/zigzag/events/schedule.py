@@ -0,0 +1,60 @@
+"""
+Weekly schedule helpers shared by Profile and the availability engine.
+
+Profile.timetable and Profile.remote_days keep their JSON shape for the API;
+Profile mirrors them into integer columns (see Profile.sync_schedule) built
+with these helpers so schedule filters run as indexed integer comparisons.
+"""
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# Profile column prefixes, by weekday index (Monday = 0)
+DAY_FIELDS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_minutes(value):
+    """'HH:MM' -> minutes since midnight. Raises ValueError/TypeError/AttributeError."""
+    hours, minutes = value.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def timetable_windows(timetable):
+    """
+    Normalise a Profile.timetable into a tuple of (weekday, start_minute, end_minute).
+    Malformed days are ignored; an end before the start runs past midnight,
+    so end_minute can exceed MINUTES_PER_DAY.
+    """
+    windows = []
+    for weekday, name in enumerate(WEEKDAYS):
+        day = (timetable or {}).get(name) or {}
+        try:
+            start, end = parse_minutes(day['start']), parse_minutes(day['end'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        if end <= start:
+            end += MINUTES_PER_DAY
+        windows.append((weekday, start, end))
+    return tuple(windows)
+
+
+def weekday_mask(flags):
+    """Profile.remote_days ({"Monday": bool, ...}) -> bitmask, bit 0 = Monday."""
+    return sum(1 << weekday for weekday, name in enumerate(WEEKDAYS) if (flags or {}).get(name))
+
+
+def masks_with(*weekdays):
+    """Every 7-bit mask having all the given weekday bits set, for ``__in`` lookups."""
+    required = sum(1 << weekday for weekday in weekdays)
+    return [mask for mask in range(1 << len(WEEKDAYS)) if mask & required == required]
+
+
+def weekday_index(value):
+    """Accept 0-6 or a weekday name ('Tuesday', 'tuesday'); raise ValueError otherwise."""
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        index = int(value)
+        if 0 <= index < len(WEEKDAYS):
+            return index
+    elif isinstance(value, str) and value.lower() in DAY_FIELDS:
+        return DAY_FIELDS.index(value.lower())
+    raise ValueError(f"Unknown weekday: {value!r}")
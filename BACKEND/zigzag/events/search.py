@@ -0,0 +1,73 @@
+"""
+User search for the circle member picker.
+
+Every term of the query must match the username, first name or last name of
+a user. The lookups are chosen so they can use the indexes created by
+migration 0017:
+
+- PostgreSQL: trigram GIN indexes on UPPER(column), so terms of three
+  characters or more match anywhere in the name (icontains); shorter terms
+  match prefixes.
+- SQLite and others: NOCASE indexes, so every term matches name prefixes
+  (istartswith), which SQLite answers as an index range.
+
+Users sharing a circle with the requester come first, then users whose
+username starts with the query, then alphabetical order.
+"""
+from django.db import connection
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
+
+from .models import Circle, User
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+# Shortest term a trigram index can answer for a substring match
+TRIGRAM_MIN_LENGTH = 3
+
+MAX_TERMS = 4
+
+
+def _lookup(term):
+    if connection.vendor == 'postgresql' and len(term) >= TRIGRAM_MIN_LENGTH:
+        return 'icontains'
+    return 'istartswith'
+
+
+def _term_filter(term):
+    lookup = _lookup(term)
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__{lookup}': term})
+    return condition
+
+
+def search_users(requester, query, limit):
+    """
+    Return at most ``limit`` users matching ``query`` (requester excluded) as
+    dicts with id, username, first_name, last_name and shares_circle.
+    """
+    terms = query.split()[:MAX_TERMS]
+    if not terms:
+        return []
+
+    users = User.objects.exclude(id=requester.id)
+    for term in terms:
+        users = users.filter(_term_filter(term))
+
+    my_circles = Circle.objects.filter(members=requester, is_invitation_circle=False).values('id')
+    shared = Circle.members.through.objects.filter(user_id=OuterRef('id'), circle_id__in=my_circles)
+    users = users.annotate(
+        shares_circle=Exists(shared),
+        username_match=ExpressionWrapper(Q(username__istartswith=terms[0]), output_field=BooleanField()),
+    ).order_by('-shares_circle', '-username_match', 'username')
+
+    return [
+        {
+            "id": user['id'],
+            "username": user['username'],
+            "first_name": user['first_name'] or '',
+            "last_name": user['last_name'] or '',
+            "shares_circle": user['shares_circle'],
+        }
+        for user in users.values('id', 'username', 'first_name', 'last_name', 'shares_circle')[:limit]
+    ]
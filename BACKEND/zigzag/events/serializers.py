@@ -23,7 +23,7 @@ class CircleSerializer(serializers.ModelSerializer):
         """Return True if the current user created this circle"""
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
-            return obj.creator == request.user
+            return obj.creator_id is not None and obj.creator_id == request.user.id
         return False
 
     def create(self, validated_data):
@@ -67,7 +67,20 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = ['id', 'title', 'description', 'address', 'start_time', 'end_time',
-                  'circles','circle_ids', 'shareable_link', 'event_shared', 'invitation_token', 'has_invitation_link', 'generate_invitation_link', 'creator', 'can_generate_invite']
+                  'circles','circle_ids', 'shareable_link', 'event_shared', 'is_public', 'invitation_token', 'has_invitation_link', 'generate_invitation_link', 'creator', 'can_generate_invite']
+
+    def __init__(self, *args, **kwargs):
+        # Optional sparse fieldset: EventSerializer(events, many=True, fields=['id', 'title'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def readable_fields(cls):
+        """Names that can be requested through a sparse fieldset."""
+        return [name for name, field in cls().fields.items() if not field.write_only]
     
     def get_has_invitation_link(self, obj):
         return bool(obj.invitation_token)
@@ -81,12 +94,17 @@ class EventSerializer(serializers.ModelSerializer):
         # User can generate invite if:
         # 1. They are the creator, OR
         # 2. Event is shared AND user is a member of any associated circle
-        is_creator = obj.creator == request.user
-        
+        is_creator = obj.creator_id == request.user.id
+
         is_circle_member = False
-        if obj.event_shared and obj.circles.exists():
-            is_circle_member = obj.circles.filter(members=request.user).exists()
-        
+        if obj.event_shared:
+            member_circle_ids = self.context.get('member_circle_ids')
+            if member_circle_ids is not None:
+                # circles are prefetched by the list/retrieve views: no query per event
+                is_circle_member = any(circle.id in member_circle_ids for circle in obj.circles.all())
+            else:
+                is_circle_member = obj.circles.filter(members=request.user).exists()
+
         has_valid_token = obj.invitation_token and obj.invitation_token.strip()
 
         return (is_creator or (obj.event_shared and is_circle_member)) and has_valid_token
@@ -0,0 +1,236 @@
+"""
+Signal receivers keeping denormalized tables (event visibility, friend graph) in sync
+with events, circles and memberships, and invalidating the per-user response cache
+(events.response_cache).
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Address, Circle, Event, EventVisibility, Tag
+from .friendships import adjust_pairs
+from .response_cache import bump_global, bump_users
+from .visibility import circle_event_ids, circle_member_ids, event_viewer_ids, log_changes, sync_visibility
+
+
+@receiver(pre_save, sender=Event)
+def remember_event_creator(sender, instance, **kwargs):
+    """Keep the stored creator so post_save knows whether visibility must change."""
+    if instance._state.adding:
+        instance._previous_creator_id = None
+        return
+    instance._previous_creator_id = (
+        Event.objects.filter(pk=instance.pk).values_list('creator_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created, **kwargs):
+    previous_creator_id = getattr(instance, '_previous_creator_id', None)
+    if created or previous_creator_id != instance.creator_id:
+        users = None if created else {previous_creator_id, instance.creator_id}
+        sync_visibility([instance.pk], users)
+    if not created:
+        bump_users(event_viewer_ids([instance.pk]))
+
+
+@receiver(pre_delete, sender=Event)
+def event_deleting(sender, instance, **kwargs):
+    instance._viewer_ids = list(EventVisibility.objects.filter(event=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    """Visibility rows cascade silently: leave tombstones for the sync endpoint."""
+    log_changes((), {(user_id, instance.pk) for user_id in getattr(instance, '_viewer_ids', [])})
+
+
+def _bump_circle_users(circle_ids):
+    """Users whose circle list or event payloads show one of these circles."""
+    circle_ids = list(circle_ids)
+    creator_ids = Circle.objects.filter(id__in=circle_ids).values_list('creator_id', flat=True)
+    bump_users(
+        circle_member_ids(circle_ids) | set(creator_ids) | event_viewer_ids(circle_event_ids(circle_ids))
+    )
+
+
+@receiver(post_save, sender=Circle)
+def circle_saved(sender, instance, created, **kwargs):
+    """Circle names are part of the event payload: flag the circle's events as changed."""
+    bump_users({instance.creator_id} | circle_member_ids([instance.pk]))
+    if created:
+        return
+    viewers = EventVisibility.objects.filter(event_id__in=circle_event_ids([instance.pk]))
+    log_changes(viewers.values_list('user_id', 'event_id'))
+
+
+def _touch_events(event_ids):
+    """
+    The event payload and its iCal CATEGORIES list the event circles: a link
+    change is a modification of the event for ETags, Last-Modified and sync.
+    """
+    now = timezone.now()
+    Event.objects.filter(id__in=list(event_ids)).update(updated_at=now)
+    return now
+
+
+@receiver(m2m_changed, sender=Event.circles.through)
+def event_circles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # event.circles.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.updated_at = _touch_events([instance.pk])
+            sync_visibility([instance.pk])
+            # the event payload lists its circles, for every viewer
+            bump_users(event_viewer_ids([instance.pk]))
+        return
+
+    # circle.events.add/remove/clear(...): only the circle's members are affected
+    if action == 'pre_clear':
+        instance._cleared_event_ids = circle_event_ids([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _touch_events(pk_set)
+        sync_visibility(pk_set, circle_member_ids([instance.pk]))
+        bump_users(event_viewer_ids(pk_set))
+    elif action == 'post_clear':
+        event_ids = getattr(instance, '_cleared_event_ids', [])
+        _touch_events(event_ids)
+        sync_visibility(event_ids, circle_member_ids([instance.pk]))
+        bump_users(event_viewer_ids(event_ids))
+
+
+@receiver(m2m_changed, sender=Circle.members.through)
+def circle_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # circle.members.add/remove/clear(...)
+        if action == 'pre_clear':
+            instance._cleared_member_ids = circle_member_ids([instance.pk])
+        elif action == 'pre_remove':
+            # pk_set of post_remove also holds ids that were not members
+            instance._removed_member_ids = circle_member_ids([instance.pk]) & set(pk_set)
+        elif action in ('post_add', 'post_remove'):
+            sync_visibility(circle_event_ids([instance.pk]), pk_set)
+            bump_users(pk_set)
+            if action == 'post_add':
+                adjust_pairs(pk_set, circle_member_ids([instance.pk]), 1)
+            else:
+                adjust_pairs(getattr(instance, '_removed_member_ids', set()), circle_member_ids([instance.pk]), -1)
+        elif action == 'post_clear':
+            member_ids = getattr(instance, '_cleared_member_ids', set())
+            sync_visibility(circle_event_ids([instance.pk]), member_ids)
+            bump_users(member_ids)
+            adjust_pairs(member_ids, (), -1)
+        return
+
+    # user.circles.add/remove/clear(...)
+    if action == 'pre_clear':
+        instance._cleared_circle_ids = list(instance.circles.values_list('id', flat=True))
+    elif action == 'pre_remove':
+        instance._removed_circle_ids = list(instance.circles.filter(id__in=pk_set).values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        sync_visibility(circle_event_ids(pk_set), {instance.pk})
+        bump_users({instance.pk})
+        if action == 'post_add':
+            _adjust_user_friendships(instance.pk, pk_set, 1)
+        else:
+            _adjust_user_friendships(instance.pk, getattr(instance, '_removed_circle_ids', []), -1)
+    elif action == 'post_clear':
+        circle_ids = getattr(instance, '_cleared_circle_ids', [])
+        sync_visibility(circle_event_ids(circle_ids), {instance.pk})
+        bump_users({instance.pk})
+        _adjust_user_friendships(instance.pk, circle_ids, -1)
+
+
+def _adjust_user_friendships(user_id, circle_ids, delta):
+    """One user joined (delta=1) or left (delta=-1) the given circles."""
+    for circle_id in circle_ids:
+        adjust_pairs({user_id}, circle_member_ids([circle_id]), delta)
+
+
+@receiver(m2m_changed, sender=Circle.categories.through)
+def circle_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags are copied on visibility rows, so refresh them for the circle members."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            event_ids = circle_event_ids([instance.pk])
+            # non-members see the circle tags in the payload of the events too
+            _touch_events(event_ids)
+            sync_visibility(event_ids, circle_member_ids([instance.pk]))
+            _bump_circle_users([instance.pk])
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_circle_ids = list(instance.circles.values_list('id', flat=True))
+        return
+    if action in ('post_add', 'post_remove'):
+        circle_ids = pk_set
+    elif action == 'post_clear':
+        circle_ids = getattr(instance, '_cleared_circle_ids', [])
+    else:
+        return
+    event_ids = circle_event_ids(circle_ids)
+    _touch_events(event_ids)
+    sync_visibility(event_ids, circle_member_ids(circle_ids))
+    _bump_circle_users(circle_ids)
+
+
+def _sync_after_commit(event_ids, user_ids):
+    # The deletion may cascade from one of these events: wait until it is committed
+    transaction.on_commit(lambda: sync_visibility(event_ids, user_ids))
+
+
+@receiver(pre_delete, sender=Circle)
+def circle_deleting(sender, instance, **kwargs):
+    instance._deleted_event_ids = circle_event_ids([instance.pk])
+    instance._deleted_member_ids = circle_member_ids([instance.pk])
+    instance._viewer_ids = event_viewer_ids(instance._deleted_event_ids)
+
+
+@receiver(post_delete, sender=Circle)
+def circle_deleted(sender, instance, **kwargs):
+    _sync_after_commit(getattr(instance, '_deleted_event_ids', []), getattr(instance, '_deleted_member_ids', set()))
+    bump_users(
+        {instance.creator_id} | getattr(instance, '_deleted_member_ids', set()) | getattr(instance, '_viewer_ids', set())
+    )
+    # memberships cascade without m2m_changed
+    adjust_pairs(getattr(instance, '_deleted_member_ids', set()), (), -1)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """Tag names appear in the tag list and in circle and event payloads of many users."""
+    bump_global()
+
+
+@receiver(post_save, sender=Address)
+def address_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_users(event_viewer_ids(instance.events.values('id')))
+        # Event.geohash copies the address geohash for public discovery
+        instance.events.exclude(geohash=instance.geohash).update(geohash=instance.geohash)
+
+
+@receiver(pre_delete, sender=Address)
+def address_deleting(sender, instance, **kwargs):
+    # events.address is SET_NULL through a bulk update that sends no signal
+    instance._viewer_ids = event_viewer_ids(instance.events.values('id'))
+    instance.events.update(geohash='')
+
+
+@receiver(post_delete, sender=Address)
+def address_deleted(sender, instance, **kwargs):
+    bump_users(getattr(instance, '_viewer_ids', set()))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    circle_ids = list(instance.circles.values_list('id', flat=True))
+    instance._deleted_event_ids = circle_event_ids(circle_ids)
+    instance._deleted_member_ids = circle_member_ids(circle_ids)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    _sync_after_commit(getattr(instance, '_deleted_event_ids', []), getattr(instance, '_deleted_member_ids', set()))
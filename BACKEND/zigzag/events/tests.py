@@ -1,6 +1,39 @@
 # test_throttling.py
+import os
+import random
 import requests
 import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.db import IntegrityError, connection, transaction
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from icalendar import Calendar
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from events import availability, geo, histogram, ical, outbox
+from events.addresses import canonical_key
+from events.allowlists import DomainAllowlist, IPAllowlist
+from events.friendships import rebuild_all as rebuild_friendships, shared_circle_counts
+from events.middleware import SecurityMiddleware, classify_request, url_origin
+from events.models import (
+    Address, AddressQuerySet, Circle, Event, EventChange, EventVisibility, Friendship, OutboundEmail, Tag,
+    ThrottleBucket, User, UserAddress,
+)
+from events.response_cache import cache_stats, reset_stats
+from events.throttle_store import CacheStore, DatabaseStore, LocalStore
+from events.throttles import UserCostThrottle
+from events.views import ContactView, EventViewSet, ICalDownloadView, TagListView
+from events.visibility import compute_visibility, rebuild_all
 
 BASE_URL = "http://127.0.0.1:8000"
 
@@ -40,3 +73,1667 @@ if __name__ == "__main__":
     #test_login_throttling()
     from django.core.management.utils import get_random_secret_key
     print(get_random_secret_key())
+
+
+class EventListQueryCountTests(APITestCase):
+    """EventViewSet.list must not issue queries per event or per circle."""
+    QUERY_BUDGET = 10
+    EVENT_COUNT = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='unused-password')
+        other = User.objects.create_user(username='bob', password='unused-password')
+        tags = [Tag.objects.create(name=f'tag{i}') for i in range(3)]
+        circles = []
+        for i in range(5):
+            circle = Circle.objects.create(name=f'circle{i}', creator=other)
+            circle.members.add(cls.user, other)
+            circle.categories.add(*tags)
+            circles.append(circle)
+
+        now = timezone.now()
+        events = Event.objects.bulk_create([
+            Event(
+                title=f'event {i}',
+                start_time=now + timedelta(hours=i),
+                creator=cls.user if i % 2 else other,
+                event_shared=True,
+                invitation_token=f'token-{i}',
+            )
+            for i in range(cls.EVENT_COUNT)
+        ])
+        Through = Event.circles.through
+        Through.objects.bulk_create(
+            [Through(event_id=event.id, circle_id=circles[i % 5].id) for i, event in enumerate(events)]
+            + [Through(event_id=event.id, circle_id=circles[(i + 1) % 5].id) for i, event in enumerate(events)]
+        )
+        # bulk_create bypasses the signals maintaining EventVisibility
+        rebuild_all()
+
+    def test_list_stays_within_query_budget(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/events/event/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['events_user']) + len(response.data['events_invited']), self.EVENT_COUNT)
+        self.assertLessEqual(
+            len(queries), self.QUERY_BUDGET,
+            f"event list ran {len(queries)} queries for {self.EVENT_COUNT} events",
+        )
+
+    def test_can_generate_invite_uses_membership(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/events/event/')
+        invited = response.data['events_invited'][0]
+        self.assertTrue(invited['can_generate_invite'])
+        self.assertEqual(len(invited['circles']), 2)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}},
+    RESPONSE_CACHE_ENABLED=True,
+)
+class ResponseCacheTests(APITransactionTestCase):
+    """Cached list responses are served until something the user can see changes."""
+    # version bumps run on commit, so the changes must really be committed
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='carol', password='unused-password')
+        self.other = User.objects.create_user(username='dave', password='unused-password')
+        self.circle = Circle.objects.create(name='friends', creator=self.other)
+        self.circle.members.add(self.user, self.other)
+        self.client.force_authenticate(self.user)
+
+    def invited_titles(self):
+        return [event['title'] for event in self.client.get('/api/events/event/').data['events_invited']]
+
+    def test_second_request_is_a_hit(self):
+        self.invited_titles()
+        with CaptureQueriesContext(connection) as queries:
+            self.invited_titles()
+        # only the aggregates behind the ETag run, no serialization queries
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(cache_stats()['events'], {'hits': 1, 'misses': 1})
+
+    def test_visibility_changes_invalidate(self):
+        event = Event.objects.create(title='picnic', start_time=timezone.now(), creator=self.other)
+        self.assertEqual(self.invited_titles(), [])
+
+        event.circles.add(self.circle)
+        self.assertEqual(self.invited_titles(), ['picnic'])
+
+        event.title = 'barbecue'
+        event.save()
+        self.assertEqual(self.invited_titles(), ['barbecue'])
+
+        self.circle.members.remove(self.user)
+        self.assertEqual(self.invited_titles(), [])
+
+    def test_tag_changes_invalidate_tag_list(self):
+        self.assertEqual(len(self.client.get('/api/events/tags/').data), 0)
+        Tag.objects.create(name='sport')
+        self.assertEqual(len(self.client.get('/api/events/tags/').data), 1)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=None)
+    def test_process_local_cache_is_not_used(self):
+        # locmem is private to each worker, whose versions could be stale; ETags come from the database
+        reset_stats()
+        self.invited_titles()
+        response = self.client.get('/api/events/event/')
+        self.assertEqual(cache_stats()['events'], {'hits': 0, 'misses': 0})
+        self.assertEqual(self.client.get('/api/events/event/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class FlakyBackend(LocmemBackend):
+    """Local stand-in for the provider: the first ``failures`` messages raise."""
+    failures = 0
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise ConnectionError("provider unavailable")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(APITestCase):
+    """Views only queue emails; the worker sends them in batches and retries failures."""
+    BURST = 1000
+
+    @mock.patch.dict(os.environ, {'HOST_EMAIL': 'host@example.com'})
+    @mock.patch.object(ContactView, 'throttle_classes', [])
+    def test_contact_burst_is_queued_then_sent_in_batches(self):
+        started = time.perf_counter()
+        for index in range(self.BURST):
+            response = self.client.post('/api/contact/', {
+                'name': f'visitor {index}', 'email': f'visitor{index}@example.com', 'message': 'hello',
+            })
+            self.assertEqual(response.status_code, 200)
+        queued_in = time.perf_counter() - started
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.QUEUED).count(), self.BURST)
+
+        started = time.perf_counter()
+        stats = outbox.send_queued(batch_size=100)
+        sent_in = time.perf_counter() - started
+        self.assertEqual(stats, {'sent': self.BURST, 'retried': 0, 'failed': 0, 'batches': 10})
+        self.assertEqual(len(mail.outbox), self.BURST)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.SENT).count(), self.BURST)
+        self.assertEqual(mail.outbox[0].reply_to, ['visitor0@example.com'])
+        # generous bounds: the point is that neither side waits on the provider
+        self.assertLess(queued_in, 30)
+        self.assertGreater(self.BURST / sent_in, 100)
+
+    @override_settings(
+        EMAIL_BACKEND='events.tests.FlakyBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_BASE_SECONDS=60,
+    )
+    def test_failures_back_off_then_give_up(self):
+        first = outbox.enqueue('first', 'body', ['a@example.com'])
+        second = outbox.enqueue('second', 'body', ['b@example.com'])
+        FlakyBackend.failures = 1
+
+        self.assertEqual(outbox.send_queued(), {'sent': 1, 'retried': 1, 'failed': 0, 'batches': 1})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboundEmail.QUEUED, 1))
+        self.assertGreater(first.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(second.status, OutboundEmail.SENT)
+        # not due yet: nothing to claim
+        self.assertEqual(outbox.send_queued()['batches'], 0)
+
+        OutboundEmail.objects.filter(id=first.id).update(next_attempt_at=timezone.now())
+        FlakyBackend.failures = 1
+        self.assertEqual(outbox.send_queued()['failed'], 1)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (OutboundEmail.FAILED, 2))
+        self.assertIn('provider unavailable', first.last_error)
+        self.assertEqual([message.subject for message in mail.outbox], ['second'])
+
+
+class ThrottleStoreTests(APITestCase):
+    """Token buckets: bursts up to the capacity, then one request per refilled token."""
+
+    def setUp(self):
+        cache.clear()
+
+    def check_bucket(self, store_class):
+        now = [1000.0]
+        store = store_class(clock=lambda: now[0])
+        # 3 requests per minute
+        consume = lambda: store.consume('throttle_login_1.2.3.4', 3, 3 / 60)
+        self.assertEqual([consume()[0] for _ in range(3)], [True, True, True])
+        allowed, wait = consume()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20)
+        now[0] += 20
+        self.assertEqual([consume()[0] for _ in range(2)], [True, False])
+        self.assertTrue(store.consume('throttle_login_5.6.7.8', 3, 3 / 60)[0])
+
+        store.record_denied('login')
+        store.record_denied('login')
+        self.assertEqual(store.denied_counts(), {'login': 2})
+
+    def test_local_store(self):
+        self.check_bucket(LocalStore)
+
+    def test_database_store(self):
+        self.check_bucket(DatabaseStore)
+
+    def test_cache_store(self):
+        self.check_bucket(CacheStore)
+
+    def test_full_buckets_are_purged(self):
+        now = [1000.0]
+        store = DatabaseStore(clock=lambda: now[0])
+        store.consume('throttle_contact_1.2.3.4', 5, 5 / 3600)
+        self.assertEqual(ThrottleBucket.objects.count(), 1)
+        now[0] += 3600
+        store.consume('throttle_contact_5.6.7.8', 5, 5 / 3600)
+        self.assertEqual(list(ThrottleBucket.objects.values_list('key', flat=True)), ['throttle_contact_5.6.7.8'])
+
+
+class UserCostThrottleTests(APITestCase):
+    """Every user has one budget of cost units shared by the expensive endpoints."""
+
+    def setUp(self):
+        # user ids are reused between tests: start from empty buckets
+        cache.clear()
+
+    def allow(self, user, view):
+        request = RequestFactory().get('/')
+        request.user = user
+        return UserCostThrottle().allow_request(request, view)
+
+    def test_costs_share_one_budget_per_user(self):
+        alice = User.objects.create_user(username='alice-cost', password='unused-password')
+        bob = User.objects.create_user(username='bob-cost', password='unused-password')
+        budget = UserCostThrottle().num_requests
+        ical = ICalDownloadView()
+
+        allowed = [self.allow(alice, ical) for _ in range(budget // ICalDownloadView.throttle_cost + 1)]
+        self.assertTrue(all(allowed[:-1]))
+        self.assertFalse(allowed[-1])
+        self.assertFalse(self.allow(alice, TagListView()))
+        self.assertTrue(self.allow(bob, ical))
+
+    def test_viewset_actions_without_a_cost_are_free(self):
+        user = User.objects.create_user(username='carol-cost', password='unused-password')
+        events, markers = EventViewSet(action='list'), EventViewSet(action='markers')
+        self.assertTrue(all(self.allow(user, events) for _ in range(UserCostThrottle().num_requests + 1)))
+        self.assertTrue(self.allow(user, markers))
+
+    def test_buckets_stay_out_of_the_database(self):
+        user = User.objects.create_user(username='dan-cost', password='unused-password')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.allow(user, TagListView()))
+        self.assertEqual(len(queries), 0)
+        self.assertFalse(ThrottleBucket.objects.exists())
+
+    def test_cost_above_the_capacity_is_capped(self):
+        user = User.objects.create_user(username='eve-cost', password='unused-password')
+        view = TagListView()
+        view.throttle_cost = UserCostThrottle().num_requests * 10
+        self.assertTrue(self.allow(user, view))
+        self.assertFalse(self.allow(user, view))
+
+
+class AllowlistTests(SimpleTestCase):
+    """Allowlists of SecurityMiddleware: exact entries, CIDR ranges and wildcard domains."""
+
+    def test_ip_ranges(self):
+        allowlist = IPAllowlist(['203.0.113.7', '10.0.0.0/8', '192.168.1.0/24', '2001:db8::/32', 'proxy.internal'])
+        for ip in ['203.0.113.7', '10.255.0.1', '192.168.1.200', '::ffff:10.1.2.3', '2001:db8:1::5', 'proxy.internal']:
+            self.assertIn(ip, allowlist)
+        for ip in ['203.0.113.8', '11.0.0.1', '192.168.2.1', '2001:db9::1', '::1', 'not-an-ip']:
+            self.assertNotIn(ip, allowlist)
+        self.assertFalse(IPAllowlist([]))
+        self.assertIn('8.8.8.8', IPAllowlist(['0.0.0.0/0']))
+
+    def test_wildcard_domains(self):
+        allowlist = DomainAllowlist(['app.zigzag.fr', '*.zigzag.app', 'capacitor://localhost', '*.preview.example:8443'])
+        for domain in ['app.zigzag.fr', 'www.zigzag.app', 'a.b.zigzag.app', 'capacitor://localhost', 'pr-1.preview.example:8443']:
+            self.assertIn(domain, allowlist)
+        for domain in ['zigzag.fr', 'zigzag.app', 'evilzigzag.app', 'www.zigzag.app.evil.com', 'pr-1.preview.example']:
+            self.assertNotIn(domain, allowlist)
+
+
+class CircleAvailabilityTests(APITestCase):
+    """circles/availability/ combines the members' timetables, vacations and events."""
+    URL = '/api/events/circles/availability/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice-free', password='unused-password')
+        cls.bob = User.objects.create_user(username='bob-free', password='unused-password')
+        cls.circle = Circle.objects.create(name='pair', creator=cls.alice)
+        cls.circle.members.add(cls.alice, cls.bob)
+
+    def availability(self, **params):
+        self.client.force_authenticate(self.alice)
+        params = {'circle_ids': self.circle.id, 'start': '2026-11-02', 'end': '2026-11-02', 'tz': 'UTC', **params}
+        return self.client.get(self.URL, params)
+
+    @override_settings(CIRCLE_CALENDAR_MIN_MEMBERS=3)
+    def test_small_circles_are_refused(self):
+        # a private event of bob's, in a circle alice is not part of
+        other = Circle.objects.create(name='bob only', creator=self.bob)
+        other.members.add(self.bob)
+        event = Event.objects.create(
+            title='private', creator=self.bob,
+            start_time=datetime(2026, 11, 2, 10, tzinfo=dt_timezone.utc),
+            end_time=datetime(2026, 11, 2, 12, tzinfo=dt_timezone.utc),
+        )
+        event.circles.add(other)
+
+        response = self.availability()
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('free_slots', response.data)
+
+    def save_profile(self, user, **profile):
+        self.client.force_authenticate(user)
+        response = self.client.patch('/api/events/profile/me/', {'profile': profile}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CIRCLE_CALENDAR_MIN_MEMBERS=2, AVAILABILITY_SLOT_MINUTES=30)
+    def test_timetables_vacations_and_events_combine(self):
+        # Monday 2026-11-02 and Tuesday 2026-11-03; Paris is UTC+1
+        self.save_profile(
+            self.alice, timezone='UTC', timetable={'Monday': {'start': '18:00', 'end': '23:00'}},
+            vacation_start='2026-11-03', vacation_end='2026-11-03',
+        )
+        self.save_profile(self.bob, timezone='Europe/Paris', timetable={'Monday': {'start': '20:00', 'end': '02:00'}})
+        Event.objects.create(
+            title='call', creator=self.bob,
+            start_time=datetime(2026, 11, 2, 21, tzinfo=dt_timezone.utc),
+            end_time=datetime(2026, 11, 2, 21, 20, tzinfo=dt_timezone.utc),
+        )
+
+        def slots(**params):
+            response = self.availability(end='2026-11-03', **params)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data['members'], 2)
+            return [(slot['start'][5:16], slot['end'][5:16]) for slot in response.data['free_slots']]
+
+        self.assertEqual(slots(), [
+            ('11-02T19:00', '11-02T21:00'), ('11-02T21:30', '11-02T23:00'), ('11-03T00:00', '11-03T01:00'),
+        ])
+        self.assertEqual(slots(min_duration=90), [('11-02T19:00', '11-02T21:00'), ('11-02T21:30', '11-02T23:00')])
+        # at least one member free: alice's evening, then bob's late evening and alice's vacation
+        self.assertEqual(slots(min_free=1), [('11-02T18:00', '11-04T00:00')])
+        self.assertEqual(slots(tz='Europe/Paris')[0], ('11-02T20:00', '11-02T22:00'))
+
+        self.assertEqual(self.availability(end='2026-10-01').status_code, 400)
+        self.assertEqual(self.availability(min_free='some').status_code, 400)
+
+    def test_bit_sliced_counts(self):
+        grid = availability.SlotGrid(datetime(2026, 11, 2, tzinfo=dt_timezone.utc), 1, slot_minutes=30)
+        rng = random.Random(12)
+        masks = [rng.getrandbits(grid.size) for _ in range(37)]
+        planes = availability.count_planes(masks)
+        for k in (0, 1, 5, 18, 37, 38):
+            expected = sum(
+                1 << slot for slot in range(grid.size) if sum((mask >> slot) & 1 for mask in masks) >= k
+            )
+            self.assertEqual(availability.at_least(planes, k, grid), expected, k)
+        self.assertEqual(availability.all_free(masks, grid), availability.at_least(planes, len(masks), grid))
+        self.assertEqual(
+            availability.intervals(grid, 0b111001100),
+            [(grid.slot_start(2), grid.slot_start(4)), (grid.slot_start(6), grid.slot_start(9))],
+        )
+
+
+class MemberScheduleFilterTests(APITestCase):
+    """circles/members/ filters on the integer schedule columns mirrored from the profile JSON."""
+    URL = '/api/events/circles/members/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice-sched', password='unused-password')
+        cls.bob = User.objects.create_user(username='bob-sched', password='unused-password')
+        cls.carol = User.objects.create_user(username='carol-sched', password='unused-password')
+        cls.circle = Circle.objects.create(name='team', creator=cls.alice)
+        cls.circle.members.add(cls.alice, cls.bob, cls.carol)
+
+    def save_profile(self, user, remote_days, timetable):
+        self.client.force_authenticate(user)
+        response = self.client.patch(
+            '/api/events/profile/me/', {'profile': {'remote_days': remote_days, 'timetable': timetable}}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def usernames(self, **filters):
+        self.client.force_authenticate(self.alice)
+        response = self.client.get(self.URL, {'circle_ids': self.circle.id, **filters})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [member['username'] for member in response.data]
+
+    def test_filters_match_profiles_saved_through_the_api(self):
+        friday = lambda start, end: {'Friday': {'start': start, 'end': end}}
+        self.save_profile(self.alice, {'Tuesday': True, 'Thursday': True}, friday('17:00', '23:00'))
+        self.save_profile(self.bob, {'Tuesday': True}, friday('19:00', '21:00'))
+        self.save_profile(self.carol, {'Monday': True}, friday('18:00', '01:00'))
+
+        self.assertEqual(self.usernames(remote_on='tuesday'), ['alice-sched', 'bob-sched'])
+        self.assertEqual(self.usernames(remote_on='Tuesday,3'), ['alice-sched'])
+        self.assertEqual(self.usernames(free_on='friday'), ['alice-sched', 'bob-sched', 'carol-sched'])
+        self.assertEqual(
+            self.usernames(free_on='friday', free_from='18:00', free_to='20:00'), ['alice-sched', 'carol-sched'],
+        )
+        self.assertEqual(self.usernames(free_on='saturday'), [])
+
+        # a later edit moves bob out of the Tuesday list
+        self.save_profile(self.bob, {'Tuesday': False, 'Wednesday': True}, {})
+        self.assertEqual(self.usernames(remote_on='tuesday'), ['alice-sched'])
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_authenticate(self.alice)
+        invalid = [
+            {'remote_on': 'someday'},
+            {'free_from': '18:00', 'free_to': '20:00'},
+            {'free_on': '4', 'free_from': 'x', 'free_to': 'y'},
+        ]
+        for filters in invalid:
+            response = self.client.get(self.URL, {'circle_ids': self.circle.id, **filters})
+            self.assertEqual(response.status_code, 400, filters)
+
+
+class NearbyEventsTests(APITestCase):
+    """EventQuerySet.near and my/locations/nearby/ agree with geo.haversine_km."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='erin-near', password='unused-password')
+        rng = random.Random(0)
+        # Paris, and a point on the antimeridian where the bounding box wraps around
+        cls.centers = [(48.8566, 2.3522), (-16.5, 179.95)]
+        for index, (lat, lng) in enumerate(cls.centers * 60):
+            point_lat, point_lng = lat + rng.uniform(-0.3, 0.3), lng + rng.uniform(-0.3, 0.3)
+            if point_lng > 180:
+                point_lng -= 360
+            address = Address.objects.create(address_line=f'{index} rue', latitude=point_lat, longitude=point_lng)
+            Event.objects.create(
+                title=f'event {index}', creator=cls.user, address=address,
+                start_time=timezone.now() + timedelta(days=index),
+            )
+
+    def test_near_matches_brute_force(self):
+        events = list(Event.objects.select_related('address'))
+        for lat, lng in self.centers:
+            for radius_km in (5, 15, 30):
+                expected = {
+                    event.id: geo.haversine_km(lat, lng, event.address.latitude, event.address.longitude)
+                    for event in events
+                }
+                expected = {event_id: km for event_id, km in expected.items() if km <= radius_km}
+                found = dict(Event.objects.near(lat, lng, radius_km).values_list('id', 'distance_km'))
+                self.assertEqual(set(found), set(expected), (lat, lng, radius_km))
+                for event_id, km in found.items():
+                    self.assertAlmostEqual(km, expected[event_id], places=6)
+
+    def test_endpoint_sorts_each_location_by_distance(self):
+        for label, (lat, lng) in zip(('home', 'island'), self.centers):
+            UserAddress.objects.create(
+                user=self.user, label=label,
+                address=Address.objects.create(address_line=label, latitude=lat, longitude=lng),
+            )
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/events/my/locations/nearby/', {'radius_km': 20, 'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([location['label'] for location in response.data], ['home', 'island'])
+        for location in response.data:
+            distances = [event['distance_km'] for event in location['events']]
+            self.assertEqual(len(distances), 10)
+            self.assertEqual(distances, sorted(distances))
+            self.assertLessEqual(distances[-1], 20)
+
+
+class MarkerClusterFlagTests(APITestCase):
+    """The markers cluster flag is a boolean, whether it comes as JSON, form data or query string."""
+    URL = '/api/events/markers/'
+    VIEWPORT = {'bbox': '2.2,48.8,2.5,48.9', 'zoom': '5'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='fay-markers', password='unused-password')
+        address = Address.objects.create(address_line='1 rue', latitude=48.85, longitude=2.35)
+        Event.objects.create(title='picnic', creator=cls.user, address=address, start_time=timezone.now())
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_false_strings_do_not_cluster(self):
+        for value in ('false', '0', 'no', ''):
+            response = self.client.post(self.URL, {**self.VIEWPORT, 'cluster': value}, format='json')
+            self.assertIn('private_markers', response.data, value)
+            response = self.client.get(self.URL, {**self.VIEWPORT, 'cluster': value})
+            self.assertIn('private_markers', response.data, value)
+
+    def test_true_values_cluster(self):
+        for value in (True, 'true', '1', 'yes'):
+            response = self.client.post(self.URL, {**self.VIEWPORT, 'cluster': value}, format='json')
+            self.assertIn('clusters', response.data, value)
+        response = self.client.post(self.URL, {**self.VIEWPORT, 'cluster': 'true'})
+        self.assertIn('clusters', response.data)
+        self.assertIn('clusters', self.client.get(self.URL, {**self.VIEWPORT, 'cluster': 'yes'}).data)
+
+
+class MarkerViewportTests(APITestCase):
+    """markers?bbox=&zoom= returns exactly the visible events inside the box, at any zoom."""
+    URL = '/api/events/markers/'
+    BBOXES = [
+        ('2.2,48.8,2.5,48.9', [None, 12, 20]),
+        ('-10,-20,40,30', [None, 0, 4, 9]),
+        ('-180,-90,180,90', [None, 0, 3]),
+        # west > east: the box crosses the antimeridian
+        ('170,-30,-170,10', [None, 2, 5, 11]),
+        ('179.9,-90,-179.9,90', [None, 7]),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='gil-markers', password='unused-password')
+        other = User.objects.create_user(username='hal-markers', password='unused-password')
+        rng = random.Random(7)
+        points = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(60)]
+        points += [(rng.uniform(48.8, 48.9), rng.uniform(2.2, 2.5)) for _ in range(10)]
+        points += [(rng.uniform(-30, 10), lng) for lng in (179.95, -179.95, 175.5, -172.1, 168.0, -168.0)]
+        cls.points = {}
+        for index, (lat, lng) in enumerate(points):
+            address = Address.objects.create(address_line=f'{index} quai', latitude=lat, longitude=lng)
+            event = Event.objects.create(
+                title=f'spot {index}', creator=cls.user, address=address, start_time=timezone.now(),
+            )
+            cls.points[event.id] = (lat, lng)
+        # not visible to the user, although inside every box
+        Event.objects.create(
+            title='hidden', creator=other, start_time=timezone.now(),
+            address=Address.objects.create(address_line='hidden', latitude=0.5, longitude=179.95),
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def expected(self, bbox):
+        west, south, east, north = (float(value) for value in bbox.split(','))
+        return {
+            event_id for event_id, (lat, lng) in self.points.items()
+            if south <= lat <= north and (west <= lng <= east if west <= east else lng >= west or lng <= east)
+        }
+
+    def test_markers_match_brute_force(self):
+        for bbox, zooms in self.BBOXES:
+            expected = self.expected(bbox)
+            self.assertTrue(expected, bbox)
+            for zoom in zooms:
+                params = {'bbox': bbox} if zoom is None else {'bbox': bbox, 'zoom': zoom}
+                response = self.client.get(self.URL, params)
+                self.assertEqual(response.status_code, 200, params)
+                ids = [marker['id'] for marker in response.data['private_markers']]
+                self.assertEqual(len(ids), len(set(ids)), params)
+                self.assertEqual(set(ids), expected, params)
+        self.assertEqual(
+            {marker['id'] for marker in self.client.get(self.URL).data['private_markers']}, set(self.points),
+        )
+
+    def test_invalid_viewport(self):
+        malformed = ['a,b,c,d', '1,2,3', '2.2,48.9,2.5,48.8', '2.2,-91,2.5,48.9', '181,48.8,2.5,48.9', 'nan,0,1,1']
+        for bbox in malformed:
+            response = self.client.get(self.URL, {'bbox': bbox, 'zoom': 5})
+            self.assertEqual(response.status_code, 400, bbox)
+            self.assertIn('bbox', response.data)
+        for zoom in ('-1', '23', 'x', '12.5'):
+            for cluster in ('', '1'):
+                response = self.client.get(self.URL, {'bbox': '2.2,48.8,2.5,48.9', 'zoom': zoom, 'cluster': cluster})
+                self.assertEqual(response.status_code, 400, zoom)
+                self.assertIn('zoom', response.data)
+        response = self.client.post(self.URL, {'bbox': '2.2,48.8,2.5,48.9', 'zoom': 99, 'cluster': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MARKER_CLUSTER_SAMPLE_SIZE=2)
+class MarkerClusterPayloadTests(APITestCase):
+    """Cluster counts, centroids, tags and samples match a brute-force grouping of the visible events."""
+    URL = '/api/events/markers/'
+    BBOX = '2,45,5.5,49.5'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='ivy-clusters', password='unused-password')
+        other = User.objects.create_user(username='jo-clusters', password='unused-password')
+        climbing, jazz, secret = (Tag.objects.create(name=name) for name in ('climbing', 'jazz', 'secret'))
+        circles = {}
+        for name, tag, members in [('crag', climbing, [cls.user]), ('band', jazz, [cls.user]), ('club', secret, [])]:
+            circles[name] = Circle.objects.create(name=name, creator=other)
+            circles[name].members.add(other, *members)
+            circles[name].categories.add(tag)
+
+        start = timezone.now() + timedelta(days=1)
+        # (lat, lng, circles): two spots around Paris, two around Lyon, all in the bbox
+        spots = [
+            (48.85, 2.35, ['crag']), (48.86, 2.34, ['crag', 'club']), (48.851, 2.352, ['band']),
+            (45.76, 4.83, ['band']), (45.761, 4.832, []), (45.75, 4.85, ['club']),
+        ]
+        cls.visible = {}
+        for index, (lat, lng, names) in enumerate(spots):
+            event = Event.objects.create(
+                title=f'gig {index}', creator=other if names else cls.user, start_time=start - timedelta(hours=index),
+                address=Address.objects.create(address_line=f'{index} place', latitude=lat, longitude=lng),
+            )
+            event.circles.set([circles[name] for name in names])
+            # the user sees the event through crag or band, or as its creator; club tags stay hidden
+            if names != ['club']:
+                tags = sorted({'crag': 'climbing', 'band': 'jazz'}[name] for name in names if name != 'club')
+                cls.visible[event.id] = (event.address.geohash, lat, lng, event.start_time, tags)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def expected_clusters(self, zoom):
+        tiles = geo.covering_cells(*geo.parse_bbox(self.BBOX), precision=geo.precision_for_zoom(zoom))
+        precision = min(len(tiles[0]) + 1, geo.GEOHASH_PRECISION)
+        cells = {}
+        for event_id, (geohash, lat, lng, start, tags) in self.visible.items():
+            if geohash.startswith(tuple(tiles)):
+                cells.setdefault(geohash[:precision], []).append((start, event_id, lat, lng, tags))
+        return {
+            cell: {
+                'count': len(rows),
+                'lat': sum(row[2] for row in rows) / len(rows),
+                'lng': sum(row[3] for row in rows) / len(rows),
+                'tags': sorted({tag for row in rows for tag in row[4]}),
+                'sample_ids': [row[1] for row in sorted(rows)[:2]],
+            }
+            for cell, rows in cells.items()
+        }
+
+    def test_clusters_match_brute_force(self):
+        for zoom in (5, 8, 12):
+            response = self.client.get(self.URL, {'bbox': self.BBOX, 'zoom': zoom, 'cluster': 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['zoom'], zoom)
+            expected = self.expected_clusters(zoom)
+            clusters = {cluster.pop('cell'): cluster for cluster in response.data['clusters']}
+            self.assertEqual(clusters.keys(), expected.keys(), zoom)
+            for cell, cluster in clusters.items():
+                self.assertAlmostEqual(cluster.pop('lat'), expected[cell].pop('lat'))
+                self.assertAlmostEqual(cluster.pop('lng'), expected[cell].pop('lng'))
+                self.assertEqual(cluster, expected[cell], (zoom, cell))
+        # Paris and Lyon fall in different cells and carry different circle tags
+        tags = sorted(tuple(cluster['tags']) for cluster in self.expected_clusters(5).values())
+        self.assertEqual(tags, [('climbing', 'jazz'), ('jazz',)])
+
+    def test_high_zoom_returns_markers(self):
+        response = self.client.get(self.URL, {'bbox': self.BBOX, 'zoom': 16, 'cluster': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('clusters', response.data)
+        markers = {marker['id']: marker for marker in response.data['private_markers']}
+        self.assertEqual(markers.keys(), self.visible.keys())
+        for event_id, (_, lat, lng, _, tags) in self.visible.items():
+            self.assertEqual((markers[event_id]['lat'], markers[event_id]['lng']), (lat, lng))
+            self.assertEqual(markers[event_id]['tags'], tags)
+
+
+class RequestClassifierTests(SimpleTestCase):
+    """SecurityMiddleware classifies clients on header origins, never on full referring URLs."""
+
+    @mock.patch.dict(os.environ, {'SECURITY_ENABLED': 'True', 'API_ALLOWED_DOMAINS': 'app.zigzag.fr'})
+    def test_referer_paths_share_one_cache_entry(self):
+        middleware = SecurityMiddleware(lambda request: HttpResponse())
+        classify_request.cache_clear()
+        for token in ('abc', 'def', 'ghi'):
+            referer = f'https://app.zigzag.fr/invite/{token}?x=1'
+            request = RequestFactory().get('/api/events/tags/', HTTP_REFERER=referer, HTTP_USER_AGENT='Firefox')
+            self.assertEqual(middleware(request).status_code, 200)
+        info = classify_request.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+        request = RequestFactory().get('/api/events/tags/', HTTP_REFERER='https://evil.example/invite/abc')
+        self.assertEqual(middleware(request).status_code, 403)
+
+    def test_url_origin(self):
+        self.assertEqual(url_origin('https://app.zigzag.fr/invite/abc?token=1#x'), 'https://app.zigzag.fr')
+        self.assertEqual(url_origin('capacitor://localhost/index.html'), 'capacitor://localhost')
+        self.assertEqual(url_origin('//cdn.example/p'), '//cdn.example')
+        self.assertEqual(url_origin(''), '')
+
+
+class FriendsListTests(APITestCase):
+    """users/ is deprecated for users/search/ and no longer lists every account at once."""
+    URL = '/api/events/users/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='lister', password='unused-password')
+        for index in range(7):
+            User.objects.create_user(username=f'member-{index}', password='unused-password')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    @override_settings(USERS_LIST_MAX_PAGE_SIZE=5)
+    def test_legacy_list_is_capped(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in response.data], [f'member-{index}' for index in range(5)])
+        self.assertEqual(response['Deprecation'], 'true')
+        self.assertIn('/api/events/users/search/', response['Link'])
+
+    def test_pages_follow_the_cursor(self):
+        usernames, params = [], {'page_size': 3}
+        while True:
+            response = self.client.get(self.URL, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            usernames += [user['username'] for user in response.data['results']]
+            if response.data['next'] is None:
+                break
+            params = {'page_size': 3, 'cursor': response.data['next']}
+        self.assertEqual(usernames, [f'member-{index}' for index in range(7)])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.URL, {'cursor': 'forged'}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {'page_size': '0'}).status_code, 400)
+
+
+class EventVisibilitySignalTests(APITestCase):
+    """The signals keep EventVisibility equal to a recomputation from circles and memberships."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'viewer-{i}', password='unused-password') for i in range(5)]
+        cls.tags = [Tag.objects.create(name=name) for name in ('music', 'sport')]
+
+    def rows(self):
+        return {
+            (row.user_id, row.event_id): (row.via_circle_id, row.tags)
+            for row in EventVisibility.objects.all()
+        }
+
+    def assertInSync(self):
+        self.assertEqual(self.rows(), compute_visibility(Event.objects.values('id')))
+
+    def test_circle_and_membership_changes(self):
+        alice, bob, carol, dave, erin = self.users
+        band = Circle.objects.create(name='band', creator=alice)
+        team = Circle.objects.create(name='team', creator=bob)
+        band.members.add(alice, bob, carol)
+        team.members.add(bob, dave)
+        band.categories.add(self.tags[0])
+        team.categories.add(self.tags[1])
+
+        event = Event.objects.create(title='gig', start_time=timezone.now(), creator=alice)
+        self.assertEqual(self.rows(), {(alice.id, event.id): (None, [])})
+
+        event.circles.add(band, team)
+        self.assertInSync()
+        self.assertEqual(self.rows()[(bob.id, event.id)], (band.id, ['music', 'sport']))
+        self.assertEqual(self.rows()[(dave.id, event.id)], (team.id, ['sport']))
+
+        band.members.remove(carol)
+        self.assertNotIn((carol.id, event.id), self.rows())
+        erin.circles.add(team)
+        self.assertIn((erin.id, event.id), self.rows())
+        self.assertInSync()
+
+        team.categories.clear()
+        self.assertEqual(self.rows()[(bob.id, event.id)], (band.id, ['music']))
+        team.events.remove(event)
+        self.assertNotIn((dave.id, event.id), self.rows())
+        self.assertInSync()
+
+        event.creator = erin
+        event.save()
+        self.assertEqual(self.rows()[(erin.id, event.id)], (None, []))
+        self.assertEqual(self.rows()[(alice.id, event.id)], (band.id, ['music']))
+        self.assertInSync()
+
+        band.members.clear()
+        self.assertEqual(self.rows(), {(erin.id, event.id): (None, [])})
+        event.delete()
+        self.assertEqual(self.rows(), {})
+
+    def test_random_changes_match_a_rebuild(self):
+        rng = random.Random(3)
+        circles = [Circle.objects.create(name=f'circle-{i}', creator=self.users[i]) for i in range(3)]
+        events = [
+            Event.objects.create(title=f'event-{i}', start_time=timezone.now(), creator=rng.choice(self.users))
+            for i in range(6)
+        ]
+        for _ in range(60):
+            circle, event, user = rng.choice(circles), rng.choice(events), rng.choice(self.users)
+            operation = rng.randrange(6)
+            if operation == 0:
+                circle.members.add(user)
+            elif operation == 1:
+                circle.members.remove(user)
+            elif operation == 2:
+                event.circles.add(circle)
+            elif operation == 3:
+                circle.events.remove(event)
+            elif operation == 4:
+                circle.categories.add(rng.choice(self.tags))
+            else:
+                event.creator = user
+                event.save()
+        self.assertInSync()
+        self.assertEqual(rebuild_all(), (0, 0, 0))
+
+
+@override_settings(EVENT_SYNC_OVERLAP_SECONDS=0)
+class EventSyncTests(APITestCase):
+    """sync/ returns only what changed in the user's visible set since the cursor."""
+    URL = '/api/events/sync/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='sync-owner', password='unused-password')
+        cls.user = User.objects.create_user(username='sync-user', password='unused-password')
+        cls.circle = Circle.objects.create(name='sync', creator=cls.owner)
+        cls.circle.members.add(cls.owner, cls.user)
+        cls.event = Event.objects.create(title='kept', start_time=timezone.now(), creator=cls.owner)
+        cls.event.circles.add(cls.circle)
+
+    def sync(self, cursor=None):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.URL, {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_deltas(self):
+        first = self.sync()
+        self.assertTrue(first['full'])
+        self.assertEqual([event['title'] for event in first['events']], ['kept'])
+        self.assertEqual(len(first['markers']), 1)
+
+        unchanged = self.sync(first['cursor'])
+        self.assertFalse(unchanged['full'])
+        self.assertEqual((unchanged['events'], unchanged['markers'], unchanged['removed']), ([], [], []))
+
+        added = Event.objects.create(title='added', start_time=timezone.now(), creator=self.owner)
+        added.circles.add(self.circle)
+        delta = self.sync(unchanged['cursor'])
+        self.assertEqual([event['title'] for event in delta['events']], ['added'])
+        self.assertEqual(delta['removed'], [])
+
+        self.event.title = 'renamed'
+        self.event.save()
+        delta = self.sync(delta['cursor'])
+        self.assertEqual([event['title'] for event in delta['events']], ['renamed'])
+
+    def test_membership_removal_leaves_tombstones(self):
+        cursor = self.sync()['cursor']
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(
+            f'/api/events/circles/{self.circle.id}/remove_members/', {'member_ids': [self.user.id]}, format='json',
+        )
+        self.assertEqual(response.data['removed'], [self.user.id])
+
+        delta = self.sync(cursor)
+        self.assertEqual(delta['events'], [])
+        self.assertEqual(delta['removed'], [str(self.event.id)])
+
+        self.client.force_authenticate(self.owner)
+        self.client.post(
+            f'/api/events/circles/{self.circle.id}/add_members/', {'member_ids': [self.user.id]}, format='json',
+        )
+        delta = self.sync(delta['cursor'])
+        self.assertEqual([event['id'] for event in delta['events']], [str(self.event.id)])
+        self.assertEqual(delta['removed'], [])
+
+    def test_deleted_events_leave_tombstones(self):
+        cursor = self.sync()['cursor']
+        event_id = str(self.event.id)
+        Event.objects.get(id=self.event.id).delete()
+        self.assertEqual(self.sync(cursor)['removed'], [event_id])
+
+    def test_cursors(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(self.URL, {'cursor': 'forged'}).status_code, 400)
+
+        # a cursor older than the change log starts over with a full sync
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() - timedelta(days=60)):
+            stale = self.sync()['cursor']
+        delta = self.sync(stale)
+        self.assertTrue(delta['full'])
+        self.assertEqual(len(delta['events']), 1)
+
+
+class EventListPaginationTests(APITestCase):
+    """event/ keyset pages and sparse fieldsets."""
+    URL = '/api/events/event/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pager', password='unused-password')
+        other = User.objects.create_user(username='pager-friend', password='unused-password')
+        circle = Circle.objects.create(name='pages', creator=other)
+        circle.members.add(cls.user, other)
+        start = datetime(2026, 11, 1, tzinfo=dt_timezone.utc)
+        # few distinct start times, so pages break inside runs of equal start_time
+        for index in range(23):
+            event = Event.objects.create(
+                title=f'page {index}', start_time=start + timedelta(hours=index % 4),
+                creator=cls.user if index % 3 else other,
+            )
+            event.circles.add(circle)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_pages_match_the_full_list(self):
+        full = self.client.get(self.URL).data
+        for key, cursor_param in (('events_user', 'cursor_user'), ('events_invited', 'cursor_invited')):
+            ids, params = [], {'page_size': 4}
+            while True:
+                response = self.client.get(self.URL, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.data[key]), 4)
+                ids += [event['id'] for event in response.data[key]]
+                cursor = response.data['next'][key]
+                if cursor is None:
+                    break
+                params = {'page_size': 4, cursor_param: cursor}
+            self.assertEqual(ids, [event['id'] for event in full[key]])
+            self.assertEqual(len(set(ids)), len(ids))
+
+        self.assertEqual(len(full['events_user']) + len(full['events_invited']), 23)
+        self.assertEqual(
+            [(event['start_time'], event['id']) for event in full['events_user']],
+            sorted((event['start_time'], event['id']) for event in full['events_user']),
+        )
+
+    def test_cursors_are_checked(self):
+        response = self.client.get(self.URL, {'cursor_user': 'forged'})
+        self.assertEqual(response.status_code, 400)
+        # a cursor of one group is not accepted by the other
+        cursor = self.client.get(self.URL, {'page_size': 1}).data['next']['events_user']
+        self.assertEqual(self.client.get(self.URL, {'cursor_invited': cursor}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {'page_size': 'x'}).status_code, 400)
+
+    def test_sparse_fieldset(self):
+        fields = ['id', 'title', 'start_time', 'end_time']
+        response = self.client.get(self.URL, {'fields': ','.join(fields), 'group': 'invited'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('events_user', response.data)
+        self.assertTrue(response.data['events_invited'])
+        for event in response.data['events_invited']:
+            self.assertEqual(sorted(event), sorted(fields))
+
+        response = self.client.get(self.URL, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', str(response.data['fields']))
+
+
+class ICalDownloadTests(APITestCase):
+    """ical/download/ streams one VEVENT block per event, escaped and folded by icalendar."""
+    URL = '/api/events/ical/download/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='ical-user', password='unused-password')
+        circle = Circle.objects.create(name='Friends, family; all', creator=cls.user)
+        circle.members.add(cls.user)
+        address = Address.objects.create(address_line='1 rue de la Paix', city='Paris', latitude=48.87, longitude=2.33)
+        cls.start = datetime(2026, 11, 2, 18, tzinfo=dt_timezone.utc)
+        cls.description = 'Bring: wine, cheese; bread\\n' + 'long line ' * 20 + '\nsecond line'
+        cls.event = Event.objects.create(
+            title='Dinner, drinks; more', description=cls.description, start_time=cls.start,
+            end_time=cls.start + timedelta(hours=3), creator=cls.user, address=address,
+        )
+        cls.event.circles.add(circle)
+        # over a day: exported as a start and an end entry
+        Event.objects.create(
+            title='Trip', start_time=cls.start + timedelta(days=2), end_time=cls.start + timedelta(days=5),
+            creator=cls.user,
+        )
+
+    def download(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_special_characters_round_trip(self):
+        body = self.download()
+        self.assertTrue(body.startswith(b'BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith(b'END:VCALENDAR\r\n'))
+        # folded at 75 octets
+        self.assertLessEqual(max(len(line) for line in body.split(b'\r\n')), 75)
+
+        events = {str(event['summary']): event for event in Calendar.from_ical(body).walk('VEVENT')}
+        self.assertEqual(sorted(events), ['Dinner, drinks; more', 'Trip (Début)', 'Trip (Fin)'])
+        dinner = events['Dinner, drinks; more']
+        self.assertEqual(str(dinner['description']), self.description)
+        self.assertEqual(str(dinner['location']), '1 rue de la Paix, Paris')
+        self.assertEqual(dinner['categories'].cats, ['Friends, family; all'])
+        self.assertEqual(dinner.decoded('dtstart'), self.start)
+        self.assertEqual(str(dinner['uid']), f'zigzag-{self.event.id}@zigzag.com')
+
+    def test_queries_do_not_grow_with_events(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.download()
+        baseline = len(queries)
+        circle = Circle.objects.get(creator=self.user)
+        for index in range(20):
+            event = Event.objects.create(title=f'extra {index}', start_time=self.start, creator=self.user)
+            event.circles.add(circle)
+        with CaptureQueriesContext(connection) as queries:
+            body = self.download()
+        self.assertEqual(body.count(b'BEGIN:VEVENT'), 23)
+        self.assertEqual(len(queries), baseline)
+
+
+class CalendarFeedTests(APITestCase):
+    """The webcal feed revalidates with ETag/Last-Modified and changes with the user's events."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='feed-user', password='unused-password')
+        cls.owner = User.objects.create_user(username='feed-owner', password='unused-password')
+        cls.circle = Circle.objects.create(name='feed', creator=cls.owner)
+        cls.circle.members.add(cls.owner, cls.user)
+        start = datetime(2026, 11, 2, 18, tzinfo=dt_timezone.utc)
+        cls.events = []
+        for index in range(3):
+            event = Event.objects.create(
+                title=f'feed {index}', start_time=start, end_time=start + timedelta(hours=1), creator=cls.owner,
+            )
+            event.circles.add(cls.circle)
+            cls.events.append(event)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        url = self.client.get('/api/events/ical/subscription/').data['url']
+        self.feed_path = url.split('testserver', 1)[1]
+        self.client.force_authenticate(None)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.feed_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'BEGIN:VEVENT'), 3)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.client.get(self.feed_path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.feed_path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_changes_invalidate_and_rerender_only_changed_events(self):
+        etag = self.client.get(self.feed_path)['ETag']
+        event = self.events[0]
+        event.title = 'renamed'
+        event.save()
+
+        with mock.patch('events.ical.event_block', wraps=ical.event_block) as render:
+            response = self.client.get(self.feed_path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'SUMMARY:renamed', response.content)
+        self.assertEqual([call.args[0].id for call in render.call_args_list], [event.id])
+
+        etag = response['ETag']
+        self.circle.members.remove(self.user)
+        response = self.client.get(self.feed_path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'BEGIN:VEVENT', response.content)
+
+    def test_linking_a_circle_changes_the_feed(self):
+        # the owner's feed lists the circles of the event in CATEGORIES
+        self.client.force_authenticate(self.owner)
+        owner_path = self.client.get('/api/events/ical/subscription/').data['url'].split('testserver', 1)[1]
+        self.client.force_authenticate(None)
+        # an hour old, so Last-Modified moves by more than its one second resolution
+        Event.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        EventChange.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get(owner_path)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        # a circle the owner is not a member of: no visibility row of theirs changes
+        outside = Circle.objects.create(name='Outsiders', creator=self.user)
+        outside.members.add(self.user)
+        self.events[0].circles.add(outside)
+
+        response = self.client.get(owner_path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Outsiders', response.content)
+        self.assertEqual(self.client.get(owner_path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+        etag = response['ETag']
+        outside.events.remove(self.events[0])
+        response = self.client.get(owner_path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'Outsiders', response.content)
+
+    def test_rotated_token_stops_working(self):
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/events/ical/subscription/')
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.feed_path).status_code, 404)
+
+
+class BusyHistogramTests(APITestCase):
+    """Grey-event histograms agree with counting overlapping events bucket by bucket."""
+    URL = '/api/events/circles/grey-events/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='histogram', password='unused-password')
+        other = User.objects.create_user(username='histogram-friend', password='unused-password')
+        cls.circle = Circle.objects.create(name='histogram', creator=cls.user)
+        cls.circle.members.add(cls.user, other)
+        rng = random.Random(11)
+        # around the end of summer time in Paris (2026-10-25 03:00 -> 02:00)
+        origin = datetime(2026, 10, 23, tzinfo=dt_timezone.utc)
+        for index in range(80):
+            start = origin + timedelta(minutes=rng.choice([0, 30, 60]) * rng.randrange(0, 5 * 48))
+            end = start + timedelta(minutes=rng.choice([1, 30, 60, 90, 600, 1380]))
+            event = Event.objects.create(title=f'busy {index}', start_time=start, end_time=end, creator=other)
+            if index % 4:
+                event.circles.add(cls.circle)
+
+    def expected(self, events, starts, end):
+        bounds = starts[1:] + [end]
+        return [
+            sum(1 for event in events if event.start_time < upper and event.end_time > lower)
+            for lower, upper in zip(starts, bounds)
+        ]
+
+    def test_against_brute_force(self):
+        events = Event.objects.all()
+        start = datetime(2026, 10, 23, 7, 30, tzinfo=dt_timezone.utc)
+        end = datetime(2026, 10, 27, 2, tzinfo=dt_timezone.utc)
+        for unit in histogram.UNITS:
+            for tz in (ZoneInfo('UTC'), ZoneInfo('Europe/Paris'), ZoneInfo('America/New_York')):
+                starts, counts = histogram.busy_histogram(events, start, end, unit, tz)
+                self.assertEqual(starts, histogram.bucket_starts(start, end, unit, tz))
+                self.assertEqual(counts, self.expected(list(events), [max(moment, start) for moment in starts], end))
+        paris_days = histogram.bucket_starts(start, end, 'day', ZoneInfo('Europe/Paris'))
+        # wall-clock subtraction within one zone would hide the extra hour
+        self.assertEqual(paris_days[3].astimezone(dt_timezone.utc) - paris_days[2], timedelta(hours=25))
+
+    @override_settings(CIRCLE_CALENDAR_MIN_MEMBERS=2)
+    def test_endpoint(self):
+        self.client.force_authenticate(self.user)
+        params = {
+            'circle_ids': self.circle.id, 'mode': 'histogram', 'bucket': 'hour', 'tz': 'Europe/Paris',
+            'start': '2026-10-24T00:00:00+00:00', 'end': '2026-10-25T00:00:00+00:00',
+        }
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        result = response.data['histogram']
+        self.assertEqual(len(result['starts']), 24)
+        self.assertEqual(len(result['counts']), 24)
+        self.assertNotIn('grey_events', response.data)
+
+        self.assertEqual(self.client.get(self.URL, {**params, 'bucket': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {**params, 'tz': 'Mars/Olympus'}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {**params, 'end': '2030-01-01T00:00:00+00:00'}).status_code, 400)
+
+
+class CircleMembersBulkTests(APITestCase):
+    """add_members / remove_members / set_members write in bulk and report per id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='bulk-owner', password='unused-password')
+        cls.users = User.objects.bulk_create([User(username=f'bulk-{i}') for i in range(200)])
+        cls.circle = Circle.objects.create(name='bulk', creator=cls.owner)
+        cls.circle.members.add(cls.owner)
+        cls.event = Event.objects.create(title='bulk party', start_time=timezone.now(), creator=cls.owner)
+        cls.event.circles.add(cls.circle)
+
+    def post(self, action, member_ids, user=None):
+        self.client.force_authenticate(user or self.owner)
+        return self.client.post(
+            f'/api/events/circles/{self.circle.id}/{action}/', {'member_ids': member_ids}, format='json',
+        )
+
+    def members(self):
+        return set(self.circle.members.values_list('id', flat=True))
+
+    def test_queries_do_not_grow_with_ids(self):
+        def queries(action, member_ids):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.post(action, member_ids)
+            # the friend graph gets one row per new pair of members, written in batches
+            return response, [query for query in captured if 'events_friendship' not in query['sql']]
+
+        _, few = queries('add_members', [user.id for user in self.users[:2]])
+        response, many = queries('add_members', [user.id for user in self.users])
+        self.assertEqual(len(response.data['added']), 198)
+        self.assertEqual(response.data['already_present'], [self.users[0].id, self.users[1].id])
+        self.assertEqual(len(many), len(few))
+
+        _, few = queries('remove_members', [user.id for user in self.users[:2]])
+        response, many = queries('remove_members', [user.id for user in self.users])
+        self.assertEqual(len(response.data['removed']), 198)
+        self.assertEqual(self.members(), {self.owner.id})
+        self.assertEqual(len(many), len(few))
+
+    def test_reports_and_visibility(self):
+        alice, bob, carol = self.users[:3]
+        response = self.post('add_members', [alice.id, bob.id, alice.id])
+        self.assertEqual(
+            response.data, {"circle": self.circle.id, "added": [alice.id, bob.id], "already_present": [], "errors": []},
+        )
+        self.assertTrue(Event.objects.visible_to(alice).filter(id=self.event.id).exists())
+
+        response = self.post('set_members', [self.owner.id, bob.id, carol.id])
+        self.assertEqual(response.data['added'], [carol.id])
+        self.assertEqual(response.data['removed'], [alice.id])
+        self.assertEqual(response.data['already_present'], [self.owner.id, bob.id])
+        self.assertEqual(self.members(), {self.owner.id, bob.id, carol.id})
+        self.assertFalse(Event.objects.visible_to(alice).filter(id=self.event.id).exists())
+        self.assertTrue(Event.objects.visible_to(carol).filter(id=self.event.id).exists())
+
+        response = self.post('remove_members', [alice.id, bob.id])
+        self.assertEqual(response.data['removed'], [bob.id])
+        self.assertEqual(response.data['errors'], [f"User {alice.id} not in circle"])
+
+    def test_validation_and_permissions(self):
+        alice, bob = self.users[:2]
+        response = self.post('add_members', [alice.id, 999999])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['missing'], [999999])
+        self.assertEqual(self.members(), {self.owner.id})
+        self.assertEqual(self.post('set_members', [999999]).status_code, 404)
+        self.assertEqual(self.members(), {self.owner.id})
+        self.assertEqual(self.post('add_members', 'nope').status_code, 400)
+        self.assertEqual(self.post('add_members', ['x']).status_code, 400)
+
+        self.post('add_members', [alice.id, bob.id])
+        self.assertEqual(self.post('add_members', [self.users[2].id], user=alice).status_code, 403)
+        self.assertEqual(self.post('set_members', [alice.id], user=alice).status_code, 403)
+        self.assertEqual(self.post('remove_members', [bob.id], user=alice).status_code, 403)
+        response = self.post('remove_members', [alice.id], user=alice)
+        self.assertEqual(response.data['removed'], [alice.id])
+        self.assertEqual(self.members(), {self.owner.id, bob.id})
+
+
+class MultiCircleMembersTests(APITestCase):
+    """circles/members/ unions the members of many circles in a constant number of queries."""
+    URL = '/api/events/circles/members/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='union-user', password='unused-password')
+        cls.others = User.objects.bulk_create([User(username=f'union-{i:02d}') for i in range(60)])
+        cls.circles = []
+        for index in range(50):
+            circle = Circle.objects.create(name=f'union {index}', creator=cls.user)
+            # overlapping memberships: each member is in several circles
+            circle.members.add(cls.user, *cls.others[index:index + 8])
+            cls.circles.append(circle)
+        cls.stranger_circle = Circle.objects.create(name='not mine', creator=cls.others[0])
+        cls.stranger_circle.members.add(cls.others[0], *User.objects.bulk_create([User(username='union-hidden')]))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def post(self, circles, **body):
+        return self.client.post(self.URL, {'circle_ids': [circle.id for circle in circles], **body}, format='json')
+
+    def test_queries_do_not_grow_with_circles(self):
+        with CaptureQueriesContext(connection) as one:
+            self.post(self.circles[:1])
+        with CaptureQueriesContext(connection) as fifty:
+            response = self.post(self.circles)
+        self.assertEqual(len(fifty), len(one))
+        ids = [member['id'] for member in response.data]
+        self.assertEqual(ids, sorted({self.user.id} | {user.id for user in self.others[:57]}))
+
+    def test_count_only_and_pages(self):
+        self.assertEqual(self.post(self.circles, count_only=True).data, {"count": 58})
+        self.assertEqual(self.post(self.circles[:2], count_only='true').data, {"count": 10})
+
+        ids, body = [], {'page_size': 25}
+        while True:
+            response = self.post(self.circles, **body)
+            self.assertEqual(response.status_code, 200)
+            ids += [member['id'] for member in response.data['results']]
+            if response.data['next'] is None:
+                break
+            body = {'page_size': 25, 'cursor': response.data['next']}
+        self.assertEqual(ids, [member['id'] for member in self.post(self.circles).data])
+        self.assertEqual(self.post(self.circles, cursor='forged').status_code, 400)
+
+    def test_inaccessible_circles(self):
+        # members of circles the user does not belong to are not listed
+        response = self.post(self.circles[:1] + [self.stranger_circle])
+        self.assertNotIn('union-hidden', [member['username'] for member in response.data])
+        self.assertEqual(self.post([self.stranger_circle]).status_code, 404)
+        self.assertEqual(self.post([self.stranger_circle], count_only=True).status_code, 404)
+        self.assertEqual(self.post([]).status_code, 400)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_get_revalidates(self):
+        params = {'circle_ids': [self.circles[0].id]}
+        response = self.client.get(self.URL, params)
+        self.assertEqual(len(response.data), 9)
+        self.assertEqual(self.client.get(self.URL, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.circles[0].members.remove(self.others[0])
+        self.assertEqual(self.client.get(self.URL, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class FriendshipTests(APITestCase):
+    """The friend graph follows memberships, including circles deleted with their members."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'friend-{i}', password='unused-password') for i in range(6)]
+
+    def graph(self):
+        return {(row.user_id, row.friend_id): row.shared_circle_count for row in Friendship.objects.all()}
+
+    def assertInSync(self):
+        self.assertEqual(self.graph(), shared_circle_counts(Circle.members.through))
+
+    def test_counts_follow_memberships_and_deletes(self):
+        alice, bob, carol, dave = self.users[:4]
+        first = Circle.objects.create(name='first', creator=alice)
+        second = Circle.objects.create(name='second', creator=alice)
+        first.members.add(alice, bob, carol)
+        second.members.add(alice, bob)
+        self.assertEqual(self.graph()[(alice.id, bob.id)], 2)
+        self.assertEqual(self.graph()[(bob.id, alice.id)], 2)
+        self.assertEqual(self.graph()[(carol.id, bob.id)], 1)
+
+        self.client.force_authenticate(alice)
+        self.assertEqual(self.client.delete(f'/api/events/circles/{second.id}/').status_code, 204)
+        self.assertEqual(self.graph()[(alice.id, bob.id)], 1)
+        self.assertInSync()
+
+        dave.circles.add(first)
+        first.members.remove(carol)
+        self.assertNotIn((carol.id, alice.id), self.graph())
+        self.assertInSync()
+
+        first.delete()
+        self.assertEqual(self.graph(), {})
+
+    def test_random_changes_match_a_rebuild(self):
+        rng = random.Random(17)
+        circles = [Circle.objects.create(name=f'graph {i}', creator=self.users[i]) for i in range(4)]
+        for _ in range(60):
+            circle, users = rng.choice(circles), rng.sample(self.users, rng.randrange(1, 4))
+            operation = rng.randrange(5)
+            if operation == 0:
+                circle.members.add(*users)
+            elif operation == 1:
+                circle.members.remove(*users)
+            elif operation == 2:
+                users[0].circles.add(circle)
+            elif operation == 3:
+                users[0].circles.remove(circle)
+            elif rng.random() < 0.2:
+                circle.members.clear()
+        circles[0].delete()
+        self.assertInSync()
+        self.assertEqual(rebuild_friendships(), (0, 0, 0))
+
+    def test_friends_of_friends_ranking(self):
+        me, near, far, friend_a, friend_b, friend_c = self.users
+        for friend in (friend_a, friend_b, friend_c):
+            circle = Circle.objects.create(name=f'me and {friend.username}', creator=me)
+            circle.members.add(me, friend)
+        # near knows all three of my friends, far only one
+        for friend in (friend_a, friend_b, friend_c):
+            Circle.objects.create(name=f'near {friend.username}', creator=near).members.add(near, friend)
+        Circle.objects.create(name='far', creator=far).members.add(far, friend_a)
+
+        self.client.force_authenticate(me)
+        response = self.client.get('/api/events/users/friends-of-friends/')
+        self.assertEqual(
+            [(row['username'], row['mutual_friends']) for row in response.data],
+            [(near.username, 3), (far.username, 1)],
+        )
+        self.assertEqual(len(self.client.get('/api/events/users/friends-of-friends/', {'limit': 1}).data), 1)
+        self.assertEqual(self.client.get('/api/events/users/friends-of-friends/', {'limit': 0}).status_code, 400)
+
+
+class PublicDiscoveryTests(APITestCase):
+    """public/ pages through public events in (start_time, id) order with bbox, window and tag filters."""
+    URL = '/api/events/public/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='explorer', password='unused-password')
+        creator = User.objects.create_user(username='organiser', password='unused-password')
+        cls.tag, other_tag = Tag.objects.create(name='concert'), Tag.objects.create(name='market')
+        tagged = Circle.objects.create(name='concerts', creator=creator)
+        tagged.categories.add(cls.tag)
+        untagged = Circle.objects.create(name='markets', creator=creator)
+        untagged.categories.add(other_tag)
+
+        rng = random.Random(18)
+        cls.origin = datetime(2026, 11, 1, tzinfo=dt_timezone.utc)
+        # Paris, Lyon and both sides of the antimeridian
+        places = [(48.85, 2.35), (45.76, 4.84), (-16.5, 179.9), (-16.5, -179.9)]
+        for index in range(90):
+            lat, lng = rng.choice(places)
+            address = Address.objects.create(
+                address_line=f'{index} rue', latitude=lat + rng.uniform(-0.05, 0.05),
+                longitude=max(-180, min(180, lng + rng.uniform(-0.05, 0.05))),
+            )
+            event = Event.objects.create(
+                title=f'public {index}', creator=creator, address=address, is_public=index % 5 != 0,
+                # a few start times only, so pages break inside runs of equal start_time
+                start_time=cls.origin + timedelta(hours=rng.randrange(-5, 20) * 6),
+            )
+            event.circles.add(tagged if index % 2 else untagged)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def pages(self, page_size=7, **params):
+        titles, query = [], {**params, 'page_size': page_size}
+        while True:
+            response = self.client.get(self.URL, query)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertLessEqual(len(response.data['results']), page_size)
+            titles += [event['title'] for event in response.data['results']]
+            if response.data['next'] is None:
+                return titles
+            query = {**params, 'page_size': page_size, 'cursor': response.data['next']}
+
+    def expected(self, start, end=None, box=None, tag=None):
+        events = Event.objects.filter(is_public=True, start_time__gte=start).select_related('address')
+        if end is not None:
+            events = events.filter(start_time__lt=end)
+        if tag is not None:
+            events = events.filter(circles__categories=tag)
+        rows = []
+        for event in events.order_by('start_time', 'id'):
+            if box is not None:
+                west, south, east, north = box
+                lat, lng = event.address.latitude, event.address.longitude
+                inside_lng = west <= lng <= east if west <= east else (lng >= west or lng <= east)
+                if not (south <= lat <= north and inside_lng):
+                    continue
+            rows.append(event.title)
+        return rows
+
+    def test_pages_match_the_filters(self):
+        start, end = self.origin, self.origin + timedelta(days=3)
+        cases = [
+            ({'start': start.isoformat()}, self.expected(start)),
+            ({'start': start.isoformat(), 'end': end.isoformat()}, self.expected(start, end)),
+            ({'start': start.isoformat(), 'bbox': '2,48,3,49'}, self.expected(start, box=(2, 48, 3, 49))),
+            ({'start': start.isoformat(), 'bbox': '179,-17,-179,-16'}, self.expected(start, box=(179, -17, -179, -16))),
+            ({'start': start.isoformat(), 'tags': str(self.tag.id)}, self.expected(start, tag=self.tag)),
+        ]
+        for params, expected in cases:
+            self.assertTrue(expected, params)
+            self.assertEqual(self.pages(**params), expected, params)
+        self.assertEqual(self.pages(page_size=100, start=start.isoformat()), self.pages(start=start.isoformat()))
+
+    def test_start_defaults_to_now(self):
+        with mock.patch('django.utils.timezone.now', return_value=self.origin):
+            titles = self.pages()
+        self.assertEqual(titles, self.expected(self.origin))
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'forged'}, {'page_size': 0}, {'start': 'soon'}, {'tags': 'music'}, {'bbox': '1,2'}):
+            self.assertEqual(self.client.get(self.URL, params).status_code, 400, params)
+
+
+class AddressDeduplicationTests(APITestCase):
+    """Equal places share one Address row; merge_duplicate_addresses collapses older duplicates."""
+    PLACE = {'address_line': "12, Rue de l'Église", 'city': 'Lyon', 'latitude': 45.764043, 'longitude': 4.835659}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice-address', password='unused-password')
+        cls.bob = User.objects.create_user(username='bob-address', password='unused-password')
+
+    def save_location(self, user, **place):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/events/user/addresses/', {**self.PLACE, 'label': 'home', **place}, format='json')
+
+    def test_canonical_key(self):
+        key = canonical_key("12, Rue de l'Église ", 45.764043, 4.835659)
+        self.assertEqual(key, canonical_key('12 rue de l eglise', 45.7640431, 4.8356588))
+        self.assertNotEqual(key, canonical_key('14 rue de l eglise', 45.764043, 4.835659))
+        self.assertNotEqual(key, canonical_key('12 rue de l eglise', 45.76406, 4.835659))
+        self.assertEqual(canonical_key('x', -0.000001, 0), canonical_key('x', 0, 0))
+        # same point and line in another city or postal code is another place
+        self.assertNotEqual(key, canonical_key("12, Rue de l'Église", 45.764043, 4.835659, 'Villeurbanne'))
+        self.assertNotEqual(key, canonical_key("12, Rue de l'Église", 45.764043, 4.835659, None, '69002'))
+
+    def test_canonical_key_is_unique(self):
+        address = Address.objects.create(**self.PLACE)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Address.objects.create(**{**self.PLACE, 'address_line': '12 rue de l eglise'})
+
+        # another request inserted the place between the lookup and the insert: its row is returned
+        with mock.patch.object(
+            AddressQuerySet, 'get', autospec=True, side_effect=[Address.DoesNotExist, address],
+        ) as get:
+            self.assertEqual(Address.objects.canonical(**self.PLACE), (address, False))
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(Address.objects.canonical(**{**self.PLACE, 'city': 'Villeurbanne'})[1], True)
+
+    def test_api_reuses_addresses(self):
+        first = self.save_location(self.alice)
+        self.assertEqual(first.status_code, 201)
+        # same place, other spelling and a sub-meter difference
+        again = self.save_location(self.alice, address_line='12 rue de l eglise', latitude=45.7640431)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], first.data['id'])
+        self.assertEqual(self.save_location(self.bob).status_code, 201)
+        self.assertEqual(Address.objects.count(), 1)
+        self.assertEqual(UserAddress.objects.count(), 2)
+
+        circle = Circle.objects.create(name='brunch', creator=self.bob)
+        circle.members.add(self.bob)
+        response = self.client.post('/api/events/event/', {
+            'title': 'brunch', 'start_time': '2026-11-08T10:00:00Z', 'circle_ids': [circle.id],
+            'address': {**self.PLACE, 'latitude': 45.7640429},
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Event.objects.get(title='brunch').address_id, Address.objects.get().id)
+
+        # the saved locations go, the address stays while the event uses it
+        for user in (self.alice, self.bob):
+            self.client.force_authenticate(user)
+            user_address = UserAddress.objects.get(user=user)
+            self.assertEqual(self.client.delete(f'/api/events/user/addresses/{user_address.id}/').status_code, 204)
+        self.assertEqual(Address.objects.count(), 1)
+
+    def test_merge_command(self):
+        # rows written before deduplication, without canonical keys
+        rows = Address.objects.bulk_create([
+            Address(address_line=line, latitude=latitude, longitude=4.835659, geohash=geo.encode(latitude, 4.835659))
+            for line, latitude in [
+                ("12, Rue de l'Église", 45.764043), ('12 RUE DE L EGLISE', 45.7640431),
+                ('12 rue de l’église', 45.764043), ('Place Bellecour', 45.7578),
+            ]
+        ] + [
+            Address(address_line="12, Rue de l'Église", city='Villeurbanne', latitude=45.764043, longitude=4.835659),
+        ])
+        keep, duplicates, others = rows[0], rows[1:3], rows[3:]
+        events = [
+            Event.objects.create(title=f'merged {index}', start_time=timezone.now(), creator=self.alice, address=row)
+            for index, row in enumerate(rows)
+        ]
+        UserAddress.objects.bulk_create([
+            UserAddress(user=self.alice, address=duplicates[0], label='old'),
+            UserAddress(user=self.alice, address=duplicates[1], label='older'),
+            UserAddress(user=self.bob, address=duplicates[1], label='bob'),
+        ])
+
+        out = StringIO()
+        call_command('merge_duplicate_addresses', '--dry-run', stdout=out)
+        self.assertIn('2 duplicate rows', out.getvalue())
+        self.assertIn('rows differing in city or postal code are kept apart', out.getvalue())
+        self.assertEqual(Address.objects.count(), 5)
+
+        out = StringIO()
+        call_command('merge_duplicate_addresses', stdout=out)
+        self.assertIn('Collapsed 2 addresses into 1', out.getvalue())
+        self.assertIn('1 duplicate saved locations removed', out.getvalue())
+        self.assertEqual(set(Address.objects.values_list('id', flat=True)), {keep.id} | {row.id for row in others})
+        self.assertEqual(Address.objects.filter(canonical_key='').count(), 0)
+        for event in events[:3]:
+            event.refresh_from_db()
+            self.assertEqual((event.address_id, event.geohash), (keep.id, keep.geohash))
+        self.assertEqual(
+            sorted(UserAddress.objects.values_list('user__username', 'address_id')),
+            [('alice-address', keep.id), ('bob-address', keep.id)],
+        )
+
+        out = StringIO()
+        call_command('merge_duplicate_addresses', stdout=out)
+        self.assertIn('0 duplicate rows', out.getvalue())
+
+
+class ConditionalGetTests(APITestCase):
+    """Read endpoints answer If-None-Match with 304 until their rows or the user's memberships change."""
+    EVENT_URLS = ['/api/events/event/', '/api/events/markers/', '/api/events/ical/download/']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='etag-user', password='unused-password')
+        cls.owner = User.objects.create_user(username='etag-owner', password='unused-password')
+        cls.circles = []
+        cls.events = []
+        for index in range(2):
+            circle = Circle.objects.create(name=f'etag {index}', creator=cls.owner)
+            circle.members.add(cls.owner)
+            address = Address.objects.create(address_line=f'{index} quai', latitude=48.85 + index, longitude=2.35)
+            event = Event.objects.create(
+                title=f'etag {index}', creator=cls.owner, address=address,
+                start_time=datetime(2026, 11, 2 + index, 18, tzinfo=dt_timezone.utc),
+                end_time=datetime(2026, 11, 2 + index, 20, tzinfo=dt_timezone.utc),
+            )
+            event.circles.add(circle)
+            cls.circles.append(circle)
+            cls.events.append(event)
+        cls.circles[0].members.add(cls.user)
+        # equal timestamps: only the membership signal tells the two events apart
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Event.objects.update(updated_at=an_hour_ago)
+        Address.objects.update(updated_at=an_hour_ago)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url, params=None):
+        """GET, check the 304 for the ETag received, and return that ETag."""
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache', url)
+        etag = response['ETag']
+        again = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304, url)
+        self.assertEqual(again['ETag'], etag, url)
+        return etag
+
+    def assertChanged(self, url, etag, params=None):
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertNotEqual(response['ETag'], etag, url)
+
+    def test_event_edit(self):
+        etags = {url: self.revalidate(url) for url in self.EVENT_URLS}
+        event = self.events[0]
+        event.title = 'edited'
+        event.save()
+        for url, etag in etags.items():
+            self.assertChanged(url, etag)
+
+    def test_membership_change(self):
+        etags = {url: self.revalidate(url) for url in self.EVENT_URLS}
+        # one visible event swapped for another with the same timestamps: same count and max updated_at
+        self.circles[0].members.remove(self.user)
+        self.circles[1].members.add(self.user)
+        for url, etag in etags.items():
+            self.assertChanged(url, etag)
+
+    def test_circle_members(self):
+        params = {'circle_ids': [self.circles[0].id]}
+        etag = self.revalidate('/api/events/circles/members/', params)
+        self.circles[0].members.add(self.events[1].creator, User.objects.create_user(username='etag-new'))
+        self.assertChanged('/api/events/circles/members/', etag, params)
+        etag = self.revalidate('/api/events/circles/members/', params)
+        self.client.force_authenticate(self.owner)
+        self.client.post(
+            f'/api/events/circles/{self.circles[0].id}/remove_members/', {'member_ids': [self.owner.id]}, format='json',
+        )
+        self.client.force_authenticate(self.user)
+        self.assertChanged('/api/events/circles/members/', etag, params)
+
+    def test_my_locations(self):
+        etag = self.revalidate('/api/events/my/locations/')
+        UserAddress.objects.create(user=self.user, address=self.events[0].address, label='work')
+        self.assertChanged('/api/events/my/locations/', etag)
+
+    def test_ical_download_headers(self):
+        response = self.client.get('/api/events/ical/download/')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('attachment', response['Content-Disposition'])
+        # a POST is never answered from the client cache
+        self.assertNotIn('ETag', self.client.post('/api/events/markers/', {}, format='json'))
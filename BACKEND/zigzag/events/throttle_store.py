@@ -0,0 +1,258 @@
+"""
+Shared state of the throttles in events.throttles.
+
+Each throttle key (scope + client) is a token bucket: it holds up to
+``capacity`` tokens, refills at ``rate`` tokens per second and a request
+takes ``cost`` tokens. A bucket is two numbers (tokens left, time of the last
+write), so a check is one read and at most one write whatever the traffic,
+and a bucket that refilled completely carries no information and expires.
+
+The store is chosen by THROTTLE_STORE:
+
+- 'database' (default): ThrottleBucket rows, shared by every worker of every
+  host; expired rows are purged every THROTTLE_PURGE_INTERVAL seconds.
+- 'redis': a Redis-compatible server at THROTTLE_REDIS_URL (needs the
+  ``redis`` package); keys expire on their own.
+- 'cache': Django's default cache, without a database write per request;
+  shared by the workers only when that cache is (memcached, redis...).
+- 'local': an in-process dict, the stand-in for tests and single-process
+  development.
+
+or the dotted path of a class with the same methods. The per-user cost
+throttle of the read endpoints uses THROTTLE_COST_STORE instead ('cache' by
+default): it runs on every request of those endpoints, and locking a row per
+request would load the database it is meant to protect. Each store also
+counts the requests denied per scope.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import ThrottleBucket, ThrottleDenial
+
+
+def refill(tokens, refilled_at, capacity, rate, now):
+    """Tokens in a bucket left with ``tokens`` at ``refilled_at``, at ``now``."""
+    return min(capacity, tokens + max(0.0, now - refilled_at) * rate)
+
+
+def take(tokens, capacity, rate, cost):
+    """
+    Try to take ``cost`` tokens from a bucket holding ``tokens``.
+    Returns (allowed, tokens left, seconds until the bucket is full, seconds to wait if denied).
+    """
+    if tokens >= cost:
+        tokens -= cost
+        return True, tokens, (capacity - tokens) / rate, 0.0
+    return False, tokens, (capacity - tokens) / rate, (cost - tokens) / rate
+
+
+class LocalStore:
+    """Buckets in this process only: each worker enforces its own limits."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.denied = Counter()
+        self.purged_at = clock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Returns (allowed, seconds to wait before retrying)."""
+        now = self.clock()
+        with self.lock:
+            self._purge(now)
+            bucket = self.buckets.get(key)
+            tokens = capacity if bucket is None else refill(bucket[0], bucket[1], capacity, rate, now)
+            allowed, tokens, ttl, wait = take(tokens, capacity, rate, cost)
+            if allowed:
+                self.buckets[key] = (tokens, now, now + ttl)
+        return allowed, wait
+
+    def _purge(self, now):
+        if now - self.purged_at < getattr(settings, 'THROTTLE_PURGE_INTERVAL', 300):
+            return
+        self.purged_at = now
+        for key in [key for key, bucket in self.buckets.items() if bucket[2] <= now]:
+            del self.buckets[key]
+
+    def record_denied(self, scope):
+        with self.lock:
+            self.denied[scope] += 1
+
+    def denied_counts(self):
+        with self.lock:
+            return dict(self.denied)
+
+
+class DatabaseStore:
+    """ThrottleBucket rows, locked while a request takes its tokens."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.purged_at = clock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = self.clock()
+        self._purge(now)
+        with transaction.atomic():
+            bucket = ThrottleBucket.objects.select_for_update().filter(key=key).first()
+            if bucket is None or bucket.expires_at <= now:
+                tokens = capacity
+            else:
+                tokens = refill(bucket.tokens, bucket.refilled_at, capacity, rate, now)
+            allowed, tokens, ttl, wait = take(tokens, capacity, rate, cost)
+            if not allowed:
+                # nothing to write: the refill is computed from refilled_at
+                return False, wait
+            if bucket is not None:
+                bucket.tokens, bucket.refilled_at, bucket.expires_at = tokens, now, now + ttl
+                bucket.save(update_fields=['tokens', 'refilled_at', 'expires_at'])
+                return True, 0.0
+            try:
+                with transaction.atomic():
+                    ThrottleBucket.objects.create(key=key, tokens=tokens, refilled_at=now, expires_at=now + ttl)
+            except IntegrityError:
+                pass
+            else:
+                return True, 0.0
+        # another worker created the bucket first: start over on its row
+        return self.consume(key, capacity, rate, cost)
+
+    def _purge(self, now):
+        if now - self.purged_at < getattr(settings, 'THROTTLE_PURGE_INTERVAL', 300):
+            return
+        self.purged_at = now
+        ThrottleBucket.objects.filter(expires_at__lte=now).delete()
+
+    def record_denied(self, scope):
+        if not ThrottleDenial.objects.filter(scope=scope).update(count=F('count') + 1):
+            try:
+                with transaction.atomic():
+                    ThrottleDenial.objects.create(scope=scope, count=1)
+            except IntegrityError:
+                ThrottleDenial.objects.filter(scope=scope).update(count=F('count') + 1)
+
+    def denied_counts(self):
+        return dict(ThrottleDenial.objects.values_list('scope', 'count'))
+
+
+class CacheStore:
+    """
+    Buckets in Django's default cache, expiring once full. The update is a
+    read then a write, so concurrent requests of one client can both take the
+    last token: fine for abuse protection, not for exact quotas.
+    """
+    PREFIX = 'throttle:bucket:'
+    DENIED_PREFIX = 'throttle:denied:'
+    SCOPES_KEY = 'throttle:denied-scopes'
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = self.clock()
+        bucket = cache.get(self.PREFIX + key)
+        tokens = capacity if bucket is None else refill(bucket[0], bucket[1], capacity, rate, now)
+        allowed, tokens, ttl, wait = take(tokens, capacity, rate, cost)
+        if allowed:
+            cache.set(self.PREFIX + key, (tokens, now), max(1, math.ceil(ttl)))
+        return allowed, wait
+
+    def record_denied(self, scope):
+        key = self.DENIED_PREFIX + scope
+        if cache.add(key, 0, None):
+            # first denial of the scope: list it, cache keys cannot be enumerated
+            cache.set(self.SCOPES_KEY, sorted(set(cache.get(self.SCOPES_KEY, [])) | {scope}), None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # evicted between add() and incr()
+            cache.set(key, 1, None)
+
+    def denied_counts(self):
+        scopes = cache.get(self.SCOPES_KEY, [])
+        counts = cache.get_many([self.DENIED_PREFIX + scope for scope in scopes])
+        return {scope: counts.get(self.DENIED_PREFIX + scope, 0) for scope in scopes}
+
+
+class RedisStore:
+    """
+    Buckets as Redis hashes updated by a Lua script, so a check is a single
+    atomic round trip; the key expires once the bucket would be full.
+    Works with any server speaking the Redis protocol (Valkey, KeyDB...).
+    """
+    DENIED_KEY = 'throttle:denied'
+    SCRIPT = """
+        local capacity, rate, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'refilled_at')
+        local tokens = capacity
+        if state[1] then
+            tokens = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+        end
+        if tokens < cost then
+            return {0, tostring(tokens)}
+        end
+        tokens = tokens - cost
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'refilled_at', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1)
+        return {1, tostring(tokens)}
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as exc:
+                raise ImproperlyConfigured("THROTTLE_STORE = 'redis' needs the redis package.") from exc
+            client = redis.Redis.from_url(getattr(settings, 'THROTTLE_REDIS_URL', 'redis://localhost:6379/0'))
+        self.client = client
+        self.script = client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, rate, cost=1):
+        allowed, tokens = self.script(keys=[key], args=[capacity, rate, cost])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+
+    def record_denied(self, scope):
+        self.client.hincrby(self.DENIED_KEY, scope, 1)
+
+    def denied_counts(self):
+        return {
+            scope.decode() if isinstance(scope, bytes) else scope: int(count)
+            for scope, count in self.client.hgetall(self.DENIED_KEY).items()
+        }
+
+
+STORES = {'database': DatabaseStore, 'redis': RedisStore, 'cache': CacheStore, 'local': LocalStore}
+_stores = {}
+
+
+DEFAULT_STORES = {'THROTTLE_STORE': 'database', 'THROTTLE_COST_STORE': 'cache'}
+
+
+def get_store(setting='THROTTLE_STORE'):
+    """The store named by ``setting`` (THROTTLE_STORE or THROTTLE_COST_STORE), created once per process."""
+    name = getattr(settings, setting, DEFAULT_STORES[setting])
+    if name not in _stores:
+        _stores[name] = (STORES.get(name) or import_string(name))()
+    return _stores[name]
+
+
+def denied_counts():
+    """{scope: number of throttled requests} from the stores in use."""
+    counts = Counter()
+    for store in {get_store(setting) for setting in DEFAULT_STORES}:
+        counts.update(store.denied_counts())
+    return dict(counts)
@@ -1,7 +1,46 @@
 from rest_framework.throttling import AnonRateThrottle
 
+from .throttle_store import get_store
 
-class RegisterThrottle(AnonRateThrottle):
+
+class TokenBucketThrottle(AnonRateThrottle):
+    """
+    AnonRateThrottle whose history lives in the shared throttle store
+    (events.throttle_store) as a token bucket instead of a list of request
+    timestamps in the local cache: a rate of '10/hour' allows bursts of 10
+    requests and refills one token every 6 minutes, across all workers.
+    Rejected requests are counted per scope.
+    """
+    cost = 1
+    # setting naming the store of the buckets, see events.throttle_store
+    store_setting = 'THROTTLE_STORE'
+
+    def get_cost(self, request, view):
+        """Tokens this request takes; 0 lets it through without touching the bucket."""
+        return self.cost
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        cost = self.get_cost(request, view)
+        if not cost:
+            return True
+        # a cost above the capacity could never be paid: charge a full bucket instead
+        cost = min(cost, self.num_requests)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        store = get_store(self.store_setting)
+        allowed, self.wait_seconds = store.consume(self.key, self.num_requests, self.num_requests / self.duration, cost)
+        if not allowed:
+            store.record_denied(self.scope)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class RegisterThrottle(TokenBucketThrottle):
     """
     Throttle class for registration endpoint.
     Uses 'register' rate from DEFAULT_THROTTLE_RATES setting.
@@ -9,7 +48,7 @@ class RegisterThrottle(AnonRateThrottle):
     scope = 'register'
 
 
-class LoginThrottle(AnonRateThrottle):
+class LoginThrottle(TokenBucketThrottle):
     """
     Throttle class for login endpoint.
     Uses 'login' rate from DEFAULT_THROTTLE_RATES setting.
@@ -17,7 +56,7 @@ class LoginThrottle(AnonRateThrottle):
     scope = 'login'
 
 
-class PasswordResetThrottle(AnonRateThrottle):
+class PasswordResetThrottle(TokenBucketThrottle):
     """
     Throttle class for password reset endpoint.
     Uses 'password_reset' rate from DEFAULT_THROTTLE_RATES setting.
@@ -25,9 +64,36 @@ class PasswordResetThrottle(AnonRateThrottle):
     scope = 'password_reset'
 
 
-class ContactThrottle(AnonRateThrottle):
+class ContactThrottle(TokenBucketThrottle):
     """
     Throttle class for contact form endpoint.
     Uses 'contact' rate from DEFAULT_THROTTLE_RATES setting.
     """
     scope = 'contact'
+
+
+
+class UserCostThrottle(TokenBucketThrottle):
+    """
+    Per-user budget for expensive read endpoints, using the 'user_cost' rate
+    from DEFAULT_THROTTLE_RATES as cost units per period (anonymous clients
+    are keyed by IP). Each view declares what a request costs in
+    ``throttle_cost``: a number, or on viewsets a {action: cost} dict where
+    missing actions cost nothing. Buckets live in THROTTLE_COST_STORE (the
+    cache by default) so these read paths do not write to the database.
+    """
+    scope = 'user_cost'
+    store_setting = 'THROTTLE_COST_STORE'
+
+    def get_cost(self, request, view):
+        cost = getattr(view, 'throttle_cost', self.cost)
+        if isinstance(cost, dict):
+            return cost.get(getattr(view, 'action', None), 0)
+        return cost
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -6,11 +6,17 @@ from .views import (
     MultiCircleMembersView,
     TagListView,
     MyLocationsView,
+    NearbyEventsView,
     ProfileViewSet,
     FriendsListView,
+    UserSearchView,
+    FriendsOfFriendsView,
     ProfileByUserView,
     ICalDownloadView,
+    CalendarSubscriptionView,
+    CalendarFeedView,
     CircleGreyEventsView,
+    CircleAvailabilityView,
     ChangePasswordView,
     PasswordResetRequestView,
     PasswordResetConfirmView,
@@ -34,7 +40,9 @@ urlpatterns = [
     path('event/<uuid:id>/', event_detail, name='event-detail'),
     path('event/<uuid:id>/generate_invite/', EventViewSet.as_view({'post': 'generate_invite'}), name='event-generate-invite'),
     path('event/<uuid:id>/accept_invite/', EventViewSet.as_view({'post': 'accept_invite'}), name='event-accept-invite'),
-    path('markers/', EventViewSet.as_view({'post': 'markers'}), name='user-markers'),
+    path('markers/', EventViewSet.as_view({'get': 'markers', 'post': 'markers'}), name='user-markers'),
+    path('public/', EventViewSet.as_view({'get': 'public'}), name='public-events'),
+    path('sync/', EventViewSet.as_view({'get': 'sync'}), name='event-sync'),
 
     # Profile endpoints
     path('profile/', ProfileViewSet.as_view({'get': 'list', 'post': 'create'}), name='profile-list'),
@@ -51,16 +59,23 @@ urlpatterns = [
     path('circles/<int:id>/', CircleViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='circle-detail'),
     path('circles/<int:id>/add_members/', CircleViewSet.as_view({'post': 'add_members'}), name='circle-add-members'),
     path('circles/<int:id>/remove_members/', CircleViewSet.as_view({'post': 'remove_members'}), name='circle-remove-members'),
+    path('circles/<int:id>/set_members/', CircleViewSet.as_view({'post': 'set_members'}), name='circle-set-members'),
     path('circles/members/', MultiCircleMembersView.as_view(), name='multi_circle_members'),
     path('circles/grey-events/', CircleGreyEventsView.as_view(), name='circle-grey-events'),
+    path('circles/availability/', CircleAvailabilityView.as_view(), name='circle-availability'),
     path('tags/', TagListView.as_view(), name='tag-list'),
     path('my/locations/', MyLocationsView.as_view(), name='my-locations'),
+    path('my/locations/nearby/', NearbyEventsView.as_view(), name='my-locations-nearby'),
     path('users/', FriendsListView.as_view(), name='users-list'),
+    path('users/search/', UserSearchView.as_view(), name='users-search'),
+    path('users/friends-of-friends/', FriendsOfFriendsView.as_view(), name='users-friends-of-friends'),
 
 
 
     # iCal export endpoints
     path('ical/download/', ICalDownloadView.as_view(), name='ical-download'),
+    path('ical/subscription/', CalendarSubscriptionView.as_view(), name='ical-subscription'),
+    path('ical/feed/<str:token>.ics', CalendarFeedView.as_view(), name='ical-feed'),
     
     # Password change endpoint
     path('change-password/', ChangePasswordView.as_view(), name='change-password'),
@@ -1,5 +1,7 @@
 import secrets
 
+from django.core import signing
+
 
 def generate_invitation_token():
     """
@@ -7,3 +9,16 @@ def generate_invitation_token():
     Returns a 32-byte token encoded in base64 URL-safe format.
     """
     return secrets.token_urlsafe(32)
+
+
+def encode_cursor(data, salt):
+    """Encode pagination/sync state into an opaque, tamper-proof cursor string."""
+    return signing.dumps(data, salt=salt, compress=True)
+
+
+def decode_cursor(token, salt):
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it was altered."""
+    try:
+        return signing.loads(token, salt=salt)
+    except signing.BadSignature:
+        raise ValueError("Invalid cursor.") from None
@@ -1,4 +1,6 @@
 import os
+from datetime import datetime, time as datetime_time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -7,20 +9,26 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
-from django.db.models import Q, Prefetch, F
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import Q, Prefetch, F, Count, Avg, Window, Max, Exists, OuterRef
+from django.db.models.functions import Substr, RowNumber
 from django.shortcuts import get_object_or_404
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, StreamingHttpResponse
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode, http_date
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
 from django.utils.encoding import force_bytes, force_str
-from icalendar import Calendar, Event as ICalEvent
-from anymail.message import AnymailMessage
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from .models import (
     Event,
+    EventChange,
+    CalendarFeed,
     Circle,
     Address,
     UserAddress,
@@ -28,7 +36,13 @@ from .models import (
     Profile,
     User
 )
-from .utils import generate_invitation_token
+from . import availability, geo, histogram, outbox, response_cache, schedule
+from .utils import generate_invitation_token, encode_cursor, decode_cursor
+from .response_cache import cached_response, current_versions
+from .etags import conditional, event_state, make_etag, visible_state
+from .ical import stream_calendar, render_calendar
+from .search import search_users
+from .friendships import friends_of_friends
 from .serializers import (
     EventSerializer,
     AddressSerializer,
@@ -43,7 +57,7 @@ from .serializers import (
     PasswordResetConfirmSerializer,
     ContactFormSerializer,
 )
-from events.throttles import RegisterThrottle, LoginThrottle, PasswordResetThrottle, ContactThrottle
+from events.throttles import RegisterThrottle, LoginThrottle, PasswordResetThrottle, ContactThrottle, UserCostThrottle
 
 
 class EventViewSet(viewsets.ModelViewSet):
@@ -53,6 +67,9 @@ class EventViewSet(viewsets.ModelViewSet):
     serializer_class = EventSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserCostThrottle] if not settings.DEBUG else []
+    # only the map markers are throttled; other actions cost nothing
+    throttle_cost = {'markers': 3}
     lookup_field = "id"
     lookup_url_kwarg = "id"
 
@@ -74,8 +91,8 @@ class EventViewSet(viewsets.ModelViewSet):
                 try:
                     event = Event.objects.get(id=event_id)
                     
-                    # Only allow access if the event has an invitation token
-                    if event.invitation_token:
+                    # Only allow access if the event has an invitation token or is public
+                    if event.invitation_token or event.is_public:
                         return event
                     else:
                         print(f"🔍 GET_OBJECT: Event {event_id} has no invitation token")
@@ -90,38 +107,142 @@ class EventViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to pass request context to serializer"""
         instance = self.get_object()
-        serializer = self.get_serializer(instance, context={'request': request})
+        serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            # Looked up once per request so EventSerializer never queries membership per event
+            if not hasattr(self, '_member_circle_ids'):
+                self._member_circle_ids = set(
+                    Circle.members.through.objects.filter(user_id=self.request.user.id)
+                    .values_list('circle_id', flat=True)
+                )
+            context['member_circle_ids'] = self._member_circle_ids
+        return context
+
+    def _with_payload(self, events, fields=None):
+        """
+        Load everything EventSerializer reads (address, creators, circles and their tags)
+        so serializing any number of events costs a constant number of queries.
+        With a sparse fieldset only the relations those fields need are loaded.
+        """
+        def wanted(*names):
+            return fields is None or any(name in fields for name in names)
+
+        related = [name for name in ('address', 'creator') if wanted(name)]
+        if related:
+            events = events.select_related(*related)
+        if wanted('circles'):
+            events = events.prefetch_related(
+                Prefetch('circles', queryset=Circle.objects.select_related('creator').prefetch_related('categories'))
+            )
+        elif wanted('can_generate_invite'):
+            events = events.prefetch_related(Prefetch('circles', queryset=Circle.objects.only('id')))
+        return events
+
     def get_queryset(self):
         """
         Return a standard queryset for CRUD operations.
         Grouping for the project view is handled in list().
         """
-        user = self.request.user
-        user_circles = Circle.objects.filter(members=user)
-        
-        events = Event.objects.filter(Q(creator=user) | Q(circles__in=user_circles)).distinct()
-        
+        events = Event.objects.visible_to(self.request.user)
+        if self.action == 'retrieve':
+            events = self._with_payload(events)
         return events
 
+    def _requested_fields(self, request):
+        """Parse ?fields=id,title,... into a list, or None for the full payload."""
+        value = request.query_params.get('fields')
+        if not value:
+            return None
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = sorted(set(fields) - set(EventSerializer.readable_fields()))
+        if unknown:
+            raise ValidationError({"fields": f"Unknown field(s): {', '.join(unknown)}."})
+        return fields
+
+    def _page_size(self, request):
+        """Page size when the client asked for pagination, None for the legacy unbounded list."""
+        params = request.query_params
+        if not any(key in params for key in ('page_size', 'cursor_user', 'cursor_invited')):
+            return None
+        default = getattr(settings, 'EVENT_LIST_PAGE_SIZE', 50)
+        try:
+            page_size = int(params.get('page_size', default))
+        except ValueError:
+            raise ValidationError({"page_size": "Must be an integer."}) from None
+        if page_size < 1:
+            raise ValidationError({"page_size": "Must be at least 1."})
+        return min(page_size, getattr(settings, 'EVENT_LIST_MAX_PAGE_SIZE', 200))
+
+    def _keyset_page(self, events, cursor, page_size, salt):
+        """
+        Return (events, next_cursor) for one page ordered by (start_time, id).
+        The cursor holds the last row of the previous page, so every page is an
+        index range scan however deep the client has paged.
+        """
+        if cursor:
+            try:
+                position = decode_cursor(cursor, salt=salt)
+                start_time = parse_datetime(position['s'])
+                last_id = position['id']
+            except (ValueError, KeyError, TypeError):
+                raise ValidationError({"cursor": "Invalid cursor."}) from None
+            if start_time is None:
+                raise ValidationError({"cursor": "Invalid cursor."})
+            events = events.filter(Q(start_time__gt=start_time) | Q(start_time=start_time, id__gt=last_id))
+
+        page = list(events[:page_size + 1])
+        if len(page) <= page_size:
+            return page, None
+        page = page[:page_size]
+        last = page[-1]
+        return page, encode_cursor({"s": last.start_time.isoformat(), "id": str(last.id)}, salt=salt)
+
+    def _visible_state(self, request):
+        return visible_state(request.user, Event.objects.visible_to(request.user))
+
+    @conditional(_visible_state)
+    @cached_response('events')
     def list(self, request, *args, **kwargs):
         """
         Return events grouped into two arrays: events_user and events_invited.
         This preserves a standard queryset for other actions (retrieve, create, update, delete).
+
+        Optional query parameters:
+        - fields: comma-separated sparse fieldset, e.g. fields=id,title,start_time,end_time
+        - page_size, cursor_user, cursor_invited: keyset pagination ordered by (start_time, id);
+          the response then carries "next": {"events_user": cursor, "events_invited": cursor}
+          with null once a group is exhausted
+        - group: "user" or "invited" to fetch only one of the arrays
         """
         user = request.user
-        user_circles = Circle.objects.filter(members=user)
-
-        events_user = Event.objects.filter(creator=user)
-        events_invited = Event.objects.filter(circles__in=user_circles).exclude(creator=user).distinct()
+        fields = self._requested_fields(request)
+        page_size = self._page_size(request)
+        group = request.query_params.get('group')
+        if group not in (None, 'user', 'invited'):
+            raise ValidationError({"group": "Must be 'user' or 'invited'."})
+
+        groups = {
+            'events_user': (group != 'invited', Event.objects.filter(creator=user), 'cursor_user'),
+            'events_invited': (group != 'user', Event.objects.visible_to(user).exclude(creator=user), 'cursor_invited'),
+        }
+        data, next_cursors = {}, {}
+        for key, (included, events, cursor_param) in groups.items():
+            if not included:
+                continue
+            events = self._with_payload(events, fields).order_by('start_time', 'id')
+            if page_size is not None:
+                events, next_cursors[key] = self._keyset_page(
+                    events, request.query_params.get(cursor_param), page_size, salt=f'events.list.{key}'
+                )
+            data[key] = self.get_serializer(events, many=True, fields=fields).data
 
-        serializer_user = self.get_serializer(events_user, many=True)
-        serializer_invited = self.get_serializer(events_invited, many=True)
-        return Response({
-            "events_user": serializer_user.data,
-            "events_invited": serializer_invited.data,
-        })
+        if page_size is not None:
+            data['next'] = next_cursors
+        return Response(data)
 
     def create(self, request, *args, **kwargs):
         # Create address first if address data is provided
@@ -129,9 +250,7 @@ class EventViewSet(viewsets.ModelViewSet):
         created_address = None
 
         if address_data:
-            address_serializer = AddressSerializer(data=address_data)
-            address_serializer.is_valid(raise_exception=True)
-            created_address = address_serializer.save()
+            created_address = self._address_for(address_data)
 
         # Extract generate_invitation_link before creating the event
         generate_invitation_link = request.data.get("generate_invitation_link", False)
@@ -195,6 +314,7 @@ class EventViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         event = self.get_object()
         self.check_object_permissions(request, event)
+        previous_address_id = event.address_id
 
         address_data = request.data.get("address")
         # Extract generate_invitation_link before creating event_data
@@ -239,31 +359,15 @@ class EventViewSet(viewsets.ModelViewSet):
             event.address = None
 
         if address_data:
-            # If address data is provided, create or update the address
-            addr_id = address_data.get("id")
-            if addr_id:
-                # Update existing address
-                try:
-                    address = Address.objects.get(id=addr_id)
-                    address_serializer = AddressSerializer(address, data=address_data, partial=True)
-                    address_serializer.is_valid(raise_exception=True)
-                    address_serializer.save()
-                    # Update event to use the updated address
-                    event.address = address
-                except Address.DoesNotExist:
-                    return Response({"detail": f"Address with id {addr_id} not found."}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                # Create new address
-                address_serializer = AddressSerializer(data=address_data)
-                address_serializer.is_valid(raise_exception=True)
-                address = address_serializer.save()
-                # Update event to use the new address
-                event.address = address
+            # Addresses are shared: point the event to the canonical address of the new data
+            event.address = self._address_for(address_data)
 
         # Update the event (excluding address data since we handle it manually)
         serializer = self.get_serializer(event, data=event_data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if previous_address_id != event.address_id:
+            self._release_address(previous_address_id)
 
         # Handle invitation link toggle (after event is updated)
         if generate_invitation_link is not None:
@@ -320,6 +424,7 @@ class EventViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         event = self.get_object()
         self.check_object_permissions(request, event)
+        previous_address_id = event.address_id
 
         address_data = request.data.get("address", None)
         # Extract generate_invitation_link before creating event_data
@@ -364,30 +469,15 @@ class EventViewSet(viewsets.ModelViewSet):
             event.address = None
 
         if address_data and isinstance(address_data, dict):
-            addr_id = address_data.get("id")
-            if addr_id:
-                # Update existing address
-                try:
-                    address = Address.objects.get(id=addr_id)
-                    address_serializer = AddressSerializer(address, data=address_data, partial=True)
-                    address_serializer.is_valid(raise_exception=True)
-                    address_serializer.save()
-                    # Update event to use the updated address
-                    event.address = address
-                except Address.DoesNotExist:
-                    return Response({"detail": f"Address with id {addr_id} not found."}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                # Create new address for partial update
-                address_serializer = AddressSerializer(data=address_data)
-                address_serializer.is_valid(raise_exception=True)
-                address = address_serializer.save()
-                # Update event to use the new address
-                event.address = address
+            # Addresses are shared: point the event to the canonical address of the new data
+            event.address = self._address_for(address_data)
 
         # Update the event (excluding address data since we handle it manually)
         serializer = self.get_serializer(event, data=event_data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if previous_address_id != event.address_id:
+            self._release_address(previous_address_id)
 
         # Handle invitation link toggle (after event is updated)
         if generate_invitation_link is not None:
@@ -445,93 +535,324 @@ class EventViewSet(viewsets.ModelViewSet):
         self.check_object_permissions(request, self.get_object())
         return super().destroy(request, *args, **kwargs)
 
-    @action(detail=False, methods=['post'])
+    def _address_for(self, address_data):
+        """
+        Canonical Address for the address payload of a create or update.
+        With an "id", the fields sent are applied over that address; the row
+        itself is left untouched since other events may share it.
+        """
+        addr_id = address_data.get("id")
+        if addr_id:
+            try:
+                address = Address.objects.get(id=addr_id)
+            except (Address.DoesNotExist, ValueError):
+                raise ValidationError({"detail": f"Address with id {addr_id} not found."}) from None
+            address_serializer = AddressSerializer(address, data=address_data, partial=True)
+            address_serializer.is_valid(raise_exception=True)
+            fields = {name: getattr(address, name) for name in AddressSerializer.Meta.fields if name != 'id'}
+            fields.update(address_serializer.validated_data)
+        else:
+            address_serializer = AddressSerializer(data=address_data)
+            address_serializer.is_valid(raise_exception=True)
+            fields = address_serializer.validated_data
+        return Address.objects.canonical(**fields)[0]
+
+    def _release_address(self, address_id):
+        """Delete the address an event stopped using, unless it is still in use."""
+        address = Address.objects.filter(id=address_id).first() if address_id else None
+        if address is not None:
+            address.delete_if_unused()
+
+    def _parse_viewport(self, data):
+        """
+        Read the optional map viewport from request data.
+        Returns (bbox, precision): bbox is None when the client sent no bbox,
+        precision is the geohash precision matching the optional zoom level.
+        """
+        bbox = data.get("bbox")
+        if not bbox:
+            return None, None
+        try:
+            viewport = geo.parse_bbox(bbox)
+        except (TypeError, ValueError) as e:
+            raise ValidationError({"bbox": str(e)}) from None
+
+        zoom = data.get("zoom")
+        if zoom in (None, ""):
+            return viewport, None
+        try:
+            return viewport, geo.precision_for_zoom(zoom)
+        except (TypeError, ValueError):
+            raise ValidationError({"zoom": f"zoom must be an integer between 0 and {geo.MAX_ZOOM}."}) from None
+
+    def _cluster_events(self, user, tags, tiles, precision):
+        """
+        Aggregate the user's visible events inside the given tiles into geohash cells
+        of ``precision`` characters. Returns {tile: [cluster, ...]}.
+        """
+        sample_size = getattr(settings, 'MARKER_CLUSTER_SAMPLE_SIZE', 5)
+        events = Event.objects.visible_to(user)
+        if tags:
+            events = events.tagged_for(user, tags)
+        events = events.in_cells([(tile, geo.next_prefix(tile)) for tile in tiles]).annotate(
+            cell=Substr('address__geohash', 1, precision)
+        )
+
+        cells = events.values('cell').annotate(
+            count=Count('id'),
+            lat=Avg('address__latitude'),
+            lng=Avg('address__longitude'),
+        ).order_by('cell')
+
+        # Tags come only from the circles the user belongs to, as for single markers
+        cell_tags = {}
+        tag_rows = events.filter(
+            circles__members=user, circles__categories__isnull=False
+        ).values_list('cell', 'circles__categories__name').distinct()
+        for cell, name in tag_rows:
+            cell_tags.setdefault(cell, set()).add(name)
+
+        cell_samples = {}
+        sample_rows = events.annotate(
+            rank=Window(RowNumber(), partition_by=F('cell'), order_by=[F('start_time').asc(), F('id').asc()])
+        ).filter(rank__lte=sample_size).values_list('cell', 'id')
+        for cell, event_id in sample_rows:
+            cell_samples.setdefault(cell, []).append(event_id)
+
+        tile_length = len(tiles[0])
+        clusters = {tile: [] for tile in tiles}
+        for row in cells:
+            clusters[row['cell'][:tile_length]].append({
+                "cell": row['cell'],
+                "count": row['count'],
+                "lat": row['lat'],
+                "lng": row['lng'],
+                "tags": sorted(cell_tags.get(row['cell'], ())),
+                "sample_ids": cell_samples.get(row['cell'], []),
+            })
+        return clusters
+
+    def _marker_clusters(self, user, tags, viewport, zoom):
+        """
+        Server-side clustering for the markers endpoint.
+        The viewport is split into geohash tiles matching the zoom level; each tile
+        is clustered one geohash level deeper and cached per (user, zoom, tile, tags),
+        keyed by the user's cache versions so tiles are dropped when visibility changes
+        (not cached at all without a shared cache, see response_cache.enabled).
+        """
+        tiles = geo.covering_cells(*viewport, precision=geo.precision_for_zoom(zoom))
+        precision = min(len(tiles[0]) + 1, geo.GEOHASH_PRECISION)
+        if not response_cache.enabled():
+            computed = self._cluster_events(user, tags, tiles, precision)
+            clusters = [cluster for tile in tiles for cluster in computed[tile]]
+            return Response({"clusters": clusters, "zoom": zoom}, status=status.HTTP_200_OK)
+        tags_key = ",".join(sorted(str(tag) for tag in tags))
+        versions = ":".join(current_versions(user.id))
+        keys = {tile: f"markers:clusters:{user.id}:{versions}:{zoom}:{tile}:{tags_key}" for tile in tiles}
+
+        cached = cache.get_many(keys.values())
+        clusters_by_tile = {tile: cached[key] for tile, key in keys.items() if key in cached}
+        missing = [tile for tile in tiles if tile not in clusters_by_tile]
+        if missing:
+            computed = self._cluster_events(user, tags, missing, precision)
+            cache.set_many(
+                {keys[tile]: computed[tile] for tile in missing},
+                getattr(settings, 'MARKER_CLUSTER_CACHE_TIMEOUT', 60),
+            )
+            clusters_by_tile.update(computed)
+
+        clusters = [cluster for tile in tiles for cluster in clusters_by_tile[tile]]
+        return Response({"clusters": clusters, "zoom": zoom}, status=status.HTTP_200_OK)
+
+    def _marker_rows(self, events):
+        """
+        Flatten visible events into marker dicts.
+        Tags of the user's circles are copied on the EventVisibility row that
+        visible_to() already joined, so markers come out of a single query.
+        """
+        return list(
+            events.annotate(
+                lat=F('address__latitude'),
+                lng=F('address__longitude'),
+                address_line=F('address__address_line'),
+                start_date=F('start_time'),
+                end_date=F('end_time'),
+                tags=F('visibilities__tags'),
+            ).values(
+                'id', 'title', 'description', 'lat', 'lng',
+                'address_line', 'start_date', 'end_date', 'tags'
+            )
+        )
+
+    @staticmethod
+    def _flag(value):
+        """Boolean parameter: JSON true, or "1" / "true" / "yes" in a form or query string."""
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ("1", "true", "yes")
+
+    def _markers_params(self, request):
+        """Markers parameters from the POST body, or from the query string of a GET."""
+        if request.method == 'POST':
+            params = request.data.copy()
+            params["cluster"] = self._flag(params.get("cluster", False))
+            return params
+        params = request.query_params
+        tags = [tag for value in params.getlist("tags") for tag in value.split(",") if tag]
+        return {
+            "tags": tags,
+            "bbox": params.get("bbox"),
+            "zoom": params.get("zoom"),
+            "cluster": self._flag(params.get("cluster", "")),
+        }
+
+    @action(detail=False, methods=['get', 'post'])
+    @conditional(_visible_state)
+    @cached_response('markers')
     def markers(self, request):
         """
         Return private markers for the authenticated user, optionally filtered by tags.
-        Optimized: Uses PostgreSQL ArrayAgg in production, Prefetch for SQLite locally.
+        When a bbox ("west,south,east,north" or {south, west, north, east}) is sent,
+        only events located inside it are returned, using the Address geohash index.
+        With "cluster": true (bbox and zoom required) markers are grouped into grid
+        clusters on the server, unless zoom reaches MARKER_CLUSTER_MAX_ZOOM.
+        Visibility and tags are read from the EventVisibility table.
+        GET takes the same parameters in the query string (?tags=1,2&bbox=...&zoom=12&cluster=1)
+        and supports If-None-Match.
         """
         user = request.user
-        tags_param = request.data.get("tags", [])
-        user_circles = Circle.objects.filter(members=user)
+        params = self._markers_params(request)
+        tags_param = params.get("tags", [])
+        viewport, precision = self._parse_viewport(params)
+
+        if params.get("cluster"):
+            zoom = params.get("zoom")
+            if not viewport or zoom in (None, ""):
+                raise ValidationError({"detail": "Clustering requires bbox and zoom."})
+            if int(zoom) < getattr(settings, 'MARKER_CLUSTER_MAX_ZOOM', 16):
+                return self._marker_clusters(user, tags_param, viewport, int(zoom))
+
+        events = Event.objects.visible_to(user)
+        if viewport:
+            events = events.in_bbox(*viewport, precision=precision)
+
+        # If tags are provided, keep events whose circles (among the user's) carry one of them,
+        # plus the user's own events that have no circle
+        if tags_param and len(tags_param) > 0:
+            events = events.tagged_for(user, tags_param)
 
-        events = Event.objects.filter(Q(creator=user) | Q(circles__in=user_circles)).distinct()
+        markers = self._marker_rows(events)
+        return Response({"private_markers": markers}, status=status.HTTP_200_OK)
 
-        # If tags are provided, filter by circle categories
-        if tags_param and len(tags_param) > 0:
-            # Get events that have circles with the specified tags
-            # This ensures we only match circles the user is actually in
-            events_with_circles = events.filter(circles__in=user_circles.filter(categories__id__in=tags_param)).distinct()
-            # Get solo events (events created by user that have no circles)
-            events_solo = Event.objects.filter(
-                Q(creator=user) & Q(circles__isnull=True)
-            ).distinct()
-
-            # Union both sets of events
-            events = events_with_circles.union(events_solo)
-
-            # Since union() doesn't support select_related/prefetch_related,
-            # we need to get the IDs and re-query with optimizations
-            event_ids = list(events.values_list('id', flat=True))
-            events = Event.objects.filter(id__in=event_ids)
-
-        # Check database backend from environment variable
-        DEFAULT_DB = os.getenv('DB_DEFAULT', 'default')
-        
-        if DEFAULT_DB == 'postgres':
-            # PostgreSQL: Use ArrayAgg with field aliases - returns exact format needed
-            markers = list(
-                events.select_related("address").annotate(
-                    lat=F('address__latitude'),
-                    lng=F('address__longitude'),
-                    address_line=F('address__address_line'),
-                    start_date=F('start_time'),
-                    end_date=F('end_time'),
-                    tags=ArrayAgg(
-                        'circles__categories__name',
-                        distinct=True,
-                        filter=Q(
-                            circles__categories__name__isnull=False,
-                            circles__in=user_circles
-                        ),
-                        default=[]
-                    )
-                ).values(
-                    'id', 'title', 'description', 'lat', 'lng', 
-                    'address_line', 'start_date', 'end_date', 'tags'
-                )
-            )
+    def _discovery_params(self, request):
+        params = request.query_params
+        viewport, precision = self._parse_viewport(params)
+        start, end = timezone.now(), None
+        for name in ('start', 'end'):
+            if params.get(name):
+                value = parse_datetime(params[name])
+                if value is None:
+                    raise ValidationError({name: "Must be an ISO 8601 datetime."})
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+                if name == 'start':
+                    start = value
+                else:
+                    end = value
+        try:
+            tag_ids = [int(tag) for value in params.getlist("tags") for tag in value.split(",") if tag]
+        except ValueError:
+            raise ValidationError({"tags": "Must be tag ids."}) from None
+        try:
+            page_size = int(params.get('page_size', getattr(settings, 'PUBLIC_EVENTS_PAGE_SIZE', 50)))
+        except ValueError:
+            raise ValidationError({"page_size": "Must be an integer."}) from None
+        if page_size < 1:
+            raise ValidationError({"page_size": "Must be at least 1."})
+        page_size = min(page_size, getattr(settings, 'PUBLIC_EVENTS_MAX_PAGE_SIZE', 200))
+        return viewport, precision, start, end, tag_ids, page_size
+
+    @action(detail=False, methods=['get'])
+    def public(self, request):
+        """
+        Discover public events, ordered by (start_time, id).
+
+        Query parameters:
+        - bbox ("west,south,east,north") and optional zoom
+        - start, end: ISO datetimes, events starting in [start, end); start defaults to now
+        - tags: comma-separated tag ids of the event circles
+        - page_size, cursor: keyset pagination; "next" is null on the last page
+
+        Served by the partial event_public_start_geo_idx index: the scan walks
+        public events in time order and checks the geohash from the index.
+        """
+        viewport, precision, start, end, tag_ids, page_size = self._discovery_params(request)
+        events = Event.objects.discoverable(start, end, viewport, tag_ids, precision).select_related('address', 'creator')
+        page, next_cursor = self._keyset_page(events, request.query_params.get('cursor'), page_size, 'events.public')
+        results = [
+            {
+                "id": event.id,
+                "title": event.title,
+                "description": event.description,
+                "start_date": event.start_time,
+                "end_date": event.end_time,
+                "lat": event.address.latitude if event.address else None,
+                "lng": event.address.longitude if event.address else None,
+                "address_line": event.address.address_line if event.address else None,
+                "creator": event.creator.username,
+            }
+            for event in page
+        ]
+        return Response({"results": results, "next": next_cursor}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Delta sync for the mobile app.
+        Without a cursor every visible event is returned; with the cursor of a previous
+        call only events added, updated or removed from the user's visible set since then.
+        Response: {"events": [...], "markers": [...], "removed": [ids], "cursor": "...", "full": bool}
+        """
+        user = request.user
+        now = timezone.now()
+        retention = timedelta(days=getattr(settings, 'EVENT_CHANGE_RETENTION_DAYS', 30))
+        # Overlap between syncs so rows committed while the previous sync ran are not missed
+        overlap = timedelta(seconds=getattr(settings, 'EVENT_SYNC_OVERLAP_SECONDS', 5))
+
+        since = None
+        token = request.query_params.get('cursor')
+        if token:
+            try:
+                since = parse_datetime(decode_cursor(token, salt='events.sync')['t'])
+            except (ValueError, KeyError, TypeError):
+                raise ValidationError({"cursor": "Invalid cursor."}) from None
+            # Older than the change log: the client has to start over
+            if since is None or since < now - retention:
+                since = None
+
+        visible = Event.objects.visible_to(user)
+        removed = []
+        if since is None:
+            changed = visible
         else:
-            # SQLite/Other: Use optimized Prefetch
-            events_prefetched = events.select_related("address").prefetch_related(
-                Prefetch(
-                    'circles',
-                    queryset=user_circles.prefetch_related(
-                        Prefetch('categories', queryset=Tag.objects.only('name'))
-                    ).only('id')
-                )
+            since -= overlap
+            logged_ids = set(
+                EventChange.objects.filter(user=user, created_at__gte=since).values_list('event_id', flat=True)
             )
+            changed = visible.filter(
+                Q(updated_at__gte=since) | Q(address__updated_at__gte=since) | Q(id__in=logged_ids)
+            )
+            still_visible = set(visible.filter(id__in=logged_ids).values_list('id', flat=True))
+            removed = sorted(logged_ids - still_visible)
 
-            markers = []
-            for e in events_prefetched:
-                # Collect unique tag names using set for O(1) lookups
-                event_tags = set()
-                for circle in e.circles.all():
-                    event_tags.update(tag.name for tag in circle.categories.all())
-
-                markers.append({
-                    "id": e.id,
-                    "title": e.title,
-                    "lat": e.address.latitude if e.address else None,
-                    "lng": e.address.longitude if e.address else None,
-                    "address_line": e.address.address_line if e.address else None,
-                    "description": e.description,
-                    "start_date": e.start_time,
-                    "end_date": e.end_time,
-                    "tags": sorted(event_tags),
-                })
-
-        return Response({"private_markers": markers}, status=status.HTTP_200_OK)
+        serializer = self.get_serializer(self._with_payload(changed), many=True)
+        return Response({
+            "events": serializer.data,
+            "markers": self._marker_rows(changed),
+            "removed": removed,
+            "cursor": encode_cursor({"t": now.isoformat()}, salt='events.sync'),
+            "full": since is None,
+        }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def generate_invite(self, request, id=None):
@@ -733,6 +1054,10 @@ class CircleViewSet(viewsets.ModelViewSet):
             Q(creator=user) | Q(members=user)
         ).exclude(is_invitation_circle=True).prefetch_related('categories').select_related('creator').distinct()
 
+    @cached_response('circles')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         circle = serializer.save(creator=self.request.user)
         circle.members.add(self.request.user)
@@ -741,55 +1066,94 @@ class CircleViewSet(viewsets.ModelViewSet):
         if request.method in ["PUT", "PATCH", "DELETE"] and obj.creator != request.user:
             self.permission_denied(request, message="Only the creator can modify this circle.")
 
+    def _member_ids_param(self, request):
+        member_ids = request.data.get("member_ids", [])
+        if not isinstance(member_ids, list):
+            raise ValidationError({"detail": "member_ids must be a list"})
+        try:
+            return list(dict.fromkeys(int(uid) for uid in member_ids))
+        except (TypeError, ValueError):
+            raise ValidationError({"detail": "member_ids must be a list of user ids"}) from None
+
+    def _current_member_ids(self, circle, member_ids=None):
+        members = Circle.members.through.objects.filter(circle_id=circle.id)
+        if member_ids is not None:
+            members = members.filter(user_id__in=member_ids)
+        return set(members.values_list('user_id', flat=True))
+
+    def _missing_users(self, member_ids):
+        """Ids of member_ids with no user, checked in one query."""
+        found = set(User.objects.filter(id__in=member_ids).values_list('id', flat=True))
+        return [uid for uid in member_ids if uid not in found]
+
     @action(detail=True, methods=["post"])
     def add_members(self, request, id=None):
         circle = self.get_object()
-        member_ids = request.data.get("member_ids", [])
-        if not isinstance(member_ids, list):
-            return Response({"detail": "member_ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+        member_ids = self._member_ids_param(request)
         if circle.creator != request.user:
             raise PermissionDenied("Only the creator can add members.")
-        added, existing, errors = [], [], []
-        for uid in member_ids:
-            user = get_object_or_404(circle.members.model, id=uid)
-            if circle.members.filter(id=user.id).exists():
-                existing.append(user.id)
-            else:
-                circle.members.add(user)
-                added.append(user.id)
-        return Response({"circle": circle.id, "added": added, "already_present": existing, "errors": errors})
+
+        # Nothing is written when any id is unknown
+        missing = self._missing_users(member_ids)
+        if missing:
+            return Response({"detail": "Unknown users.", "missing": missing}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            present = self._current_member_ids(circle, member_ids)
+            added = [uid for uid in member_ids if uid not in present]
+            if added:
+                # one INSERT on the through table; m2m_changed keeps visibility and caches in sync
+                circle.members.add(*added)
+        existing = [uid for uid in member_ids if uid in present]
+        return Response({"circle": circle.id, "added": added, "already_present": existing, "errors": []})
 
     @action(detail=True, methods=["post"])
     def remove_members(self, request, id=None):
         circle = self.get_object()
-        member_ids = request.data.get("member_ids", [])
-        if not isinstance(member_ids, list):
-            return Response({"detail": "member_ids must be a list"}, status=status.HTTP_400_BAD_REQUEST)
-        
+        member_ids = self._member_ids_param(request)
+
         # Allow creator to remove any members, or allow members to remove themselves
         is_creator = circle.creator == request.user
         if not is_creator:
             # Non-creators can only remove themselves
-            if len(member_ids) != 1 or member_ids[0] != request.user.id:
+            if member_ids != [request.user.id]:
                 raise PermissionDenied("You can only remove yourself from this circle.")
-            # Also verify the user is actually a member
-            if not circle.members.filter(id=request.user.id).exists():
+
+        with transaction.atomic():
+            present = self._current_member_ids(circle, member_ids)
+            if not is_creator and request.user.id not in present:
+                # Also verify the user is actually a member
                 raise PermissionDenied("You are not a member of this circle.")
-        
-        removed, errors = [], []
-        for uid in member_ids:
-            try:
-                user = circle.members.get(id=uid)
-                # Additional check: non-creators can only remove themselves
-                if not is_creator and user.id != request.user.id:
-                    errors.append(f"You cannot remove user {uid} from this circle.")
-                    continue
-                circle.members.remove(user)
-                removed.append(user.id)
-            except circle.members.model.DoesNotExist:
-                errors.append(f"User {uid} not in circle")
+            removed = [uid for uid in member_ids if uid in present]
+            if removed:
+                circle.members.remove(*removed)
+        errors = [f"User {uid} not in circle" for uid in member_ids if uid not in present]
         return Response({"circle": circle.id, "removed": removed, "errors": errors})
 
+    @action(detail=True, methods=["post"])
+    def set_members(self, request, id=None):
+        """Replace the members of the circle by member_ids (creator only)."""
+        circle = self.get_object()
+        member_ids = self._member_ids_param(request)
+        if circle.creator != request.user:
+            raise PermissionDenied("Only the creator can replace members.")
+
+        # Nothing is written when any id is unknown
+        missing = self._missing_users(member_ids)
+        if missing:
+            return Response({"detail": "Unknown users.", "missing": missing}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            present = self._current_member_ids(circle)
+            added = [uid for uid in member_ids if uid not in present]
+            removed = sorted(present - set(member_ids))
+            if removed:
+                circle.members.remove(*removed)
+            if added:
+                circle.members.add(*added)
+        existing = [uid for uid in member_ids if uid in present]
+        return Response({"circle": circle.id, "added": added, "already_present": existing, "removed": removed})
+
 
 class UserAddressViewSet(viewsets.ModelViewSet):
     """
@@ -805,9 +1169,12 @@ class UserAddressViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         address_serializer = AddressSerializer(data=request.data)
         address_serializer.is_valid(raise_exception=True)
-        address = address_serializer.save()
-        ua = UserAddress.objects.create(user=request.user, address=address, label=request.data.get("label", ""))
-        return Response(UserAddressSerializer(ua).data, status=status.HTTP_201_CREATED)
+        address, _ = Address.objects.canonical(**address_serializer.validated_data)
+        # Saving the same place twice returns the existing entry
+        ua, created = UserAddress.objects.get_or_create(
+            user=request.user, address=address, defaults={"label": request.data.get("label", "")}
+        )
+        return Response(UserAddressSerializer(ua).data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     def partial_update(self, request, *args, **kwargs):
         user_address = get_object_or_404(UserAddress, user=request.user, id=kwargs.get("pk"))
@@ -822,8 +1189,8 @@ class UserAddressViewSet(viewsets.ModelViewSet):
         user_address = get_object_or_404(UserAddress, user=request.user, id=kwargs.get("pk"))
         address = user_address.address
         user_address.delete()
-        # also delete address (since it's user-owned entry point)
-        address.delete()
+        # also delete the address, unless events or other users share it
+        address.delete_if_unused()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -831,41 +1198,148 @@ class MultiCircleMembersView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        circle_ids = request.data.get("circle_ids", [])
-        if not circle_ids:
-            return Response({"error": "No circle IDs provided."}, status=status.HTTP_400_BAD_REQUEST)
-
+    def _accessible_circles(self, request, circle_ids):
         # Filter circles to only those the user is a member of or created
         user = request.user
-        circles = Circle.objects.filter(
+        return Circle.objects.filter(
             Q(id__in=circle_ids) & (
-                Q(creator=user) | 
+                Q(creator=user) |
                 Q(members=user) |
                 Q(is_invitation_circle=True)
             )
-        ).distinct()
+        )
+
+    def _member_rows(self, request, circle_ids, params):
+        """
+        Distinct members of the accessible circles among circle_ids, as one query
+        over the membership table however many circles are selected.
+        """
+        circles = self._accessible_circles(request, circle_ids).values('id')
+        memberships = Circle.members.through.objects.filter(circle_id__in=circles).values('user_id')
+        members = User.objects.filter(id__in=memberships).order_by('id')
+        profiles = self._schedule_filter(params)
+        if profiles is not None:
+            members = members.filter(id__in=profiles.values('user_id'))
+        return members
+
+    def _weekdays(self, params, name):
+        value = params.get(name)
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.split(',')
+        try:
+            return [schedule.weekday_index(day.strip() if isinstance(day, str) else day) for day in value]
+        except (TypeError, ValueError):
+            raise ValidationError({name: "Must be weekday names or numbers (0 = Monday)."}) from None
+
+    def _schedule_filter(self, params):
+        """
+        Profiles matching the optional schedule filters, or None without filters:
+        remote_on / free_on (weekdays, comma-separated), and free_from / free_to
+        (HH:MM) for a window to be free on a single free_on day.
+        """
+        remote_on, free_on = self._weekdays(params, 'remote_on'), self._weekdays(params, 'free_on')
+        window = params.get('free_from'), params.get('free_to')
+        if not (remote_on or free_on or any(window)):
+            return None
+
+        profiles = Profile.objects.all()
+        if remote_on:
+            profiles = profiles.remote_on(*remote_on)
+        if any(window):
+            if len(free_on) != 1:
+                raise ValidationError({"free_on": "free_from and free_to need exactly one free_on day."})
+            try:
+                start, end = (schedule.parse_minutes(bound) for bound in window)
+            except (AttributeError, TypeError, ValueError):
+                raise ValidationError({"detail": "free_from and free_to must be HH:MM times."}) from None
+            return profiles.free_during(free_on[0], start, end)
+        return profiles.free_on(*free_on) if free_on else profiles
+
+    def _members_state(self, request):
+        circle_ids = request.query_params.getlist("circle_ids")
+        if not circle_ids:
+            return None
+        # member names are not timestamped: hash the (small) member rows themselves
+        rows = self._member_rows(request, circle_ids, request.query_params)
+        return list(rows.values_list('id', 'username', 'first_name', 'last_name'))
+
+    @conditional(_members_state)
+    def get(self, request):
+        """Same as POST with ?circle_ids=1&circle_ids=2, with ETag support."""
+        return self._members(request, request.query_params.getlist("circle_ids"), request.query_params)
+
+    def post(self, request):
+        """
+        Union of the members of circle_ids.
+
+        Optional body keys:
+        - count_only: return {"count": n} only, e.g. for badges
+        - page_size, cursor: page through the members ordered by id; the response
+          is then {"results": [...], "next": cursor or null}
+        - remote_on, free_on (weekdays, e.g. "tuesday" or "1,3"), free_from and
+          free_to (HH:MM, with one free_on day): only members whose profile
+          matches, e.g. who is remote on Tuesday or free Friday 18:00-20:00
+        """
+        return self._members(request, request.data.get("circle_ids", []), request.data)
 
+    def _page_size(self, params):
+        """Page size when the client asked for pagination, None for the full list."""
+        if 'page_size' not in params and 'cursor' not in params:
+            return None
+        default = getattr(settings, 'CIRCLE_MEMBERS_PAGE_SIZE', 100)
+        try:
+            page_size = int(params.get('page_size') or default)
+        except (TypeError, ValueError):
+            raise ValidationError({"page_size": "Must be an integer."}) from None
+        if page_size < 1:
+            raise ValidationError({"page_size": "Must be at least 1."})
+        return min(page_size, getattr(settings, 'CIRCLE_MEMBERS_MAX_PAGE_SIZE', 500))
+
+    def _not_found(self, request, circle_ids):
         # Only return error if no circles were found at all
-        if not circles.exists():
-            # Check if single or multiple circles for appropriate error message
-            if len(circle_ids) == 1:
-                return Response({"error": "Tu ne fais pas partie de ce cercle"}, status=status.HTTP_404_NOT_FOUND)
-            else:
-                return Response({"error": "Tu ne fais pas partie de ces cercles"}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Fetch members from the accessible circles
-  # local import
-        all_user_ids = set()
-        for circle in circles:
-            member_ids = circle.members.values_list('id', flat=True)
-            all_user_ids.update(member_ids)
-        
-        users = User.objects.filter(id__in=all_user_ids)
-        data = [{"id": u.id, "username": u.username, "first_name": u.first_name, "last_name": u.last_name} for u in users]
-        
-        return Response(data)
+        if self._accessible_circles(request, circle_ids).exists():
+            return None
+        # Check if single or multiple circles for appropriate error message
+        if len(circle_ids) == 1:
+            return Response({"error": "Tu ne fais pas partie de ce cercle"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"error": "Tu ne fais pas partie de ces cercles"}, status=status.HTTP_404_NOT_FOUND)
+
+    def _members(self, request, circle_ids, params):
+        if not circle_ids:
+            return Response({"error": "No circle IDs provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        members = self._member_rows(request, circle_ids, params)
 
+        if str(params.get('count_only', '')).lower() in ('1', 'true'):
+            count = members.count()
+            not_found = not count and self._not_found(request, circle_ids)
+            return not_found or Response({"count": count})
+
+        page_size = self._page_size(params)
+        cursor = params.get('cursor')
+        if cursor:
+            try:
+                members = members.filter(id__gt=int(decode_cursor(cursor, salt='circles.members')['id']))
+            except (ValueError, KeyError, TypeError):
+                raise ValidationError({"cursor": "Invalid cursor."}) from None
+
+        rows = members.values('id', 'username', 'first_name', 'last_name')
+        data = list(rows if page_size is None else rows[:page_size + 1])
+        # An empty result is either an empty circle or circles the user cannot see
+        if not data and not cursor:
+            not_found = self._not_found(request, circle_ids)
+            if not_found:
+                return not_found
+
+        if page_size is None:
+            return Response(data)
+        next_cursor = None
+        if len(data) > page_size:
+            data = data[:page_size]
+            next_cursor = encode_cursor({"id": data[-1]['id']}, salt='circles.members')
+        return Response({"results": data, "next": next_cursor})
 
 
 # from django_ratelimit.decorators import ratelimit
@@ -925,6 +1399,12 @@ class TagListView(generics.ListAPIView):
     serializer_class = TagSerializer
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserCostThrottle] if not settings.DEBUG else []
+    throttle_cost = 1
+
+    @cached_response('tags')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
 class MyLocationsView(APIView):
     """
@@ -934,6 +1414,13 @@ class MyLocationsView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def _locations_state(self, request):
+        user = request.user
+        # labels are not timestamped, so the (few) rows are part of the state
+        rows = UserAddress.objects.filter(user=user).order_by('id').values_list('id', 'label', 'address__updated_at')
+        return [user.username, user.first_name, user.last_name, list(rows)]
+
+    @conditional(_locations_state)
     def get(self, request):
         user = request.user
         user_addresses = UserAddress.objects.filter(user=user).select_related("address")
@@ -957,22 +1444,100 @@ class MyLocationsView(APIView):
         return Response(results, status=status.HTTP_200_OK)
 
 
+class NearbyEventsView(APIView):
+    """
+    For each saved location (UserAddress) of the user, the visible events within
+    ?radius_km= (default NEARBY_DEFAULT_RADIUS_KM) sorted by distance, at most
+    ?limit= per location. Distances are computed by the database.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def _param(self, request, name, cast, default, maximum):
+        try:
+            value = cast(request.query_params.get(name, default))
+        except ValueError:
+            raise ValidationError({name: "Must be a number."}) from None
+        if not 0 < value <= maximum:
+            raise ValidationError({name: f"Must be between 0 and {maximum}."})
+        return value
+
+    def get(self, request):
+        user = request.user
+        radius_km = self._param(
+            request, 'radius_km', float,
+            getattr(settings, 'NEARBY_DEFAULT_RADIUS_KM', 5), getattr(settings, 'NEARBY_MAX_RADIUS_KM', 100),
+        )
+        limit = self._param(
+            request, 'limit', int,
+            getattr(settings, 'NEARBY_EVENTS_PER_LOCATION', 20), getattr(settings, 'NEARBY_MAX_EVENTS_PER_LOCATION', 100),
+        )
+
+        visible = Event.objects.visible_to(user)
+        results = []
+        for ua in UserAddress.objects.filter(user=user).select_related("address").order_by('id'):
+            addr = ua.address
+            events = (
+                visible.near(addr.latitude, addr.longitude, radius_km)
+                .annotate(
+                    lat=F('address__latitude'),
+                    lng=F('address__longitude'),
+                    address_line=F('address__address_line'),
+                    start_date=F('start_time'),
+                    end_date=F('end_time'),
+                )
+                .order_by('distance_km', 'start_time', 'id')
+                .values('id', 'title', 'lat', 'lng', 'address_line', 'start_date', 'end_date', 'distance_km')[:limit]
+            )
+            results.append({
+                "label": ua.label or "",
+                "address_line": addr.address_line,
+                "lat": addr.latitude,
+                "lng": addr.longitude,
+                "events": list(events),
+            })
+
+        return Response(results, status=status.HTTP_200_OK)
+
+
 class FriendsListView(APIView):
     """
-    Return a list of all users that can be added to circles.
-    This provides a searchable list of users for the frontend.
+    Deprecated: list the users that can be added to circles, ordered by username.
+    Clients should search with users/search/ instead. Without parameters the
+    legacy plain list is cut at USERS_LIST_MAX_PAGE_SIZE users; with page_size
+    or a cursor the answer is {"results": [...], "next": cursor or null}.
     """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserCostThrottle] if not settings.DEBUG else []
+    throttle_cost = 2
+
+    def _page_size(self, params):
+        max_page_size = getattr(settings, 'USERS_LIST_MAX_PAGE_SIZE', 200)
+        if 'page_size' not in params and 'cursor' not in params:
+            return None, max_page_size
+        default = getattr(settings, 'USERS_LIST_PAGE_SIZE', 50)
+        try:
+            page_size = int(params.get('page_size') or default)
+        except ValueError:
+            raise ValidationError({"page_size": "Must be an integer."}) from None
+        if page_size < 1:
+            raise ValidationError({"page_size": "Must be at least 1."})
+        return min(page_size, max_page_size), min(page_size, max_page_size)
 
     def get(self, request):
+        params = request.query_params
+        page_size, limit = self._page_size(params)
 
-        # Get all users except the current user
-        users = User.objects.exclude(id=request.user.id).values(
-            'id', 'username', 'first_name', 'last_name'
-        ).order_by('username')
+        # Get all users except the current user, one page at a time (usernames are unique)
+        users = User.objects.exclude(id=request.user.id).order_by('username')
+        cursor = params.get('cursor')
+        if cursor:
+            try:
+                users = users.filter(username__gt=decode_cursor(cursor, salt='users.list')['u'])
+            except (ValueError, KeyError, TypeError):
+                raise ValidationError({"cursor": "Invalid cursor."}) from None
 
-        # Convert to list of dictionaries
         friends_data = [
             {
                 "id": user['id'],
@@ -980,10 +1545,61 @@ class FriendsListView(APIView):
                 "first_name": user['first_name'] or '',
                 "last_name": user['last_name'] or '',
             }
-            for user in users
+            for user in users.values('id', 'username', 'first_name', 'last_name')[:limit + 1]
         ]
+        next_cursor = None
+        if len(friends_data) > limit:
+            friends_data = friends_data[:limit]
+            next_cursor = encode_cursor({"u": friends_data[-1]['username']}, salt='users.list')
+
+        if page_size is None:
+            response = Response(friends_data, status=status.HTTP_200_OK)
+        else:
+            response = Response({"results": friends_data, "next": next_cursor}, status=status.HTTP_200_OK)
+        response['Deprecation'] = 'true'
+        response['Link'] = '<%s>; rel="successor-version"' % reverse('users-search')
+        return response
+
+
+class UserSearchView(APIView):
+    """
+    Search users by username, first or last name (?q=, optional ?limit=).
+    Users sharing a circle with the requester are listed first.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        max_limit = getattr(settings, 'USER_SEARCH_MAX_LIMIT', 50)
+        try:
+            limit = int(request.query_params.get('limit', getattr(settings, 'USER_SEARCH_LIMIT', 20)))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."}) from None
+        if limit < 1:
+            raise ValidationError({"limit": "Must be at least 1."})
+
+        return Response(search_users(request.user, query, min(limit, max_limit)), status=status.HTTP_200_OK)
+
+
+class FriendsOfFriendsView(APIView):
+    """
+    People two hops away in the friend graph (friends of friends who are not
+    friends yet), ranked by number of mutual friends. Optional ?limit=.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
 
-        return Response(friends_data, status=status.HTTP_200_OK)
+    def get(self, request):
+        max_limit = getattr(settings, 'FRIENDS_OF_FRIENDS_MAX_LIMIT', 100)
+        try:
+            limit = int(request.query_params.get('limit', getattr(settings, 'FRIENDS_OF_FRIENDS_LIMIT', 20)))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."}) from None
+        if limit < 1:
+            raise ValidationError({"limit": "Must be at least 1."})
+
+        return Response(friends_of_friends(request.user, min(limit, max_limit)), status=status.HTTP_200_OK)
 
 
 class ICalDownloadView(APIView):
@@ -993,28 +1609,26 @@ class ICalDownloadView(APIView):
     """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserCostThrottle] if not settings.DEBUG else []
+    throttle_cost = 10
 
-    def get(self, request):
+    def _events(self, request):
+        """User's events (created + invited), filtered by the circles / date range parameters."""
         user = request.user
-
-        # Get user's events (created + invited)
-        user_circles = Circle.objects.filter(members=user)
-        events = Event.objects.filter(
-            Q(creator=user) | Q(circles__in=user_circles)
-        ).distinct().select_related('address')
+        events = Event.objects.visible_to(user)
 
         # Filter by circles if specified
         circle_ids = request.query_params.getlist('circles')
         if circle_ids:
-            events = events.filter(circles__id__in=circle_ids)
+            events = events.filter(
+                id__in=Event.circles.through.objects.filter(circle_id__in=circle_ids).values('event_id')
+            )
 
         # Filter by date range if specified
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
         
         if start_date_str or end_date_str:
-            from django.utils.dateparse import parse_datetime
-            
             start_date = None
             end_date = None
             
@@ -1060,95 +1674,97 @@ class ICalDownloadView(APIView):
                 
                 events = events.filter(date_filter)
 
-        # Create iCalendar object
-        cal = Calendar()
-        cal.add('prodid', '-//ZIGZAG//Events//EN')
-        cal.add('version', '2.0')
-        cal.add('calscale', 'GREGORIAN')
-        cal.add('method', 'PUBLISH')
-        cal.add('x-wr-calname', f'ZIGZAG Events - {user.username}')
-        cal.add('x-wr-timezone', 'Europe/Paris')
-
-        # Add events to calendar - logic depends on event duration
-        for event in events:
-            from datetime import timedelta
-            
-            # Helper function to create a calendar event
-            def create_calendar_event(start_time, end_time, uid, summary):
-                vevent = ICalEvent()
-                vevent.add('summary', summary)
-                vevent.add('dtstart', start_time)
-                vevent.add('dtend', end_time)
-
-                if event.description:
-                    vevent.add('description', event.description)
-
-                if event.address:
-                    location_parts = []
-                    if event.address.address_line:
-                        location_parts.append(event.address.address_line)
-                    if event.address.city:
-                        location_parts.append(event.address.city)
-                    if location_parts:
-                        vevent.add('location', ', '.join(location_parts))
-
-                # Add circles as categories
-                if event.circles.exists():
-                    categories = [circle.name for circle in event.circles.all()]
-                    vevent.add('categories', categories)
-
-                vevent.add('uid', uid)
-                vevent.add('created', event.created_at)
-                vevent.add('last-modified', event.updated_at)
-                
-                return vevent
+        return events
 
-            # Calculate event duration
-            if event.end_time:
-                duration = event.end_time - event.start_time
-                is_less_than_24h = duration.total_seconds() < 86400  # 24 hours in seconds
-            else:
-                is_less_than_24h = False
-
-            if is_less_than_24h and event.end_time:
-                # Event < 24h: Create one event with actual start_time and end_time
-                single_event = create_calendar_event(
-                    event.start_time,
-                    event.end_time,
-                    f'zigzag-{event.id}@zigzag.com',
-                    event.title
-                )
-                cal.add_component(single_event)
-            else:
-                # Event >= 24h: Create two events (start and end)
-                # Create first event (start time)
-                start_end_time = event.start_time + timedelta(hours=2)
-                start_event = create_calendar_event(
-                    event.start_time,
-                    start_end_time,
-                    f'zigzag-{event.id}-start@zigzag.com',
-                    f'{event.title} (Début)'
-                )
-                cal.add_component(start_event)
-
-                # Create second event (end time) - only if end_time exists
-                if event.end_time:
-                    end_end_time = event.end_time + timedelta(hours=2)
-                    end_event = create_calendar_event(
-                        event.end_time,
-                        end_end_time,
-                        f'zigzag-{event.id}-end@zigzag.com',
-                        f'{event.title} (Fin)'
-                    )
-                    cal.add_component(end_event)
+    def _calendar_state(self, request):
+        return visible_state(request.user, self._events(request))
 
-        # Generate response
-        response = HttpResponse(cal.to_ical(), content_type='text/calendar; charset=utf-8')
+    @conditional(_calendar_state)
+    def get(self, request):
+        user = request.user
+        response = StreamingHttpResponse(
+            stream_calendar(self._events(request), f'ZIGZAG Events - {user.username}'),
+            content_type='text/calendar; charset=utf-8',
+        )
         response['Content-Disposition'] = f'attachment; filename="zigzag-events-{user.username}.ics"'
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
+        # personal data: never stored by shared caches, revalidated with the ETag set by @conditional
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
+
+class CalendarSubscriptionView(APIView):
+    """
+    Manage the user's webcal subscription URL.
+    GET returns it (creating it on first use), POST rotates the secret token so
+    previously shared URLs stop working, DELETE revokes the subscription.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def _payload(self, request, feed):
+        url = request.build_absolute_uri(reverse('ical-feed', args=[feed.token]))
+        return {
+            "url": url,
+            "webcal_url": "webcal://" + url.split("://", 1)[1],
+            "created_at": feed.created_at,
+        }
+
+    def get(self, request):
+        feed, _ = CalendarFeed.objects.get_or_create(
+            user=request.user, defaults={"token": generate_invitation_token()}
+        )
+        return Response(self._payload(request, feed))
+
+    def post(self, request):
+        feed, created = CalendarFeed.objects.get_or_create(
+            user=request.user, defaults={"token": generate_invitation_token()}
+        )
+        if not created:
+            feed.token = generate_invitation_token()
+            feed.save(update_fields=["token"])
+        return Response(self._payload(request, feed), status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        CalendarFeed.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CalendarFeedView(APIView):
+    """
+    Public webcal feed polled by calendar apps; the secret token in the URL is the
+    only credential. The rendered feed is cached under its ETag, and rebuilding it
+    only renders the events that changed (see events.ical.render_calendar).
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, token):
+        feed = get_object_or_404(CalendarFeed.objects.select_related('user'), token=token)
+        user = feed.user
+        events = Event.objects.visible_to(user)
+
+        # Event and address timestamps plus the change log, which records events
+        # leaving the user's calendar and circle renames
+        count, updated, address_updated = event_state(events)
+        last_change = EventChange.objects.filter(user=user).aggregate(last=Max('created_at'))['last']
+        last_modified = max(
+            (moment for moment in (updated, address_updated, last_change) if moment), default=feed.created_at
+        )
+        etag = make_etag('ical-feed', feed.token, user.username, count, updated, address_updated, last_change)
+        last_modified = int(last_modified.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cache_key = f'ical:feed:{user.id}:{etag}'
+            body = cache.get(cache_key)
+            if body is None:
+                body = render_calendar(events, f'ZIGZAG Events - {user.username}')
+                cache.set(cache_key, body, getattr(settings, 'ICAL_FEED_CACHE_TIMEOUT', 86400))
+            response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="zigzag.ics"'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
         return response
 
 
@@ -1158,9 +1774,42 @@ class CircleGreyEventsView(APIView):
     """
     Return grey events (only temporal information) for selected circles.
     Privacy protection: only shows when total unique members >= threshold.
+
+    With mode=histogram, start and end (ISO datetimes) and optional bucket
+    ("hour" or "day") and tz, return instead the number of grey events
+    overlapping each bucket of the window, so the response size depends on
+    the window length only.
     """
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserCostThrottle] if not settings.DEBUG else []
+    throttle_cost = 5
+
+    def _histogram_params(self, request):
+        params = request.query_params
+        start = parse_datetime(params.get('start') or '')
+        end = parse_datetime(params.get('end') or '')
+        if start is None or end is None:
+            raise ValidationError({"detail": "start and end (ISO datetimes) are required for the histogram."})
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if end <= start:
+            raise ValidationError({"end": "end must be after start."})
+
+        unit = params.get('bucket', 'hour')
+        if unit not in histogram.UNITS:
+            raise ValidationError({"bucket": f"Must be one of: {', '.join(histogram.UNITS)}."})
+        max_buckets = getattr(settings, 'GREY_EVENTS_MAX_BUCKETS', 2000)
+        if histogram.bucket_count(start, end, unit) > max_buckets:
+            raise ValidationError({"detail": f"Window too long: at most {max_buckets} buckets."})
+
+        try:
+            tz = ZoneInfo(params.get('tz', 'UTC'))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValidationError({"tz": "Unknown time zone."}) from None
+        return start, end, unit, tz
 
     def get(self, request):
         circle_ids = request.query_params.getlist('circle_ids')
@@ -1168,20 +1817,25 @@ class CircleGreyEventsView(APIView):
             return Response({"error": "No circle IDs provided."}, status=status.HTTP_400_BAD_REQUEST)
 
         user = request.user
+        histogram_mode = request.query_params.get('mode') == 'histogram'
+        if histogram_mode:
+            window = self._histogram_params(request)
 
         # Validate user is member of all requested circles
-        circles = Circle.objects.filter(
-            Q(id__in=circle_ids) & (Q(creator=user) | Q(members=user))
-        ).distinct()
+        circle_pks = list(
+            Circle.objects.filter(
+                Q(id__in=circle_ids) & (Q(creator=user) | Q(members=user))
+            ).values_list('id', flat=True).distinct()
+        )
 
-        found_ids = set(str(c.id) for c in circles)
+        found_ids = set(str(pk) for pk in circle_pks)
         missing_ids = set(str(cid) for cid in circle_ids) - found_ids
         if missing_ids:
             return Response({"error": f"Circles not found or access denied: {', '.join(sorted(missing_ids))}"}, status=status.HTTP_404_NOT_FOUND)
 
         # Count total unique members across selected circles
-        unique_member_ids = circles.values_list("members__id", flat=True).distinct()
-        total_members = len(unique_member_ids)
+        members = Circle.members.through.objects.filter(circle_id__in=circle_pks).values('user_id')
+        total_members = members.distinct().count()
 
         min_members = getattr(settings, 'CIRCLE_CALENDAR_MIN_MEMBERS', 15)
         if total_members < min_members:
@@ -1189,31 +1843,108 @@ class CircleGreyEventsView(APIView):
                 "error": f"Not enough members to display events. Need at least {min_members} members."
             }, status=status.HTTP_403_FORBIDDEN)
 
-        # Get member IDs from selected circles
-        member_ids = list(unique_member_ids)
-        
-        # Get events from selected circles (only temporal data)
-        events_from_circles = Event.objects.filter(circles__in=circles).distinct()
-        
-        # Get solo events where creator is a member of selected circles and has no circles
-        solo_events = Event.objects.filter(
-            creator__id__in=member_ids,
-            circles__isnull=True
-        ).distinct()
-        
-        # Combine both sets of events and filter by duration < 24 hours at database level
-        from datetime import timedelta
-        events = (events_from_circles | solo_events).filter(
-            Q(end_time__lt=F('start_time') + timedelta(hours=24))
-        ).distinct()
+        # Events of the selected circles, plus solo events (no circle) created by their members,
+        # lasting less than 24 hours; subqueries keep one row per event without DISTINCT
+        event_circles = Event.circles.through.objects
+        events = Event.objects.filter(
+            Q(id__in=event_circles.filter(circle_id__in=circle_pks).values('event_id')) |
+            (Q(creator_id__in=members) & ~Exists(event_circles.filter(event_id=OuterRef('pk'))))
+        ).filter(end_time__lt=F('start_time') + timedelta(hours=24))
+
+        if histogram_mode:
+            start, end, unit, tz = window
+            starts, counts = histogram.busy_histogram(events, start, end, unit, tz)
+            return Response({
+                "histogram": {
+                    "bucket": unit,
+                    "starts": [moment.isoformat() for moment in starts],
+                    "counts": counts,
+                },
+                "total_members": total_members,
+                "selected_circles": len(circle_pks),
+            }, status=status.HTTP_200_OK)
 
         # Serialize only temporal information
-        serializer = GreyEventSerializer(events, many=True)
+        serializer = GreyEventSerializer(events.only('start_time', 'end_time'), many=True)
 
         return Response({
             "grey_events": serializer.data,
             "total_members": total_members,
-            "selected_circles": len(circles)
+            "selected_circles": len(circle_pks)
+        }, status=status.HTTP_200_OK)
+
+
+class CircleAvailabilityView(APIView):
+    """
+    Common free slots of the members of selected circles over a date range,
+    combining their timetables, vacations and events (see events.availability).
+
+    Query parameters: circle_ids (repeated), start and end (YYYY-MM-DD, end
+    included), optional tz (defaults to the requester's profile time zone),
+    min_free (slots where at least that many members are free instead of all
+    of them) and min_duration (minutes).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        circle_ids = params.getlist('circle_ids')
+        if not circle_ids:
+            return Response({"error": "No circle IDs provided."}, status=status.HTTP_400_BAD_REQUEST)
+
+        start, end = parse_date(params.get('start') or ''), parse_date(params.get('end') or '')
+        if start is None or end is None:
+            raise ValidationError({"detail": "start and end (YYYY-MM-DD) are required."})
+        days = (end - start).days + 1
+        max_days = getattr(settings, 'AVAILABILITY_MAX_DAYS', 62)
+        if not 1 <= days <= max_days:
+            raise ValidationError({"detail": f"The range must span 1 to {max_days} days."})
+
+        default_tz = getattr(getattr(request.user, 'profile', None), 'timezone', None) or 'UTC'
+        try:
+            tz = ZoneInfo(params.get('tz') or default_tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValidationError({"tz": "Unknown time zone."}) from None
+        try:
+            min_free = int(params['min_free']) if params.get('min_free') else None
+            min_duration = int(params.get('min_duration') or 0)
+        except ValueError:
+            raise ValidationError({"detail": "min_free and min_duration must be integers."}) from None
+
+        user = request.user
+        circle_pks = set(
+            Circle.objects.filter(
+                Q(id__in=circle_ids) & (Q(creator=user) | Q(members=user))
+            ).values_list('id', flat=True)
+        )
+        missing_ids = set(str(cid) for cid in circle_ids) - set(str(pk) for pk in circle_pks)
+        if missing_ids:
+            return Response({"error": f"Circles not found or access denied: {', '.join(sorted(missing_ids))}"}, status=status.HTTP_404_NOT_FOUND)
+
+        member_ids = set(
+            Circle.members.through.objects.filter(circle_id__in=circle_pks).values_list('user_id', flat=True)
+        )
+        # Same privacy floor as the grey events: busy slots of a small group point at individuals
+        min_members = getattr(settings, 'CIRCLE_CALENDAR_MIN_MEMBERS', 15)
+        if len(member_ids) < min_members:
+            return Response({
+                "error": f"Not enough members to display availability. Need at least {min_members} members."
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        grid = availability.SlotGrid(datetime.combine(start, datetime_time.min, tzinfo=tz), days)
+        free = availability.group_availability(grid, member_ids, min_free)
+        slot_minutes = int(grid.slot.total_seconds() // 60)
+        min_slots = max(1, -(-min_duration // slot_minutes))
+
+        return Response({
+            "slot_minutes": slot_minutes,
+            "members": len(member_ids),
+            "min_free": min_free,
+            "free_slots": [
+                {"start": slot_start.astimezone(tz).isoformat(), "end": slot_end.astimezone(tz).isoformat()}
+                for slot_start, slot_end in availability.intervals(grid, free, min_slots)
+            ],
         }, status=status.HTTP_200_OK)
 
 
@@ -1261,7 +1992,7 @@ class ThrottledTokenObtainPairView(APIView):
 class PasswordResetRequestView(APIView):
     """
     Handle password reset requests.
-    Sends email with reset link containing uid and token.
+    Queues an email with reset link containing uid and token (see events.outbox).
     """
     permission_classes = [AllowAny]
     throttle_classes = [PasswordResetThrottle] if not settings.DEBUG else []
@@ -1339,28 +2070,23 @@ Si vous n'avez pas demandé cette réinitialisation, vous pouvez ignorer cet ema
     </p>
 </body>
 </html>"""
-            # Configure message with proper headers to improve deliverability
-            message = AnymailMessage(
+            # Queued in the outbox, sent by `manage.py send_queued_mail`
+            # Headers improve deliverability and avoid spam
+            outbox.enqueue(
                 subject="Réinitialisation de votre mot de passe",
                 body=plain_text,
+                html_body=html_content,
                 to=[user.email],
                 from_email=settings.DEFAULT_FROM_EMAIL,
+                headers={
+                    'Reply-To': settings.DEFAULT_FROM_EMAIL,
+                    'X-Mailer': 'Password Reset Service',
+                },
             )
             
-            # Add headers to improve deliverability and avoid spam
-            message.extra_headers = {
-                'Reply-To': settings.DEFAULT_FROM_EMAIL,
-                'X-Mailer': 'Password Reset Service',
-            }
-            
-            # Attach HTML alternative
-            message.attach_alternative(html_content, "text/html")
-            
-            message.send()
-            
         except Exception as e:
             error_message = str(e)
-            print(f"Error sending password reset email: {error_message}")
+            print(f"Error queueing password reset email: {error_message}")
             
             # In sandbox, return success even on error (security best practice)
             # But log the actual error for debugging
@@ -1430,7 +2156,7 @@ class PasswordResetConfirmView(APIView):
 class ContactView(APIView):
     """
     Handle contact form submissions.
-    Sends email via Mailgun to HOST_EMAIL with contact form data.
+    Queues an email to HOST_EMAIL with contact form data (see events.outbox).
     """
     permission_classes = [AllowAny]
     throttle_classes = [ContactThrottle] if not settings.DEBUG else []
@@ -1503,29 +2229,23 @@ Vous pouvez répondre directement à cet email pour contacter {sender_name}."""
 </body>
 </html>"""
             
-            # Configure message with proper headers
-            message = AnymailMessage(
+            # Queued in the outbox, sent by `manage.py send_queued_mail`
+            outbox.enqueue(
                 subject="Nouveau message de contact ZIGZAG",
                 body=plain_text,
+                html_body=html_content,
                 to=[host_email],
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 reply_to=[email],  # Set Reply-To to sender's email for easy replies
+                headers={
+                    'Reply-To': email,
+                    'X-Mailer': 'ZIGZAG Contact Form',
+                },
             )
             
-            # Add headers to improve deliverability
-            message.extra_headers = {
-                'Reply-To': email,
-                'X-Mailer': 'ZIGZAG Contact Form',
-            }
-            
-            # Attach HTML alternative
-            message.attach_alternative(html_content, "text/html")
-            
-            message.send()
-            
         except Exception as e:
             error_message = str(e)
-            print(f"Error sending contact form email: {error_message}")
+            print(f"Error queueing contact form email: {error_message}")
             
             # In DEBUG mode, return the actual error so user can see what went wrong
             if settings.DEBUG:
@@ -0,0 +1,141 @@
+"""
+Maintenance of the EventVisibility table.
+
+An event is visible to its creator and to every member of a circle linked to it.
+``sync_visibility`` recomputes those rows for a set of events (optionally only for
+some users) from the source tables and applies the difference in bulk.
+"""
+from collections import defaultdict
+
+from .models import Event, Circle, EventChange, EventVisibility
+from .response_cache import bump_users
+
+BATCH_SIZE = 500
+
+
+def compute_visibility(event_ids, user_ids=None):
+    """
+    Return {(user_id, event_id): (via_circle_id, tags)} for the given events,
+    restricted to ``user_ids`` when provided.
+    """
+    desired = {}
+    for event_id, creator_id in Event.objects.filter(id__in=event_ids).values_list('id', 'creator_id'):
+        if user_ids is None or creator_id in user_ids:
+            desired[(creator_id, event_id)] = (None, set())
+
+    event_circles = list(
+        Event.circles.through.objects.filter(event_id__in=event_ids).values_list('event_id', 'circle_id')
+    )
+    circle_ids = {circle_id for _, circle_id in event_circles}
+    if not circle_ids:
+        return {key: (via, sorted(tags)) for key, (via, tags) in desired.items()}
+
+    members = Circle.members.through.objects.filter(circle_id__in=circle_ids)
+    if user_ids is not None:
+        members = members.filter(user_id__in=user_ids)
+    circle_members = defaultdict(list)
+    for circle_id, user_id in members.values_list('circle_id', 'user_id'):
+        circle_members[circle_id].append(user_id)
+
+    circle_tags = defaultdict(set)
+    categories = Circle.categories.through.objects.filter(circle_id__in=circle_ids)
+    for circle_id, name in categories.values_list('circle_id', 'tag__name'):
+        circle_tags[circle_id].add(name)
+
+    # Lowest circle id wins as via_circle so recomputation is deterministic
+    for event_id, circle_id in sorted(event_circles, key=lambda pair: pair[1]):
+        for user_id in circle_members[circle_id]:
+            via, tags = desired.get((user_id, event_id), (None, set()))
+            desired[(user_id, event_id)] = (via or circle_id, tags | circle_tags[circle_id])
+
+    return {key: (via, sorted(tags)) for key, (via, tags) in desired.items()}
+
+
+def sync_visibility(event_ids, user_ids=None):
+    """
+    Bring EventVisibility rows for ``event_ids`` (and ``user_ids`` when given) in line
+    with circles and memberships.
+    Returns (added, updated, removed) as sets of (user_id, event_id) pairs.
+    """
+    event_ids = list(event_ids)
+    if not event_ids or (user_ids is not None and not user_ids):
+        return set(), set(), set()
+    if user_ids is not None:
+        user_ids = set(user_ids)
+
+    desired = compute_visibility(event_ids, user_ids)
+
+    existing_rows = EventVisibility.objects.filter(event_id__in=event_ids)
+    if user_ids is not None:
+        existing_rows = existing_rows.filter(user_id__in=user_ids)
+    existing = {(row.user_id, row.event_id): row for row in existing_rows.only('id', 'user_id', 'event_id', 'via_circle_id', 'tags')}
+
+    to_create, to_update = [], []
+    for (user_id, event_id), (via_circle_id, tags) in desired.items():
+        row = existing.get((user_id, event_id))
+        if row is None:
+            to_create.append(EventVisibility(user_id=user_id, event_id=event_id, via_circle_id=via_circle_id, tags=tags))
+        elif row.via_circle_id != via_circle_id or row.tags != tags:
+            row.via_circle_id = via_circle_id
+            row.tags = tags
+            to_update.append(row)
+    removed = set(existing) - set(desired)
+
+    if to_create:
+        EventVisibility.objects.bulk_create(to_create, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if to_update:
+        EventVisibility.objects.bulk_update(to_update, ['via_circle', 'tags'], batch_size=BATCH_SIZE)
+    if removed:
+        EventVisibility.objects.filter(id__in=[existing[key].id for key in removed]).delete()
+
+    added = {(row.user_id, row.event_id) for row in to_create}
+    updated = {(row.user_id, row.event_id) for row in to_update}
+    log_changes(added | updated, removed)
+    return added, updated, removed
+
+
+def log_changes(upserted, removed=()):
+    """
+    Append (user_id, event_id) pairs to the EventChange log read by the sync endpoint
+    and invalidate the cached responses of those users.
+    """
+    changes = [EventChange(user_id=user_id, event_id=event_id, action=EventChange.UPSERT) for user_id, event_id in upserted]
+    changes += [EventChange(user_id=user_id, event_id=event_id, action=EventChange.REMOVE) for user_id, event_id in removed]
+    if changes:
+        EventChange.objects.bulk_create(changes, batch_size=BATCH_SIZE)
+        bump_users({change.user_id for change in changes})
+
+
+def event_viewer_ids(event_ids):
+    """Ids of the users who can currently see any of the given events."""
+    return set(
+        EventVisibility.objects.filter(event_id__in=event_ids).values_list('user_id', flat=True)
+    )
+
+
+def circle_event_ids(circle_ids):
+    """Ids of the events linked to the given circles."""
+    return list(
+        Event.circles.through.objects.filter(circle_id__in=circle_ids)
+        .values_list('event_id', flat=True).distinct()
+    )
+
+
+def circle_member_ids(circle_ids):
+    """Ids of the members of the given circles."""
+    return set(
+        Circle.members.through.objects.filter(circle_id__in=circle_ids)
+        .values_list('user_id', flat=True)
+    )
+
+
+def rebuild_all(batch_size=BATCH_SIZE):
+    """Recompute the whole table batch by batch. Returns (added, updated, removed) counts."""
+    totals = [0, 0, 0]
+    event_ids = list(Event.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(event_ids), batch_size):
+        for index, pairs in enumerate(sync_visibility(event_ids[start:start + batch_size])):
+            totals[index] += len(pairs)
+    # Rows of deleted events cascade; this catches anything written outside the ORM
+    totals[2] += EventVisibility.objects.exclude(event_id__in=Event.objects.values('id')).delete()[0]
+    return tuple(totals)
@@ -51,12 +51,22 @@ INSTALLED_APPS = [
     # 'django_ratelimit', # TODO : Redis for django ratelimit in production to enable Cache for Ip across severs
 ]
 
-# CACHES = {
-#     'default': {
-#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-#         'LOCATION': BASE_DIR / 'cache',
-#     }
-# }
+# Shared by the response cache (events.response_cache), marker clusters and throttles.
+# Use a backend shared between worker processes in production, e.g.
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/zigzag_cache
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'zigzag'),
+    }
+}
+# Seconds a cached response lives; version bumps invalidate it earlier
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+# Response caching (and the marker tiles keyed like it) needs a cache shared by the
+# workers; unset, it is on for any backend but locmem/dummy. 'True' forces it on, 'False' off.
+RESPONSE_CACHE_ENABLED = (
+    os.getenv('RESPONSE_CACHE_ENABLED').lower() == 'true' if os.getenv('RESPONSE_CACHE_ENABLED') else None
+)
 # RATELIMIT_USE_CACHE = 'default'
 
 REST_FRAMEWORK = {
@@ -68,9 +78,20 @@ REST_FRAMEWORK = {
         'login': os.getenv('THROTTLE_RATE_LOGIN', '10/hour'),
         'password_reset': os.getenv('THROTTLE_RATE_PASSWORD_RESET', '3/hour'),
         'contact': os.getenv('THROTTLE_RATE_CONTACT', '5/hour'),
+        # cost units per user; each throttled view declares its cost (events.throttles.UserCostThrottle)
+        'user_cost': os.getenv('THROTTLE_RATE_USER_COST', '300/minute'),
     }
 }
 
+# Where the throttles keep their token buckets (events.throttle_store):
+# 'database' (shared by all workers), 'redis' (THROTTLE_REDIS_URL), 'cache' or 'local' (per process)
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'database')
+# The per-user cost throttle runs on every read of the expensive endpoints: keep its buckets
+# out of the database ('cache' = CACHES['default'], shared by the workers when that cache is)
+THROTTLE_COST_STORE = os.getenv('THROTTLE_COST_STORE', 'cache')
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', 'redis://localhost:6379/0')
+THROTTLE_PURGE_INTERVAL = 300  # seconds between deletions of full (expired) buckets
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -194,6 +215,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Circle Calendar Privacy Settings
 CIRCLE_CALENDAR_MIN_MEMBERS = int(os.getenv('CIRCLE_CALENDAR_MIN_MEMBERS'))
+GREY_EVENTS_MAX_BUCKETS = 2000  # histogram mode of circles/grey-events
+
+# Group availability (circles/availability/)
+AVAILABILITY_SLOT_MINUTES = int(os.getenv('AVAILABILITY_SLOT_MINUTES', '30'))
+AVAILABILITY_MAX_DAYS = 62
+
+# Server-side marker clustering (markers endpoint with "cluster": true)
+MARKER_CLUSTER_MAX_ZOOM = int(os.getenv('MARKER_CLUSTER_MAX_ZOOM', '16'))  # from this zoom on, individual markers are returned
+MARKER_CLUSTER_CACHE_TIMEOUT = int(os.getenv('MARKER_CLUSTER_CACHE_TIMEOUT', '60'))  # seconds
+MARKER_CLUSTER_SAMPLE_SIZE = 5  # event ids returned per cluster
+
+# Delta sync (events/sync/): cursors older than the change log retention trigger a full resync
+EVENT_CHANGE_RETENTION_DAYS = int(os.getenv('EVENT_CHANGE_RETENTION_DAYS', '30'))
+EVENT_SYNC_OVERLAP_SECONDS = 5
+
+# Event list keyset pagination (opt-in with ?page_size= or a cursor)
+EVENT_LIST_PAGE_SIZE = int(os.getenv('EVENT_LIST_PAGE_SIZE', '50'))
+EVENT_LIST_MAX_PAGE_SIZE = int(os.getenv('EVENT_LIST_MAX_PAGE_SIZE', '200'))
+
+# Public event discovery (events/public/) page size
+PUBLIC_EVENTS_PAGE_SIZE = int(os.getenv('PUBLIC_EVENTS_PAGE_SIZE', '50'))
+PUBLIC_EVENTS_MAX_PAGE_SIZE = int(os.getenv('PUBLIC_EVENTS_MAX_PAGE_SIZE', '200'))
+
+# Events near saved locations (my/locations/nearby/)
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 100
+NEARBY_EVENTS_PER_LOCATION = 20
+NEARBY_MAX_EVENTS_PER_LOCATION = 100
+
+# Circle members union pagination (opt-in with page_size or a cursor)
+CIRCLE_MEMBERS_PAGE_SIZE = int(os.getenv('CIRCLE_MEMBERS_PAGE_SIZE', '100'))
+CIRCLE_MEMBERS_MAX_PAGE_SIZE = int(os.getenv('CIRCLE_MEMBERS_MAX_PAGE_SIZE', '500'))
+
+# Deprecated users list (users/): legacy list cut at the maximum, pagination opt-in
+USERS_LIST_PAGE_SIZE = int(os.getenv('USERS_LIST_PAGE_SIZE', '50'))
+USERS_LIST_MAX_PAGE_SIZE = int(os.getenv('USERS_LIST_MAX_PAGE_SIZE', '200'))
+
+# User search (users/search/): default and maximum number of results
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_MAX_LIMIT = 50
+
+# Friends-of-friends suggestions (users/friends-of-friends/): default and maximum number of results
+FRIENDS_OF_FRIENDS_LIMIT = 20
+FRIENDS_OF_FRIENDS_MAX_LIMIT = 100
+
+# Webcal subscription feeds: rendered VEVENT blocks and whole feeds are cached this long (seconds)
+ICAL_FEED_CACHE_TIMEOUT = int(os.getenv('ICAL_FEED_CACHE_TIMEOUT', '86400'))
 
 # Deep Link Configuration
 IOS_APP_STORE_URL = os.getenv('VITE_IOS_APP_STORE_URL', 'https://apps.apple.com/app/zigzag')
@@ -255,6 +323,13 @@ ANYMAIL = {
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'ZigZag <contact@support.zigzag-project.org>')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
 
+# Email outbox (events.outbox): run `manage.py send_queued_mail --loop` as a worker
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '100'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60  # doubled after each failure
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300  # a claimed batch is retried by another worker after this
+
 # Email Configuration (Amazon SES via django-anymail) - Commented out
 # Uncomment these lines and comment out Mailgun config above to switch back to Amazon SES
 # EMAIL_BACKEND = "anymail.backends.amazon_ses.EmailBackend"